@@ -1,63 +1,218 @@
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import cv2
 import numpy as np
 import pandas as pd
 
+# Images per Parquet part file; also the unit of work and of checkpointing
+CHUNK_SIZE = 1000
+CHECKPOINT_FILE = "_checkpoint.json"
 
-def calculate_image_statistics(image_path):
-    # Load the image in grayscale
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+HISTOGRAM_BINS = 32  # coarse histogram stored per image (over 0..255)
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
 
-    # If the image is not valid, skip it
-    if img is None:
-        return None
+# Share of pixels inside common CT windows, as (low, high) HU
+HU_WINDOWS = {
+    "air": (-1024, -200),
+    "stroke": (20, 60),
+    "brain": (0, 80),
+    "subdural": (-20, 180),
+    "bone": (300, 3071),
+}
 
-    # Calculate pixel statistics
-    mean = np.mean(img)
-    std = np.std(img)
-    min_val = np.min(img)
-    max_val = np.max(img)
+# A slice is blank when almost no pixel differs from the background
+BLANK_MAX_FOREGROUND = 0.01  # share of pixels brighter than background
+BACKGROUND_LEVEL = 10  # pixel value
 
-    return {"mean": mean, "std": std, "min": min_val, "max": max_val}
 
+def calculate_image_statistics(image_path, hu_rescale):
+    """
+    Compute the statistics of one grayscale PNG in a single pass.
 
-def process_images_in_folder(folder_path):
-    # Prepare a list to store the results
-    results = []
-
-    # Recursively search for all PNG files in the folder
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.lower().endswith(".png"):
-                image_path = os.path.join(root, file)
-
-                # Calculate statistics for each image
-                stats = calculate_image_statistics(image_path)
+    Everything is derived from the 256-bin intensity histogram: mean, std,
+    min, max, PERCENTILES, a HISTOGRAM_BINS coarse histogram, HU window
+    occupancy, foreground share and blank-slice detection.
 
-                if stats:
-                    # Store the results along with the image file path
-                    results.append(
-                        {
-                            "image_path": image_path,
-                            "mean": stats["mean"],
-                            "std": stats["std"],
-                            "min": stats["min"],
-                            "max": stats["max"],
-                        }
-                    )
+    Args:
+        image_path (str): 8-bit grayscale PNG.
+        hu_rescale (tuple): (slope, intercept) mapping pixel values back to
+            HU, as used when the DICOMs were exported to PNG; None skips the
+            HU window statistics.
 
-    # Create a DataFrame from the results
-    df = pd.DataFrame(results)
+    Returns:
+        dict of statistics, or None if the image cannot be read.
+    """
+    # Load the image in grayscale
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
 
-    # Save the DataFrame to a CSV file
-    output_csv = os.path.join(folder_path, "image_statistics.csv")
-    df.to_csv(output_csv, index=False)
+    # If the image is not valid, skip it
+    if img is None:
+        return None
 
-    print(f"Statistics saved to {output_csv}")
+    counts = np.bincount(img.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    num_pixels = counts.sum()
+    nonzero = np.flatnonzero(counts)
+
+    mean = (counts * levels).sum() / num_pixels
+    std = np.sqrt((counts * (levels - mean) ** 2).sum() / num_pixels)
+    cumulative = np.cumsum(counts) / num_pixels
+    percentiles = np.searchsorted(cumulative, np.array(PERCENTILES) / 100.0)
+    foreground = counts[BACKGROUND_LEVEL + 1 :].sum() / num_pixels
+
+    stats = {
+        "height": img.shape[0],
+        "width": img.shape[1],
+        "mean": mean,
+        "std": std,
+        "min": int(nonzero[0]),
+        "max": int(nonzero[-1]),
+        "foreground": foreground,
+        "is_blank": bool(foreground < BLANK_MAX_FOREGROUND),
+    }
+    for percentile, value in zip(PERCENTILES, percentiles):
+        stats[f"p{percentile}"] = int(value)
+
+    if hu_rescale is not None:
+        slope, intercept = hu_rescale
+        hu = levels * slope + intercept
+        for name, (low, high) in HU_WINDOWS.items():
+            inside = (hu >= low) & (hu <= high)
+            stats[f"window_{name}"] = counts[inside].sum() / num_pixels
+
+    coarse = counts.reshape(HISTOGRAM_BINS, -1).sum(axis=1) / num_pixels
+    for i, share in enumerate(coarse):
+        stats[f"hist_{i:02d}"] = share
+
+    return stats
+
+
+def list_png_files(folder_path):
+    """All PNG files below folder_path, sorted so chunks are reproducible."""
+    paths = []
+    for root, _dirs, files in os.walk(folder_path):
+        for file in files:
+            if file.lower().endswith(".png"):
+                paths.append(os.path.join(root, file))
+    return sorted(paths)
 
 
-# Input folder path (change this to the folder you want to process)
-folder_path = "archive"
+def process_chunk(chunk_id, image_paths, output_dir, hu_rescale):
+    """
+    Compute the statistics of a chunk of images and write them to one Parquet
+    part file. Runs in a worker process.
 
-# Process the images in the folder and save statistics to a CSV
-process_images_in_folder(folder_path)
+    Returns:
+        Tuple (chunk_id, number of images written).
+    """
+    results = []
+    for image_path in image_paths:
+        stats = calculate_image_statistics(image_path, hu_rescale)
+        if stats:
+            results.append({"image_path": image_path, **stats})
+
+    if not results:
+        return chunk_id, 0
+    part_path = os.path.join(output_dir, f"part-{chunk_id:05d}.parquet")
+    # Write then rename, so an interrupted run never leaves a partial part
+    pd.DataFrame(results).to_parquet(part_path + ".tmp", index=False)
+    os.replace(part_path + ".tmp", part_path)
+    return chunk_id, len(results)
+
+
+def _load_checkpoint(checkpoint_path, num_files, chunk_size):
+    """Chunk ids already written by a previous run over the same file list."""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("num_files") != num_files or (
+        checkpoint.get("chunk_size") != chunk_size
+    ):
+        print("⚠️ Image list changed since the checkpoint, starting over.")
+        return set()
+    return set(checkpoint["done"])
+
+
+def _save_checkpoint(checkpoint_path, num_files, chunk_size, done):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"num_files": num_files, "chunk_size": chunk_size, "done": sorted(done)},
+            f,
+        )
+    os.replace(tmp_path, checkpoint_path)
+
+
+def process_images_in_folder(
+    folder_path, hu_rescale, output_dir=None, workers=None, chunk_size=CHUNK_SIZE
+):
+    """
+    Compute statistics for every PNG below folder_path with a process pool.
+
+    Files are split into chunks of chunk_size; each worker writes its chunk
+    to a Parquet part file in output_dir and the finished chunk ids are
+    recorded in a checkpoint, so an interrupted run resumes where it stopped.
+    Read the result with pd.read_parquet(output_dir).
+
+    Args:
+        folder_path (str): folder searched recursively for PNG files.
+        hu_rescale (tuple): (slope, intercept) of the PNG export, see
+            calculate_image_statistics; None skips the HU window statistics.
+        output_dir (str): Parquet dataset folder, defaults to
+            <folder_path>/image_statistics.
+        workers (int): worker processes, defaults to the number of CPUs.
+        chunk_size (int): images per part file.
+    """
+    if output_dir is None:
+        output_dir = os.path.join(folder_path, "image_statistics")
+    os.makedirs(output_dir, exist_ok=True)
+
+    image_paths = list_png_files(folder_path)
+    chunks = [
+        image_paths[start : start + chunk_size]
+        for start in range(0, len(image_paths), chunk_size)
+    ]
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    done = _load_checkpoint(checkpoint_path, len(image_paths), chunk_size)
+    if not done:
+        # Drop parts of an older, incompatible run
+        for name in os.listdir(output_dir):
+            if name.startswith("part-"):
+                os.remove(os.path.join(output_dir, name))
+
+    pending = [chunk_id for chunk_id in range(len(chunks)) if chunk_id not in done]
+    print(
+        f"🖼️ {len(image_paths)} images in {len(chunks)} chunks, "
+        f"{len(pending)} to process."
+    )
+
+    num_images = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                process_chunk, chunk_id, chunks[chunk_id], output_dir, hu_rescale
+            )
+            for chunk_id in pending
+        ]
+        for future in as_completed(futures):
+            chunk_id, count = future.result()
+            num_images += count
+            done.add(chunk_id)
+            _save_checkpoint(checkpoint_path, len(image_paths), chunk_size, done)
+            print(f"📊 Chunk {len(done)}/{len(chunks)} done ({count} images)")
+
+    print(f"Statistics of {num_images} new images saved to {output_dir}")
+
+
+if __name__ == "__main__":
+    # Input folder path (change this to the folder you want to process)
+    folder_path = "archive"
+
+    # (slope, intercept) mapping the 8-bit PNG values back to HU, from the
+    # windowing used when the DICOMs were exported; None skips HU windows
+    hu_rescale = None
+
+    # Process the images in the folder and save statistics to Parquet
+    process_images_in_folder(folder_path, hu_rescale)
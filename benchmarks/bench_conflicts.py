@@ -0,0 +1,80 @@
+"""
+Compare the Python (defaultdict) and SQL (GROUP BY ... HAVING) image conflict
+scans on a synthetic dataset.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_conflicts [num_doctors] [num_sets] [num_slices]
+
+The defaults reproduce the 10-rater x 500-scan x 300-slice scenario
+(1.5M evaluations); pass smaller numbers for a quick run.
+"""
+
+import random
+import sys
+import tracemalloc
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from benchmarks.common import make_synthetic_db, timed
+from utils.conflict import (
+    scan_and_update_image_conflicts,
+    scan_and_update_image_conflicts_sql,
+)
+from utils.models import Conflict, Evaluation, Region
+
+
+def fill_evaluations(engine, num_doctors, num_sets, num_slices, seed=0):
+    """Insert one random evaluation per (doctor, slice), mostly in agreement."""
+    rnd = random.Random(seed)
+    regions = [Region.None_, Region.BasalGanglia, Region.CoronaRadiata]
+    with Session(engine) as session:
+        for i in range(num_sets):
+            truth = [rnd.choice(regions) for _ in range(num_slices)]
+            rows = []
+            for d in range(num_doctors):
+                for j, region in enumerate(truth):
+                    if rnd.random() < 0.02:
+                        region = rnd.choice(regions)
+                    score = rnd.randint(0, 1) if rnd.random() < 0.05 else 1
+                    rows.append(
+                        {
+                            "doctor_id": f"doctor-{d:02d}",
+                            "image_set_id": f"set-{i:05d}",
+                            "image_id": f"{j:03d}.png",
+                            "region": region,
+                            "basal_score": (
+                                score if region == Region.BasalGanglia else None
+                            ),
+                            "corona_score": (
+                                score if region == Region.CoronaRadiata else None
+                            ),
+                            "notes": "",
+                        }
+                    )
+            session.execute(insert(Evaluation), rows)
+        session.commit()
+
+
+def run(label, scan, engine):
+    with Session(engine) as session:
+        session.query(Conflict).delete()
+        session.commit()
+    tracemalloc.start()
+    with Session(engine) as session:
+        with timed(label):
+            scan(session)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'':<40} peak Python memory {peak / 2**20:8.1f} MiB")
+
+
+def main(num_doctors: int = 10, num_sets: int = 500, num_slices: int = 300):
+    engine = make_synthetic_db(num_sets, num_slices, num_doctors)
+    with timed(f"generate {num_doctors * num_sets * num_slices} evaluations"):
+        fill_evaluations(engine, num_doctors, num_sets, num_slices)
+
+    run("python scan (defaultdict)", scan_and_update_image_conflicts, engine)
+    run("sql scan (GROUP BY ... HAVING)", scan_and_update_image_conflicts_sql, engine)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""
+Compare per-image evaluation writes against the bulk upsert save path.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_save_annotations [num_slices]
+"""
+
+import sys
+from sqlalchemy.orm import Session
+from benchmarks.common import make_synthetic_db, timed
+from utils.evaluation import (
+    add_or_update_image_evaluation,
+    add_or_update_set_evaluation,
+    bulk_upsert_image_evaluations,
+)
+from utils.models import Region
+
+
+def main(num_slices: int = 337):
+    engine = make_synthetic_db(num_sets=2, num_slices=num_slices, num_doctors=1)
+    rows = [
+        {
+            "image_id": f"{j:03d}.png",
+            "region": Region.BasalGanglia if j % 2 else Region.None_,
+            "basal_score": 3 if j % 2 else None,
+        }
+        for j in range(num_slices)
+    ]
+
+    with Session(engine) as session:
+        with timed("per-image commits", num_slices):
+            add_or_update_set_evaluation(session, "doctor-00", "set-00000")
+            for row in rows:
+                add_or_update_image_evaluation(
+                    session,
+                    doctor_id="doctor-00",
+                    image_set_id="set-00000",
+                    **row,
+                )
+
+    with Session(engine) as session:
+        with timed("bulk upsert (insert)", num_slices):
+            bulk_upsert_image_evaluations(session, "doctor-00", "set-00001", rows)
+        with timed("bulk upsert (update)", num_slices):
+            bulk_upsert_image_evaluations(session, "doctor-00", "set-00001", rows)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
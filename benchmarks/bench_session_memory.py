@@ -0,0 +1,87 @@
+"""
+Compare the footprint of a labeling session held as one ImageEvaluationSession
+per slice (plus the two per-slice widget keys the label page used to keep in
+st.session_state) against the array-backed SliceAnnotations.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_session_memory [num_sets] [num_slices]
+"""
+
+import pickle
+import sys
+import tracemalloc
+from sqlalchemy.orm import Session
+from benchmarks.common import make_synthetic_db, timed
+from utils.image_session import (
+    ImageEvaluationSession,
+    SliceAnnotations,
+    prepare_image_set_evaluations,
+)
+
+
+def _legacy_session(set_id: str, annotations: SliceAnnotations):
+    """The per-slice objects and widget keys of the previous label page."""
+    images = [
+        ImageEvaluationSession(
+            image_id=str(image.image_id),
+            image_path=image.image_path,
+            region=image.region,
+            score=image.score,
+            slice_index=int(image.slice_index),
+        )
+        for image in annotations
+    ]
+    widget_state = {}
+    for idx, image in enumerate(images):
+        widget_state[f"segmented_control_{idx}_{set_id}"] = image.region
+        widget_state[f"score_{idx}_{set_id}"] = image.score
+    return images, widget_state
+
+
+def _compact_session(annotations: SliceAnnotations):
+    """A copy of the arrays, so the traced allocation is the model itself."""
+    copy = SliceAnnotations(annotations.folder_path, [], [], [], [])
+    for name in ("image_ids", "slice_indices", "regions", "scores"):
+        setattr(copy, name, getattr(annotations, name).copy())
+    return copy
+
+
+def _measure(label: str, build, count: int):
+    tracemalloc.start()
+    with timed(label, count):
+        result = build()
+    traced, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pickled = len(pickle.dumps(result))
+    print(
+        f"{'':<40} {traced / 1024:8.1f} KiB traced  {pickled / 1024:8.1f} KiB pickled"
+    )
+    return result
+
+
+def main(num_sets: int = 10, num_slices: int = 300):
+    engine = make_synthetic_db(num_sets=num_sets, num_slices=num_slices, num_doctors=1)
+    set_ids = [f"set-{i:05d}" for i in range(num_sets)]
+    with Session(engine) as session:
+        sessions = prepare_image_set_evaluations(session, "doctor-00", set_ids)
+    # Half of the slices labeled, as in a session in progress
+    for set_ in sessions:
+        for image in list(set_.images)[::2]:
+            image.region = "BasalGanglia"
+            image.score = 3
+
+    count = num_sets * num_slices
+    _measure(
+        "legacy per-slice objects",
+        lambda: [_legacy_session(s.image_set_id, s.images) for s in sessions],
+        count,
+    )
+    _measure(
+        "SliceAnnotations arrays",
+        lambda: [_compact_session(s.images) for s in sessions],
+        count,
+    )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
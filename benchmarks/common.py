@@ -0,0 +1,89 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run benchmarks from the repository root so that Streamlit secrets resolve, e.g.
+``python -m benchmarks.bench_save_annotations``.
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from utils.db import create_db_engine
+from utils.models import Base, Patient, ImageSet, Image, Doctor
+
+
+def make_synthetic_db(num_sets: int, num_slices: int, num_doctors: int, path=None):
+    """
+    Create a file-backed SQLite database populated with synthetic image sets.
+
+    Args:
+        num_sets (int): number of image sets (scans).
+        num_slices (int): number of slices per image set.
+        num_doctors (int): number of registered doctors.
+        path (str): database file; a temporary file is used when omitted.
+
+    Returns:
+        SQLAlchemy engine bound to the new database.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        os.remove(path)
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.execute(insert(Patient), [{"patient_id": "BENCH-PATIENT"}])
+        session.execute(
+            insert(ImageSet),
+            [
+                {
+                    "image_set_id": f"set-{i:05d}",
+                    "patient_id": "BENCH-PATIENT",
+                    "num_images": num_slices,
+                    "folder_path": f"data/set-{i:05d}",
+                    "conflicted": False,
+                }
+                for i in range(num_sets)
+            ],
+        )
+        session.execute(
+            insert(Image),
+            [
+                {
+                    "image_set_id": f"set-{i:05d}",
+                    "image_id": f"{j:03d}.png",
+                    "slice_index": j,
+                }
+                for i in range(num_sets)
+                for j in range(num_slices)
+            ],
+        )
+        session.execute(
+            insert(Doctor),
+            [
+                {
+                    "uuid": f"doctor-{d:02d}",
+                    "username": f"doctor{d:02d}",
+                    "password_hash": "x",
+                }
+                for d in range(num_doctors)
+            ],
+        )
+        session.commit()
+    return engine
+
+
+@contextmanager
+def timed(label: str, count: int | None = None):
+    """Print the wall time of the enclosed block, and throughput if count is given."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    if count:
+        print(f"{label:<40} {elapsed:8.3f} s  {count / elapsed:12.1f} rows/s")
+    else:
+        print(f"{label:<40} {elapsed:8.3f} s")
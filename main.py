@@ -1,4 +1,30 @@
 import streamlit as st
+from utils.credentials import rotate_session_token
+from utils.db import get_session
+from utils.session_cookie import read_session_cookie, write_session_cookie
+
+app = st.session_state
+# A reloaded page starts a new Streamlit session: restore the login from the
+# session cookie instead of asking for the password again. The token is
+# exchanged for a new one, so a copied cookie works at most once.
+if "user" not in app and "session_cookie" not in app:
+    token = read_session_cookie()
+    restored = None
+    if token:
+        with get_session() as session:
+            restored = rotate_session_token(session, token)
+    if restored:
+        app.user, app.session_token = restored
+    app.session_cookie = token  # what the browser holds now
+# Written on every run: a run cut short by st.switch_page never reaches the
+# browser
+if app.get("session_token"):
+    write_session_cookie(app.session_token)
+elif app.session_cookie:
+    write_session_cookie(None)  # logged out
+# Earlier versions kept the token in the URL
+if "session" in st.query_params:
+    del st.query_params["session"]
 
 pg = st.navigation(
     [
@@ -1,70 +1,139 @@
-from typing import Tuple
+from typing import Dict, Tuple
 import time
 import streamlit as st
 import pandas as pd
-from utils.models import Evaluation, ImageSet
+from sqlalchemy import func, select
+from utils.agreement import compute_agreement_report
+from utils.models import Doctor, Evaluation, ImageSet, JobStatus
 from utils.db import get_session
+from utils.refresh_jobs import get_job_counts, refresh_worker
+from utils.revision import get_data_revision, get_revision
+
+CACHE_TTL_SECONDS = 600
+CACHE_MAX_ENTRIES = 256
 
 st.set_page_config(
     page_title="Dashboard",
     page_icon=":bar_chart:",
     layout="wide",)
-@st.cache_data
-def get_image_sets_with_evaluation_status(doctor_uuid: str, _session) -> pd.DataFrame:
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+def get_image_sets_with_evaluation_status(
+    doctor_uuid: str, revision: Tuple[int, int], _session
+) -> pd.DataFrame:
     """
     Return a DataFrame of all image sets with evaluation status by the doctor.
 
-    Columns: scan_id, patient_id, num_images, conflicted, editing, evaluated (bool)
+    The revision (see utils.revision.get_revision) is part of the cache key, so
+    the result is recomputed after this doctor's evaluations or the conflict
+    flags change; the TTL covers writes made by other processes.
+
+    Runs a single query: image_sets LEFT JOIN the doctor's per-set evaluation
+    counts, read straight into pandas.
+
+    Columns: scan_id, patient_id, num_images, conflicted, evaluated_images,
+    completion (ratio), evaluated (bool), edit
     """
-    # Step 1: Get image_set_ids this doctor has evaluated
-    evaluated_ids = (
-        _session.query(Evaluation.image_set_id)
-        .filter(Evaluation.doctor_id == doctor_uuid)
-        .distinct()
-        .all()
+    evaluated = (
+        select(
+            Evaluation.image_set_id,
+            func.count().label("evaluated_images"),
+        )
+        .where(Evaluation.doctor_id == doctor_uuid)
+        .group_by(Evaluation.image_set_id)
+        .subquery()
     )
-    evaluated_ids = {row[0] for row in evaluated_ids}  # set for fast lookup
-
-    # Step 2: Get all image sets
-    all_image_sets = _session.query(ImageSet).all()
+    stmt = select(
+        ImageSet.image_set_id.label("scan_id"),
+        ImageSet.patient_id,
+        ImageSet.num_images,
+        ImageSet.conflicted,
+        func.coalesce(evaluated.c.evaluated_images, 0).label("evaluated_images"),
+    ).outerjoin(evaluated, evaluated.c.image_set_id == ImageSet.image_set_id)
 
-    # Step 3: Build DataFrame with evaluation status
-    df = pd.DataFrame(
-        [
-            {
-                "scan_id": imgset.image_set_id,
-                "patient_id": imgset.patient_id,
-                "num_images": imgset.num_images,
-                "conflicted": imgset.conflicted,
-                "evaluated": imgset.image_set_id in evaluated_ids,
-                "edit": False,
-            }
-            for imgset in all_image_sets
-        ]
+    df = pd.read_sql(stmt, _session.connection())
+    df["conflicted"] = df["conflicted"].astype(bool)
+    df["completion"] = (
+        (df["evaluated_images"] / df["num_images"].where(df["num_images"] > 0))
+        .fillna(0.0)
+        .clip(upper=1.0)
     )
+    df["evaluated"] = df["evaluated_images"] > 0
+    df["edit"] = False
 
     return df
 
 
-@st.cache_data
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+def get_agreement(revision: int, _session) -> Dict[str, pd.DataFrame]:
+    """
+    Return the inter-rater agreement report (see
+    utils.agreement.compute_agreement_report) with doctor usernames in the
+    pair table. Cached per data revision (utils.revision.get_data_revision),
+    since it depends on every doctor's evaluations.
+    """
+    report = compute_agreement_report(_session)
+    usernames = dict(_session.execute(select(Doctor.uuid, Doctor.username)).all())
+    for column in ("doctor_a", "doctor_b"):
+        report["pairs"][column] = report["pairs"][column].map(usernames)
+    return report
+
+
+def render_agreement_panel() -> None:
+    """Render the agreement metrics and tables of every doctor's evaluations."""
+    with get_session() as session:
+        agreement = get_agreement(get_data_revision(), session)
+    overall = agreement["overall"].iloc[0]
+    metric_columns = st.columns(4)
+    for column, (label, key) in zip(
+        metric_columns,
+        [
+            ("Region Fleiss κ", "fleiss_kappa_region"),
+            ("Region α", "alpha_region"),
+            ("Basal α", "alpha_basal_score"),
+            ("Corona α", "alpha_corona_score"),
+        ],
+    ):
+        value = overall[key]
+        column.metric(label, "–" if pd.isna(value) else f"{value:.2f}")
+    st.subheader("Doctor pairs")
+    st.dataframe(
+        agreement["pairs"],
+        use_container_width=True,
+        hide_index=True,
+        column_config=config_agreement,
+        column_order=[
+            "doctor_a",
+            "doctor_b",
+            "n_items_region",
+            "agreement_region",
+            "kappa_region",
+            "kappa_basal_score",
+            "kappa_corona_score",
+        ],
+    )
+    st.subheader("Per scan")
+    st.dataframe(
+        agreement["image_sets"].reset_index(),
+        use_container_width=True,
+        hide_index=True,
+        column_config=config_agreement,
+    )
+
+
 def get_image_set_evaluation_progress(
-    doctor_uuid: str, _session
+    status_df: pd.DataFrame,
 ) -> Tuple[int, int, float]:
     """
     Return progress info of image sets evaluated by a doctor:
     - evaluated_count: how many image sets this doctor has evaluated
     - total_count: total number of image sets in the system
     - percent: evaluated / total (as float ratio, rounded to 2 decimals)
-    """
-    total_count = _session.query(ImageSet).count()
 
-    evaluated_set_ids = (
-        _session.query(Evaluation.image_set_id)
-        .filter(Evaluation.doctor_id == doctor_uuid)
-        .distinct()
-        .all()
-    )
-    evaluated_count = len(evaluated_set_ids)
+    Args:
+        status_df: output of get_image_sets_with_evaluation_status.
+    """
+    total_count = len(status_df)
+    evaluated_count = int(status_df["evaluated"].sum()) if total_count else 0
 
     percent = round(evaluated_count / total_count, 2) if total_count else 0.0
 
@@ -98,11 +167,56 @@ config_self = {
         disabled=True,
         help="Indicates if the scan has been evaluated by you",
     ),
+    "completion": st.column_config.ProgressColumn(
+        label="Completion",
+        min_value=0.0,
+        max_value=1.0,
+        help="Share of the scan's images you have evaluated",
+    ),
     "edit": st.column_config.CheckboxColumn(
         label="Evaluate", disabled=False, help="Click to evaluate or edit this scan"
     ),
 }
 
+# Column configuration for the agreement tables
+config_agreement = {
+    "doctor_a": st.column_config.TextColumn(label="Doctor A"),
+    "doctor_b": st.column_config.TextColumn(label="Doctor B"),
+    "n_items_region": st.column_config.NumberColumn(
+        label="Shared Images", help="Images rated by both doctors"
+    ),
+    "agreement_region": st.column_config.ProgressColumn(
+        label="Region Agreement", min_value=0.0, max_value=1.0
+    ),
+    "kappa_region": st.column_config.NumberColumn(
+        label="Region κ", format="%.2f", help="Cohen's kappa on the region"
+    ),
+    "kappa_basal_score": st.column_config.NumberColumn(
+        label="Basal κ",
+        format="%.2f",
+        help="Weighted kappa on basal scores where both chose BasalGanglia",
+    ),
+    "kappa_corona_score": st.column_config.NumberColumn(
+        label="Corona κ",
+        format="%.2f",
+        help="Weighted kappa on corona scores where both chose CoronaRadiata",
+    ),
+    "image_set_id": st.column_config.TextColumn(label="Scan Type"),
+    "n_items": st.column_config.NumberColumn(
+        label="Images", help="Images rated by at least two doctors"
+    ),
+    "fleiss_kappa_region": st.column_config.NumberColumn(
+        label="Region Fleiss κ", format="%.2f"
+    ),
+    "alpha_region": st.column_config.NumberColumn(label="Region α", format="%.2f"),
+    "alpha_basal_score": st.column_config.NumberColumn(
+        label="Basal α", format="%.2f", help="Krippendorff's alpha (interval)"
+    ),
+    "alpha_corona_score": st.column_config.NumberColumn(
+        label="Corona α", format="%.2f", help="Krippendorff's alpha (interval)"
+    ),
+}
+
 config_chosen = {
     "scan_id": st.column_config.TextColumn(
         label="Scan Type", disabled=True, pinned=True, help="Type of scan performed"
@@ -129,6 +243,12 @@ config_chosen = {
         disabled=True,
         help="Indicates if the scan has been evaluated by you",
     ),
+    "completion": st.column_config.ProgressColumn(
+        label="Completion",
+        min_value=0.0,
+        max_value=1.0,
+        help="Share of the scan's images you have evaluated",
+    ),
 }
 doctor_uuid = st.session_state.get("user")
 if not doctor_uuid:
@@ -141,10 +261,10 @@ else:
     )
     st.title("Dashboard")
     with get_session() as session:
-        df = get_image_sets_with_evaluation_status(doctor_uuid, session)
-        evaluated_count, total_count, progress = get_image_set_evaluation_progress(
-            doctor_uuid, session
+        df = get_image_sets_with_evaluation_status(
+            doctor_uuid, get_revision(doctor_uuid), session
         )
+    evaluated_count, total_count, progress = get_image_set_evaluation_progress(df)
     st.progress(
         value=progress,
         text=(
@@ -152,6 +272,18 @@ else:
             f"({progress * 100:.2f}%)"
         ),
     )
+    with get_session() as session:
+        job_counts = get_job_counts(session)
+    queued = job_counts[JobStatus.Pending] + job_counts[JobStatus.Running]
+    if queued:
+        # Jobs may be left over from before a restart
+        refresh_worker.start()
+        st.caption(f"🔄 Checking conflicts of {queued} recently saved scans…")
+    if job_counts[JobStatus.Failed]:
+        st.warning(
+            f"Conflict checks failed for {job_counts[JobStatus.Failed]} scans; "
+            "they are retried when the scans are saved again."
+        )
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Choose scans to evaluate")
@@ -159,13 +291,21 @@ else:
             data=df,
             use_container_width=True,
             column_config=config_self,
-            disabled=["scan_id", "patient_id", "num_images", "conflicted", "evaluated"],
+            disabled=[
+                "scan_id",
+                "patient_id",
+                "num_images",
+                "conflicted",
+                "evaluated",
+                "completion",
+            ],
             column_order=[
                 "scan_id",
                 "patient_id",
                 "num_images",
                 "conflicted",
                 "evaluated",
+                "completion",
                 "edit",
             ],
             hide_index=True,
@@ -176,7 +316,7 @@ else:
         if not selected_scans.empty:
             st.subheader("Selected Scans for Evaluation")
             st.dataframe(
-                selected_scans.drop(columns=["edit"]),
+                selected_scans.drop(columns=["edit", "evaluated_images"]),
                 use_container_width=True,
                 hide_index=True,
                 column_config=config_chosen,
@@ -193,3 +333,8 @@ else:
         else:
             st.subheader("No Scans Selected")
             st.write("Please select scans to evaluate by checking the 'Evaluate' box.")
+
+    with st.expander("Inter-rater agreement"):
+        # Reads every doctor's evaluations, so only computed when asked for
+        if st.toggle("Compute agreement statistics", key="show_agreement"):
+            render_agreement_panel()
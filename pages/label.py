@@ -1,15 +1,20 @@
-from typing import List
+import os
+import time
+from typing import List, Tuple
+import numpy as np
 import streamlit as st
-from PIL import Image as PILImage
 from utils.db import get_session
-from utils.image_session import ImageSetEvaluationSession, ImageEvaluationSession
-from utils.image_session import prepare_image_set_evaluation
-from utils.models import Region
-from utils.evaluation import (
-    add_or_update_image_evaluation,
-    add_or_update_set_evaluation,
-)
-from utils.config import BASEL_MAX, CORONA_MAX
+from utils.image_session import ImageSetEvaluationSession, SliceAnnotations
+from utils.image_session import prepare_image_set_evaluations
+from utils.image_cache import slice_cache, prefetch_neighbours
+from utils.volume_store import open_volume
+from utils.previews import get_filmstrip, get_preview, preview_loader
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.autosave import autosave_queue
+from utils.refresh_jobs import enqueue_refresh, refresh_worker
+from utils.credentials import revoke_session_token
+from utils.config import BASEL_MAX, CORONA_MAX, PREVIEW_DISPLAY_WIDTH
+from utils.revision import get_revision
 
 st.set_page_config(
     page_title="Labeling Phase",
@@ -28,51 +33,73 @@ elif selected_scans is None:
 
 
 def reset():
-    st.cache_data.clear()
+    token = app.get("session_token")
+    if token:
+        # Log the token out; main.py then deletes the session cookie
+        with get_session() as session:
+            revoke_session_token(session, token)
     st.session_state.clear()
     st.switch_page("pages/login.py")
 
 
 def save_annotations():
-    conversion_dict = {
-        "BasalGanglia": Region.BasalGanglia,
-        "CoronaRadiata": Region.CoronaRadiata,
-        None: Region.None_,
-    }
+    # Write queued autosaves first so none of them lands after the full save
+    autosave_queue.flush()
     with get_session() as session:
         for set_ in app.labeling_session:
-            add_or_update_set_evaluation(
+            bulk_upsert_image_evaluations(
                 session,
                 doctor_id=doctor_uuid,
                 image_set_id=set_.image_set_id,
+                rows=set_.images.evaluation_rows(),
                 low_quality=set_.low_quality,
                 irrelevant=set_.irrelevant_data,
             )
-            for img in set_.images:
-                add_or_update_image_evaluation(
-                    session,
-                    doctor_id=doctor_uuid,
-                    image_id=img.image_id,
-                    image_set_id=set_.image_set_id,
-                    region=conversion_dict[img.region],
-                    basal_score=img.score if img.region == "BasalGanglia" else None,
-                    corona_score=img.score if img.region == "CoronaRadiata" else None,
-                )
-        session.commit()
     st.success("Annotations saved successfully.")
 
 
-@st.cache_data
+def autosave(indices: List[int]) -> None:
+    """Queue slices of the current set, and its set-level flags, for autosave."""
+    set_ = app.current_session
+    autosave_queue.enqueue(
+        doctor_uuid,
+        set_.image_set_id,
+        set_.images.evaluation_rows(indices),
+        low_quality=set_.low_quality,
+        irrelevant=set_.irrelevant_data,
+    )
+
+
+def render_autosave_status() -> None:
+    status = autosave_queue.status(doctor_uuid)
+    dropped = autosave_queue.pop_dropped(doctor_uuid)
+    if dropped:
+        st.warning(
+            "These edits were invalid and could not be saved:\n"
+            + "\n".join(f"- {message}" for message in dropped)
+        )
+    if status.last_error:
+        st.caption("⚠️ Autosave failed, retrying in the background.")
+    elif autosave_queue.pending_count(doctor_uuid):
+        st.caption("Saving changes…")
+    elif status.last_flush:
+        saved_at = time.strftime("%H:%M:%S", time.localtime(status.last_flush))
+        st.caption(f"All changes saved at {saved_at}.")
+
+
+@st.cache_data(ttl=600, max_entries=64)
 def prepare_labeling_session(
-    _session, doctor_id: str = doctor_uuid, list_scan: List[str] = selected_scans
+    _session,
+    doctor_id: str = doctor_uuid,
+    list_scan: List[str] = selected_scans,
+    revision: Tuple[int, int] = (0, 0),
 ) -> List[ImageSetEvaluationSession]:
+    """Load the selected scans; revision keys the cache on the doctor's data."""
     with get_session() as session:
-        img_set_sessions = []
+        img_set_sessions = prepare_image_set_evaluations(session, doctor_id, list_scan)
+        found_ids = {s.image_set_id for s in img_set_sessions}
         for scan_id in list_scan:
-            img_set_eval = prepare_image_set_evaluation(session, doctor_id, scan_id)
-            if img_set_eval:
-                img_set_sessions.append(img_set_eval)
-            else:
+            if scan_id not in found_ids:
                 st.warning(f"No evaluations found for scan {scan_id}.")
         return img_set_sessions
 
@@ -117,12 +144,63 @@ def render_metadata_panel(
             st.warning("No labeler's opinions available for this set.")
 
 
-def render_image_column(img_path: str, img_index: int, num_images: int):
+def render_image_column(
+    img_path: str,
+    img_index: int,
+    num_images: int,
+    image_set_id: str = None,
+    full_resolution: bool = False,
+):
     """Render a column with an image and navigation controls."""
-    img = PILImage.open(img_path)
-    st.image(
-        img, caption=f"Image {img_index + 1}/{num_images}", use_container_width=True
-    )
+    caption = f"Image {img_index + 1}/{num_images}"
+    if not full_resolution:
+        st.image(
+            get_preview(img_path, PREVIEW_DISPLAY_WIDTH),
+            caption=caption,
+            use_container_width=True,
+        )
+        return
+
+    img = None
+    volume = _display_volume(image_set_id)
+    if volume is not None:
+        try:
+            img = volume.slice_by_id(os.path.basename(img_path))
+        except KeyError:
+            pass  # volume built before this slice was added
+    if img is None:
+        img = slice_cache.get(img_path)
+    st.image(img, caption=caption, use_container_width=True)
+
+
+def _display_volume(image_set_id: str):
+    """The packed volume full-resolution slices are shown from, if usable."""
+    volume = open_volume(image_set_id) if image_set_id else None
+    if volume is not None and volume.array.dtype == np.uint8:
+        return volume
+    return None
+
+
+def prefetch_displayed(set_session, full_resolution: bool) -> None:
+    """Prefetch the neighbouring slices in the form render_image_column shows."""
+    if not full_resolution:
+        prefetch_neighbours(set_session, load=preview_loader(PREVIEW_DISPLAY_WIDTH))
+    elif _display_volume(set_session.image_set_id) is None:
+        prefetch_neighbours(set_session)
+    # Slices of a packed volume are memory-mapped; there is nothing to decode
+
+
+def render_filmstrip(image_paths: List[str]) -> None:
+    """
+    Render a thumbnail sprite of the whole series. The sprite checksums every
+    slice, so it is only built while the overview is switched on.
+    """
+    with st.expander("Series Overview", expanded=False):
+        if not st.toggle("Show series overview", key="show_filmstrip"):
+            return
+        sprite_path, columns = get_filmstrip(image_paths)
+        st.image(sprite_path, use_container_width=True)
+        st.caption(f"{len(image_paths)} slices, {columns} per row")
 
 
 def render_image_navigation_controls(
@@ -161,22 +239,23 @@ def render_set_column(set_index: int, num_sets: int, key_prefix: str):
     return new_index
 
 
-def render_image_region_controls() -> None:
-    idx = app.current_session.current_index
-    # Define keys and default values
-    if app.current_session.images[idx].region == "None":
-        default_ = None
-    else:
-        default_ = app.current_session.images[idx].region
-    keys_with_defaults = {
-        f"segmented_control_{idx}_{app.current_session.image_set_id}": default_
-    }
-    # Initialize session state
-    for key, default in keys_with_defaults.items():
-        st.session_state.setdefault(key, default)
+def _seed_slice_widget(key: str, value) -> None:
+    """
+    Point a per-slice widget at the current slice. The region and score
+    controls use one session_state key each instead of one per slice, so
+    they are re-seeded from the model when the shown slice changes.
+    """
+    current = (app.current_session.image_set_id, app.current_session.current_index)
+    seeded = app.setdefault("seeded_slices", {})
+    if seeded.get(key) != current or key not in st.session_state:
+        st.session_state[key] = value
+        seeded[key] = current
 
-    # Extract keys for easier access
-    key_region = f"segmented_control_{idx}_{app.current_session.image_set_id}"
+
+def render_image_region_controls() -> None:
+    image = app.current_session.images[app.current_session.current_index]
+    key_region = "segmented_control_region"
+    _seed_slice_widget(key_region, image.region)
 
     options = ["BasalGanglia", "CoronaRadiata"]
 
@@ -189,38 +268,30 @@ def render_image_region_controls() -> None:
         label="Region:",
         selection_mode="single",
     )
-    if app.current_session.images[idx].region != st.session_state[key_region]:
-        if app.current_session.images[idx].region is None:
-            app.current_session.images[idx].score = None
+    if image.region != st.session_state[key_region]:
+        if image.region is None:
+            image.score = None
         else:
-            app.current_session.images[idx].score = 0
-    app.current_session.images[idx].region = st.session_state[key_region]
-    print(f"Selected region: {app.current_session.images[idx].region}")
+            image.score = 0
+        # Re-seed the score control from the new score
+        st.session_state.pop("score_control", None)
+    image.region = st.session_state[key_region]
+    print(f"Selected region: {image.region}")
 
 
 def render_image_score_controls() -> None:
-    idx = app.current_session.current_index
-    # Define keys and default values
-    keys_with_defaults = {
-        f"score_{idx}_{app.current_session.image_set_id}": app.current_session.images[
-            idx
-        ].score,
-    }
-    # Initialize session state
-    for key, default in keys_with_defaults.items():
-        st.session_state.setdefault(key, default)
-
-    # Extract keys for easier access
-    key = f"score_{idx}_{app.current_session.image_set_id}"
+    image = app.current_session.images[app.current_session.current_index]
+    key = "score_control"
+    _seed_slice_widget(key, image.score)
 
-    if app.current_session.images[idx].region == "BasalGanglia":
+    if image.region == "BasalGanglia":
         st.number_input(
             f"Basal Ganglia Score (0-{BASEL_MAX}):",
             min_value=0,
             max_value=BASEL_MAX,
             key=key,
         )
-    elif app.current_session.images[idx].region == "CoronaRadiata":
+    elif image.region == "CoronaRadiata":
         st.number_input(
             f"Corona Radiata Score (0-{CORONA_MAX}):",
             min_value=0,
@@ -228,7 +299,7 @@ def render_image_score_controls() -> None:
             key=key,
         )
     # Sync back to model
-    app.current_session.images[idx].score = st.session_state[key]
+    image.score = st.session_state[key]
 
 
 def render_set_evaluation_controls() -> None:
@@ -258,19 +329,16 @@ def render_set_evaluation_controls() -> None:
         st.checkbox("Low Quality", key=key_disq)
 
     # Sync back to model
+    flags = (app.current_session.irrelevant_data, app.current_session.low_quality)
     app.current_session.irrelevant_data = st.session_state[key_irre]
     app.current_session.low_quality = st.session_state[key_disq]
+    if flags != (app.current_session.irrelevant_data, app.current_session.low_quality):
+        autosave([])
 
 
 def check_annotate_completely() -> bool:
-    def check_image_annotations_complete(images: List[ImageEvaluationSession]) -> bool:
-        has_basal = any(
-            img.region == "BasalGanglia" and img.score is not None for img in images
-        )
-        has_corona = any(
-            img.region == "CoronaRadiata" and img.score is not None for img in images
-        )
-        return has_basal and has_corona
+    def check_image_annotations_complete(images: SliceAnnotations) -> bool:
+        return images.has_scored("BasalGanglia") and images.has_scored("CoronaRadiata")
 
     for set_ in app.labeling_session:
         if set_.irrelevant_data or set_.low_quality:
@@ -284,7 +352,7 @@ st.title("Annotation Phase")
 with get_session() as session:
     if "labeling_session" not in app:
         app.labeling_session = prepare_labeling_session(
-            get_session(), doctor_uuid, selected_scans
+            get_session(), doctor_uuid, selected_scans, get_revision(doctor_uuid)
         )
         app.session_index = 0
         app.current_session = (
@@ -298,7 +366,11 @@ with col1:
         img_path=img_path,
         img_index=app.current_session.current_index,
         num_images=len(app.current_session.images),
+        image_set_id=app.current_session.image_set_id,
+        full_resolution=app.get("full_resolution", False),
     )
+    prefetch_displayed(app.current_session, app.get("full_resolution", False))
+    render_filmstrip(app.current_session.images.image_paths)
 
 with col2:
     with st.expander("## Image Navigation", expanded=True):
@@ -307,6 +379,7 @@ with col2:
             img_index=app.current_session.current_index,
             key_prefix="image_navigation",
         )
+        st.toggle("Full resolution", key="full_resolution")
         if new_image_index != app.current_session.current_index:
             app.current_session.current_index = new_image_index
             st.rerun()
@@ -319,13 +392,19 @@ with col2:
             "You cannot annotate images when the set is marked as irrelevant or low quality."
         )
     else:
+        image = app.current_session.images[app.current_session.current_index]
+        annotation = (image.region, image.score)
         with st.expander("## Current Image Evaluation", expanded=True):
             acol1, acol2 = st.columns([1, 1])
             with acol1:
                 render_image_region_controls()
             with acol2:
-                if app.current_session.images[app.current_session.current_index].region:
+                if image.region:
                     render_image_score_controls()
+        # A region picked without a score yet is saved once it is scored
+        scored = image.region is None or image.score is not None
+        if (image.region, image.score) != annotation and scored:
+            autosave([app.current_session.current_index])
 
 
 with col3:
@@ -338,18 +417,16 @@ with col3:
         labeler_opinion=None,
     )
     render_set_evaluation_controls()
+    render_autosave_status()
 
     if not check_annotate_completely():
         st.warning("Please complete all image annotations before proceeding.")
     else:
         if st.button("Confirm Annotations"):
             save_annotations()
+            saved_set_ids = [set_.image_set_id for set_ in app.labeling_session]
+            # Conflicts and consensus are refreshed by the background worker
+            refresh_worker.start()
             with get_session() as session:
-                from utils.conflict import (
-                    scan_and_update_image_set_conflicts,
-                    flag_conflicted_image_sets,
-                )
-
-                scan_and_update_image_set_conflicts(session)
-                flag_conflicted_image_sets(session)
+                enqueue_refresh(session, saved_set_ids)
             reset()
@@ -1,12 +1,15 @@
 import streamlit as st
 from utils.db import get_session
-from utils.credentials import login_doctor
+from utils.credentials import issue_session_token, login_doctor
 
 st.set_page_config(
     page_title="Login",
     page_icon=":key:",
     layout="centered",
 )
+if st.session_state.get("user"):
+    # Already logged in, e.g. restored from the session token after a reload
+    st.switch_page("pages/dashboard.py")
 with st.form("login_form", clear_on_submit=True, enter_to_submit=True, border=True):
     st.title("Login to MedFabric")
     username_input = st.text_input("Username:")
@@ -16,12 +19,16 @@ with st.form("login_form", clear_on_submit=True, enter_to_submit=True, border=Tr
         if not username_input or not password_input:
             st.error("Please enter both username and password.")
         with get_session() as session:
-            doctor = login_doctor(session, username_input, password_input)
-            if doctor:
+            doctor_uuid = login_doctor(session, username_input, password_input)
+            if doctor_uuid:
                 st.success("Login successful")
 
                 # e.g., store in session_state
-                st.session_state.user = doctor.uuid
+                st.session_state.user = doctor_uuid
+                # Lets a page reload restore the login (see main.py)
+                st.session_state.session_token = issue_session_token(
+                    session, doctor_uuid
+                )
                 st.switch_page("pages/dashboard.py")
             else:
                 st.error("Invalid username or password")
@@ -1,19 +1,22 @@
-from sqlalchemy import create_engine
+from utils.db import engine
 from utils.load_patients import (
     load_image_sets_from_csv,
     load_patients,
     load_images_from_filesystem,
 )
+from utils.migrations import add_missing_columns, add_missing_indexes
 from utils.models import Base
+from utils.volume_store import build_volumes
 
 
 def init_db():
     """
     Initialize the database by creating all tables.
     """
-    engine = create_engine("sqlite:///medfabric.sqlite3")
     Base.metadata.create_all(engine)
     print("🧱 All tables created if not exist.")
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
 
 
 def setup_db():
@@ -23,6 +26,8 @@ def setup_db():
     print("✅ Image sets loaded into database.")
     load_images_from_filesystem()
     print("✅ Images loaded into database.")
+    build_volumes()
+    print("✅ Slice volumes built.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import pandas as pd
+from utils.agreement import (
+    RatingMatrix,
+    fleiss_kappa,
+    krippendorff_alpha,
+    pairwise_cohen_kappa,
+)
+
+
+def region_matrix(codes, image_set_ids=None) -> RatingMatrix:
+    """Build a RatingMatrix of region codes (doctor x image, -1 missing)."""
+    codes = np.asarray(codes, dtype=np.int16)
+    if image_set_ids is None:
+        image_set_ids = ["set"] * codes.shape[1]
+    items = pd.MultiIndex.from_arrays(
+        [image_set_ids, [f"{i:03d}.png" for i in range(codes.shape[1])]],
+        names=["image_set_id", "image_id"],
+    )
+    doctors = pd.Index([f"D{i}" for i in range(codes.shape[0])], name="doctor_id")
+    return RatingMatrix(doctors, items, {"region": codes})
+
+
+class TestAgreement(unittest.TestCase):
+    def test_cohen_kappa(self):
+        # 20 agree on 1, 15 agree on 0, 5 + 10 disagreements: kappa = 0.4
+        first = [1] * 25 + [0] * 25
+        second = [1] * 20 + [0] * 5 + [1] * 10 + [0] * 15
+        pairs = pairwise_cohen_kappa(region_matrix([first, second, [-1] * 50]))
+        self.assertEqual(len(pairs), 1)
+        row = pairs.iloc[0]
+        self.assertEqual((row["doctor_a"], row["doctor_b"]), ("D0", "D1"))
+        self.assertEqual(row["n_items"], 50)
+        self.assertAlmostEqual(row["agreement"], 0.7)
+        self.assertAlmostEqual(row["kappa"], 0.4)
+
+    def test_fleiss_kappa(self):
+        # Two image sets: perfect agreement, and agreement at chance level
+        codes = [
+            [0, 1, 2, 0, 0, 1],
+            [0, 1, 2, 1, 0, 1],
+            [0, 1, 2, -1, -1, -1],
+        ]
+        result = fleiss_kappa(
+            region_matrix(codes, ["a", "a", "a", "b", "b", "b"]), by="image_set_id"
+        )
+        self.assertEqual(result.loc["a", "n_items"], 3)
+        self.assertAlmostEqual(result.loc["a", "kappa"], 1.0)
+        # b: P_bar = 2/3, p = (1/2, 1/2), P_e = 1/2
+        self.assertAlmostEqual(result.loc["b", "kappa"], 1 / 3)
+
+    def test_krippendorff_alpha(self):
+        # Two doctors, one disagreement out of four images
+        codes = [[0, 0, 1, 1], [0, 0, 1, 0]]
+        result = krippendorff_alpha(region_matrix(codes), by=None)
+        # o = [[4, 1], [1, 2]], n = 8: alpha = 1 - 7 * 2 / (2 * 5 * 3)
+        self.assertAlmostEqual(result.loc["all", "alpha"], 1 - 14 / 30)
+        self.assertEqual(result.loc["all", "n_pairable"], 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+import unittest
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+from fixtures import seed_image_sets
+from utils.autosave import AutosaveQueue
+from utils.db import create_db_engine
+from utils.models import Base, Evaluation, ImageSetEvaluation, Region
+
+
+class TestAutosaveQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # File-backed, so the writer thread sees the same database
+        self.engine = create_db_engine(
+            f"sqlite:///{os.path.join(self.tmp.name, 'db.sqlite3')}"
+        )
+        Base.metadata.create_all(self.engine)
+        with Session(self.engine) as session:
+            seed_image_sets(session, image_ids=[f"{j}.png" for j in range(3)])
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def queue(self, **kwargs):
+        queue = AutosaveQueue(sessionmaker(bind=self.engine), **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def evaluations(self):
+        with Session(self.engine) as session:
+            return session.execute(
+                select(Evaluation.image_id, Evaluation.region, Evaluation.basal_score)
+            ).all()
+
+    def test_only_latest_edit_is_written(self):
+        queue = self.queue(delay=60, max_delay=60)
+        for score in (1, 2):
+            queue.enqueue(
+                "d",
+                "s",
+                [
+                    {
+                        "image_id": "1.png",
+                        "region": Region.BasalGanglia,
+                        "basal_score": score,
+                    }
+                ],
+                low_quality=True,
+            )
+        self.assertEqual(queue.pending_count("d"), 1)
+        self.assertEqual(self.evaluations(), [])
+
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(self.evaluations(), [("1.png", Region.BasalGanglia, 2)])
+        self.assertEqual(queue.pending_count(), 0)
+        with Session(self.engine) as session:
+            self.assertTrue(session.scalar(select(ImageSetEvaluation.is_low_quality)))
+
+    def test_background_flush(self):
+        queue = self.queue(delay=0.05, max_delay=1, max_edits=100)
+        queue.enqueue("d", "s", [{"image_id": "0.png", "region": Region.None_}])
+        deadline = time.monotonic() + 5
+        while queue.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        queue.close()
+        self.assertEqual(self.evaluations(), [("0.png", Region.None_, None)])
+        self.assertIsNone(queue.status("d").last_error)
+        self.assertIsNotNone(queue.status("d").last_flush)
+
+    def test_invalid_rows_are_dropped_alone(self):
+        queue = self.queue(delay=60, max_delay=60)
+        queue.enqueue(
+            "d",
+            "s",
+            [
+                {"image_id": "0.png", "region": Region.None_},
+                # Region.None_ takes no score
+                {"image_id": "1.png", "region": Region.None_, "basal_score": 3},
+            ],
+        )
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(self.evaluations(), [("0.png", Region.None_, None)])
+
+        self.assertIsNone(queue.status("d").last_error)
+        self.assertIsNone(queue.status("other").last_flush)
+        dropped = queue.pop_dropped("d")
+        self.assertEqual(len(dropped), 1)
+        self.assertTrue(dropped[0].startswith("s/1.png"))
+        self.assertEqual(queue.pop_dropped("d"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
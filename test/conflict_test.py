@@ -0,0 +1,126 @@
+import unittest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from fixtures import seed_image_sets
+from utils.conflict import (
+    scan_and_update_image_conflicts,
+    scan_and_update_image_conflicts_sql,
+)
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.models import Base, Conflict, ConflictType, Region
+
+BASAL = Region.BasalGanglia
+CORONA = Region.CoronaRadiata
+
+# (doctor, image set, image, region, score) of every evaluation
+EVALUATIONS = [
+    # Region disagreement
+    ("a", "s", "0", BASAL, 1),
+    ("b", "s", "0", CORONA, 1),
+    # Basal score disagreement
+    ("a", "s", "1", BASAL, 1),
+    ("b", "s", "1", BASAL, 2),
+    # Corona score disagreement, third doctor agreeing with one
+    ("a", "s", "2", CORONA, 0),
+    ("b", "s", "2", CORONA, 3),
+    ("c", "s", "2", CORONA, 3),
+    # Agreement
+    ("a", "s", "3", Region.None_, None),
+    ("b", "s", "3", Region.None_, None),
+    # Single evaluation
+    ("a", "s", "4", BASAL, 2),
+    # Other set, outside scoped scans
+    ("a", "t", "0", BASAL, 1),
+    ("b", "t", "0", BASAL, 3),
+]
+
+
+def evaluate(session, evaluations) -> None:
+    for doctor, image_set_id, image_id, region, score in evaluations:
+        row = {"image_id": image_id, "region": region}
+        if region == BASAL:
+            row["basal_score"] = score
+        elif region == CORONA:
+            row["corona_score"] = score
+        bulk_upsert_image_evaluations(session, doctor, image_set_id, [row])
+
+
+def make_session() -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    seed_image_sets(session, ("s", "t"), [str(j) for j in range(5)], ("a", "b", "c"))
+    # Recorded by an earlier scan: one resolved that is back, one open that is gone
+    session.add(
+        Conflict(image_set_id="s", image_id="1", type=ConflictType.Score, resolved=True)
+    )
+    session.add(
+        Conflict(
+            image_set_id="s",
+            image_id="3",
+            type=ConflictType.Classification,
+            resolved=False,
+        )
+    )
+    session.commit()
+    evaluate(session, EVALUATIONS)
+    return session
+
+
+def conflicts(session):
+    return sorted(
+        session.execute(
+            select(
+                Conflict.image_set_id,
+                Conflict.image_id,
+                Conflict.type,
+                Conflict.resolved,
+            )
+        ).all()
+    )
+
+
+class TestConflictScanEquivalence(unittest.TestCase):
+    def setUp(self):
+        self.python = make_session()
+        self.sql = make_session()
+
+    def tearDown(self):
+        self.python.close()
+        self.sql.close()
+
+    def scan(self, image_set_ids=None):
+        scan_and_update_image_conflicts(self.python, image_set_ids)
+        scan_and_update_image_conflicts_sql(self.sql, image_set_ids)
+        result = conflicts(self.python)
+        self.assertEqual(conflicts(self.sql), result)
+        return result
+
+    def test_same_conflicts(self):
+        self.assertEqual(
+            self.scan(["s"]),
+            [
+                ("s", "0", ConflictType.Classification, False),
+                ("s", "1", ConflictType.Score, False),
+                ("s", "2", ConflictType.Score, False),
+                ("s", "3", ConflictType.Classification, True),
+            ],
+        )
+
+        # Disagreements settled on one image and appearing on another
+        changes = [
+            ("b", "s", "0", BASAL, 1),
+            ("a", "s", "2", CORONA, 3),
+            ("b", "s", "4", CORONA, 2),
+        ]
+        for session in (self.python, self.sql):
+            evaluate(session, changes)
+        result = self.scan()
+        self.assertIn(("s", "0", ConflictType.Classification, True), result)
+        self.assertIn(("s", "2", ConflictType.Score, True), result)
+        self.assertIn(("s", "4", ConflictType.Classification, False), result)
+        self.assertIn(("t", "0", ConflictType.Score, False), result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from fixtures import seed_image_sets
+from utils.consensus import (
+    compute_image_consensus,
+    compute_image_set_consensus,
+    refresh_consensus,
+    stale_consensus_image_sets,
+)
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.models import Base, Consensus, ImageSetConsensus, Region
+
+
+class TestConsensus(unittest.TestCase):
+    def test_image_consensus(self):
+        evaluations = pd.DataFrame(
+            {
+                "image_set_id": ["s"] * 5,
+                "image_id": ["a", "a", "a", "b", "b"],
+                "region": [
+                    Region.BasalGanglia,
+                    Region.BasalGanglia,
+                    Region.None_,
+                    Region.CoronaRadiata,
+                    Region.None_,
+                ],
+                "basal_score": [2, 5, None, None, None],
+                "corona_score": [None, None, None, 3, None],
+            }
+        )
+        consensus = compute_image_consensus(evaluations).set_index("image_id")
+        self.assertEqual(consensus.loc["a", "region"], Region.BasalGanglia)
+        self.assertEqual(consensus.loc["a", "region_votes"], 2)
+        self.assertEqual(consensus.loc["a", "num_raters"], 3)
+        self.assertEqual(consensus.loc["a", "basal_score_median"], 3.5)
+        self.assertTrue(pd.isna(consensus.loc["a", "corona_score_mean"]))
+        # Ties go to the earliest region
+        self.assertEqual(consensus.loc["b", "region"], Region.None_)
+        self.assertEqual(consensus.loc["b", "corona_score_mean"], 3.0)
+
+    def test_image_set_consensus(self):
+        set_evaluations = pd.DataFrame(
+            {
+                "image_set_id": ["s", "s", "t", "t"],
+                "is_low_quality": [True, True, True, False],
+                "is_irrelevant": [False, True, False, False],
+            }
+        )
+        consensus = compute_image_set_consensus(set_evaluations).set_index(
+            "image_set_id"
+        )
+        self.assertTrue(consensus.loc["s", "is_low_quality"])
+        self.assertFalse(consensus.loc["s", "is_irrelevant"])
+        self.assertFalse(consensus.loc["t", "is_low_quality"])
+        self.assertEqual(consensus.loc["t", "low_quality_votes"], 1)
+
+    def test_incremental_refresh(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            seed_image_sets(session, ("s", "t"), ("a",))
+
+            for set_id in ("s", "t"):
+                bulk_upsert_image_evaluations(
+                    session, "d", set_id, [{"image_id": "a", "region": Region.None_}]
+                )
+            self.assertEqual(stale_consensus_image_sets(session), ["s", "t"])
+            self.assertEqual(refresh_consensus(session), 2)
+            self.assertEqual(stale_consensus_image_sets(session), [])
+
+            bulk_upsert_image_evaluations(
+                session,
+                "d",
+                "t",
+                [{"image_id": "a", "region": Region.BasalGanglia, "basal_score": 1}],
+                low_quality=True,
+            )
+            self.assertEqual(stale_consensus_image_sets(session), ["t"])
+            self.assertEqual(refresh_consensus(session), 1)
+
+            region = session.scalar(
+                select(Consensus.region).where(Consensus.image_set_id == "t")
+            )
+            self.assertEqual(region, Region.BasalGanglia)
+            self.assertTrue(
+                session.scalar(
+                    select(ImageSetConsensus.is_low_quality).where(
+                        ImageSetConsensus.image_set_id == "t"
+                    )
+                )
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
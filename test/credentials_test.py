@@ -0,0 +1,72 @@
+import unittest
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from utils.config import BCRYPT_ROUNDS
+from utils.credentials import (
+    issue_session_token,
+    login_doctor,
+    pwd_context,
+    revoke_session_token,
+    rotate_session_token,
+    verify_session_token,
+)
+from utils.models import Base, Doctor
+
+
+class TestCredentials(unittest.TestCase):
+    def test_login_rehashes_other_costs(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        cheap_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw")
+        with Session(engine) as session:
+            session.add(Doctor(uuid="d", username="doc", password_hash=cheap_hash))
+            session.commit()
+
+            self.assertIsNone(login_doctor(session, "doc", "wrong"))
+            self.assertIsNone(login_doctor(session, "nobody", "pw"))
+            self.assertEqual(session.get(Doctor, "d").password_hash, cheap_hash)
+
+            token = issue_session_token(session, "d")
+            self.assertEqual(login_doctor(session, "doc", "pw"), "d")
+            # The rehash keeps the password, so sessions stay logged in
+            self.assertEqual(verify_session_token(session, token), "d")
+            new_hash = session.get(Doctor, "d").password_hash
+            self.assertTrue(new_hash.startswith(f"$2b${BCRYPT_ROUNDS:02d}$"))
+            self.assertFalse(pwd_context.needs_update(new_hash))
+            self.assertEqual(login_doctor(session, "doc", "pw"), "d")
+
+    def test_session_tokens(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            doctor = Doctor(uuid="d", username="doc", password_hash="x")
+            session.add(doctor)
+            session.commit()
+
+            token = issue_session_token(session, "d")
+            self.assertEqual(verify_session_token(session, token), "d")
+            expired = issue_session_token(session, "d", ttl=-1)
+            self.assertIsNone(verify_session_token(session, expired))
+            self.assertIsNone(verify_session_token(session, token[:-2] + "xx"))
+            self.assertIsNone(verify_session_token(session, "é"))
+
+            # A password change voids the token, and so does a logout
+            doctor.password_hash = "y"
+            session.commit()
+            self.assertIsNone(verify_session_token(session, token))
+            token = issue_session_token(session, "d")
+            self.assertTrue(revoke_session_token(session, token))
+            self.assertIsNone(verify_session_token(session, token))
+
+            # A restore uses the token once and hands out a new one
+            token = issue_session_token(session, "d")
+            doctor_uuid, rotated = rotate_session_token(session, token)
+            self.assertEqual(doctor_uuid, "d")
+            self.assertIsNone(verify_session_token(session, token))
+            self.assertIsNone(rotate_session_token(session, token))
+            self.assertEqual(verify_session_token(session, rotated), "d")
+
+
+if __name__ == "__main__":
+    unittest.main()
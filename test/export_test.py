@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy.orm import Session
+from fixtures import seed_image_sets
+from utils.db import create_db_engine
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.models import Base, Region
+
+try:
+    from utils.export import (
+        convert_legacy_scan_metadata,
+        export_evaluations,
+        read_evaluations,
+    )
+    import pyarrow  # pylint: disable=unused-import
+except ImportError:  # pyarrow is only needed for exports
+    export_evaluations = None
+
+# (doctor, image set, image, region, basal score, corona score)
+EVALUATIONS = [
+    ("a", "s", "000.png", Region.BasalGanglia, 1, None),
+    ("a", "s", "001.png", Region.CoronaRadiata, None, 2),
+    ("b", "s", "000.png", Region.None_, None, None),
+    ("a", "t", "002.png", Region.BasalGanglia, 3, None),
+]
+
+
+def rows(df: pd.DataFrame, role: bool = False) -> list:
+    """Sorted row tuples of a long dataset, with None for missing values."""
+    columns = ["image_set_id", "doctor_id"]
+    columns += ["role", "slice_index"] if role else ["image_id", "slice_index"]
+    columns += ["region", "basal_score", "corona_score", "is_low_quality"]
+    df = df[columns].astype(object)
+    df = df.where(df.notna(), None).astype({"image_set_id": str})
+    return sorted(
+        df.itertuples(index=False, name=None),
+        key=lambda row: tuple("" if value is None else str(value) for value in row),
+    )
+
+
+@unittest.skipIf(export_evaluations is None, "pyarrow is not installed")
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_db_engine(
+            f"sqlite:///{os.path.join(self.tmp.name, 'db.sqlite3')}"
+        )
+        Base.metadata.create_all(self.engine)
+        with Session(self.engine) as session:
+            seed_image_sets(
+                session, ("s", "t"), [f"{j:03d}.png" for j in range(3)], ("a", "b")
+            )
+            for doctor, image_set_id, image_id, region, basal, corona in EVALUATIONS:
+                bulk_upsert_image_evaluations(
+                    session,
+                    doctor,
+                    image_set_id,
+                    [
+                        {
+                            "image_id": image_id,
+                            "region": region,
+                            "basal_score": basal,
+                            "corona_score": corona,
+                        }
+                    ],
+                    low_quality=doctor == "b",
+                )
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        for fmt in ("parquet", "ipc"):
+            output_dir = os.path.join(self.tmp.name, fmt)
+            # Small chunks write several parts into each partition
+            self.assertEqual(
+                export_evaluations(output_dir, fmt, self.engine, chunksize=2), 4
+            )
+            self.assertEqual(
+                sorted(os.listdir(output_dir)), ["image_set_id=s", "image_set_id=t"]
+            )
+            with self.assertRaises(FileExistsError):
+                export_evaluations(output_dir, fmt, self.engine)
+
+            self.assertEqual(
+                rows(read_evaluations(output_dir, fmt=fmt)),
+                [
+                    ("s", "a", "000.png", 0, "BasalGanglia", 1, None, False),
+                    ("s", "a", "001.png", 1, "CoronaRadiata", None, 2, False),
+                    # Set-level flags of the evaluating doctor
+                    ("s", "b", "000.png", 0, "None", None, None, True),
+                    ("t", "a", "002.png", 2, "BasalGanglia", 3, None, False),
+                ],
+            )
+            subset = read_evaluations(
+                output_dir, columns=["image_id"], image_set_ids=["t"], fmt=fmt
+            )
+            self.assertEqual(subset["image_id"].tolist(), ["002.png"])
+
+    def test_convert_legacy_csv(self):
+        csv_path = os.path.join(self.tmp.name, "scan_metadata.csv")
+        pd.DataFrame(
+            {
+                "scan_type": ["s", "t"],
+                "patient_id": ["p", "p"],
+                "basel_image_a_labeler": ["1-2", None],
+                "basel_score_a_labeler": [2, None],
+                "corona_image_a_labeler": ["3", None],
+                "corona_score_a_labeler": [1, None],
+                "disquality_b_verifier": [None, True],
+                "irrelevance_b_verifier": [None, False],
+            }
+        ).to_csv(csv_path, index=False)
+        output_dir = os.path.join(self.tmp.name, "legacy")
+
+        self.assertEqual(convert_legacy_scan_metadata(csv_path, output_dir), 4)
+        self.assertEqual(
+            rows(read_evaluations(output_dir), role=True),
+            [
+                # Slice specs are 1-based
+                ("s", "a", "labeler", 0, "BasalGanglia", 2, None, False),
+                ("s", "a", "labeler", 1, "BasalGanglia", 2, None, False),
+                ("s", "a", "labeler", 2, "CoronaRadiata", None, 1, False),
+                # Flags without selected slices keep one row
+                ("t", "b", "verifier", None, "None", None, None, True),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
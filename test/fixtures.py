@@ -0,0 +1,38 @@
+from typing import Iterable
+from sqlalchemy.orm import Session
+from utils.models import Doctor, Image, ImageSet, Patient
+
+
+def seed_image_sets(
+    session: Session,
+    image_set_ids: Iterable[str] = ("s",),
+    image_ids: Iterable[str] = ("0",),
+    doctors: Iterable[str] = ("d",),
+) -> None:
+    """
+    Add patient "p", one doctor per uuid (also the username) and image sets
+    of that patient, each with the same images in slice order. An image
+    set's folder_path is its id. Commits the session.
+    """
+    image_ids = list(image_ids)
+    session.add(Patient(patient_id="p"))
+    for doctor in doctors:
+        session.add(Doctor(uuid=doctor, username=doctor, password_hash="x"))
+    for image_set_id in image_set_ids:
+        session.add(
+            ImageSet(
+                image_set_id=image_set_id,
+                patient_id="p",
+                num_images=len(image_ids),
+                folder_path=image_set_id,
+            )
+        )
+        for slice_index, image_id in enumerate(image_ids):
+            session.add(
+                Image(
+                    image_set_id=image_set_id,
+                    image_id=image_id,
+                    slice_index=slice_index,
+                )
+            )
+    session.commit()
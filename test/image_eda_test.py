@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image as PILImage
+
+try:
+    from EDA.image_eda import calculate_image_statistics
+except ImportError:  # cv2 is only installed for the EDA scripts
+    calculate_image_statistics = None
+
+
+@unittest.skipIf(calculate_image_statistics is None, "cv2 is not installed")
+class TestImageStatistics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "slice.png")
+        # Left half background, right half at 200
+        pixels = np.zeros((8, 8), dtype=np.uint8)
+        pixels[:, 4:] = 200
+        PILImage.fromarray(pixels).save(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_statistics(self):
+        stats = calculate_image_statistics(self.path, (2.0, -300.0))
+        self.assertEqual((stats["height"], stats["width"]), (8, 8))
+        self.assertAlmostEqual(stats["mean"], 100.0)
+        self.assertAlmostEqual(stats["std"], 100.0)
+        self.assertEqual((stats["min"], stats["max"]), (0, 200))
+        self.assertEqual((stats["p25"], stats["p75"]), (0, 200))
+        self.assertAlmostEqual(stats["foreground"], 0.5)
+        self.assertFalse(stats["is_blank"])
+        # 0 maps to -300 HU (air), 200 to 100 HU (subdural)
+        self.assertAlmostEqual(stats["window_air"], 0.5)
+        self.assertAlmostEqual(stats["window_subdural"], 0.5)
+        self.assertAlmostEqual(stats["window_brain"], 0.0)
+        self.assertAlmostEqual(sum(stats[f"hist_{i:02d}"] for i in range(32)), 1.0)
+
+    def test_without_rescale(self):
+        stats = calculate_image_statistics(self.path, None)
+        self.assertFalse(any(key.startswith("window_") for key in stats))
+        self.assertIsNone(calculate_image_statistics(self.tmp.name + "/none.png", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
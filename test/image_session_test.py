@@ -0,0 +1,167 @@
+import pickle
+import unittest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.image_session import SliceAnnotations, prepare_image_set_evaluations
+from utils.models import Base, Doctor, Image, ImageSet, Patient, Region
+
+
+class TestSliceAnnotations(unittest.TestCase):
+    def setUp(self):
+        self.images = SliceAnnotations(
+            "data/set",
+            ["000.png", "001.png", "002.png"],
+            [0, 1, 2],
+            [None, "BasalGanglia", "None"],
+            [None, 4, None],
+        )
+
+    def test_views(self):
+        self.assertEqual(len(self.images), 3)
+        image = self.images[1]
+        self.assertEqual(image.image_id, "001.png")
+        self.assertEqual(image.image_path, "data/set/001.png")
+        self.assertEqual((image.region, image.score), ("BasalGanglia", 4))
+        self.assertIsNone(self.images[2].region)
+        self.assertEqual(self.images[-1].image_id, "002.png")
+        with self.assertRaises(IndexError):
+            self.images[3]
+
+        # Writes through a view land in the arrays
+        self.images[0].region = "CoronaRadiata"
+        self.images[0].score = 2
+        self.assertEqual(self.images[0].score, 2)
+        self.assertTrue(self.images.has_scored("CoronaRadiata"))
+        self.images[0].score = None
+        self.assertFalse(self.images.has_scored("CoronaRadiata"))
+
+    def test_evaluation_rows(self):
+        self.images[2].region = "CoronaRadiata"
+        self.images[2].score = 1
+        rows = list(pickle.loads(pickle.dumps(self.images)).evaluation_rows())
+        self.assertEqual(rows[0]["region"], Region.None_)
+        self.assertEqual(
+            rows[1],
+            {
+                "image_id": "001.png",
+                "region": Region.BasalGanglia,
+                "basal_score": 4,
+                "corona_score": None,
+            },
+        )
+        self.assertEqual(rows[2]["corona_score"], 1)
+
+
+class TestPrepareImageSetEvaluations(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.session.add(Patient(patient_id="p"))
+        for doctor in ("a", "b"):
+            self.session.add(Doctor(uuid=doctor, username=doctor, password_hash="x"))
+        for image_set_id in ("s", "t", "u"):
+            self.session.add(
+                ImageSet(
+                    image_set_id=image_set_id,
+                    patient_id="p",
+                    num_images=3,
+                    folder_path=f"data/{image_set_id}",
+                )
+            )
+            # Inserted out of slice order
+            for j in (2, 0, 1):
+                self.session.add(
+                    Image(
+                        image_set_id=image_set_id,
+                        image_id=f"{j:03d}.png",
+                        slice_index=j,
+                    )
+                )
+        self.session.commit()
+        bulk_upsert_image_evaluations(
+            self.session,
+            "a",
+            "s",
+            [{"image_id": "001.png", "region": Region.BasalGanglia, "basal_score": 2}],
+            irrelevant=True,
+        )
+        bulk_upsert_image_evaluations(
+            self.session,
+            "b",
+            "s",
+            [
+                {
+                    "image_id": "000.png",
+                    "region": Region.CoronaRadiata,
+                    "corona_score": 1,
+                }
+            ],
+            low_quality=True,
+        )
+        bulk_upsert_image_evaluations(
+            self.session,
+            "b",
+            "t",
+            [{"image_id": "002.png", "region": Region.None_}],
+            irrelevant=True,
+        )
+        self.session.expunge_all()
+
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        event.remove(self.engine, "before_cursor_execute", self.record)
+        self.session.close()
+
+    def record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def test_one_doctor_in_requested_order(self):
+        sessions = prepare_image_set_evaluations(
+            self.session, "a", ["u", "missing", "s", "t"]
+        )
+        self.assertEqual(len(self.statements), 2)
+        self.assertEqual([s.image_set_id for s in sessions], ["u", "s", "t"])
+
+        u, s, t = sessions
+        for set_session in sessions:
+            self.assertEqual(
+                [image.image_id for image in set_session.images],
+                ["000.png", "001.png", "002.png"],
+            )
+            self.assertEqual(
+                [image.slice_index for image in set_session.images], [0, 1, 2]
+            )
+        self.assertEqual(s.images[1].image_path, "data/s/001.png")
+
+        # Only doctor a's slices and flags
+        self.assertEqual(
+            [(image.region, image.score) for image in s.images],
+            [(None, None), ("BasalGanglia", 2), (None, None)],
+        )
+        self.assertTrue(s.irrelevant_data)
+        self.assertFalse(s.low_quality)
+        self.assertFalse(t.irrelevant_data)
+        self.assertFalse(any(image.region for image in t.images))
+        self.assertEqual(u.patient_id, "p")
+
+    def test_other_doctor(self):
+        s, t = prepare_image_set_evaluations(self.session, "b", ["s", "t"])
+        self.assertEqual(
+            [(image.region, image.score) for image in s.images],
+            [("CoronaRadiata", 1), (None, None), (None, None)],
+        )
+        self.assertTrue(s.low_quality)
+        self.assertFalse(s.irrelevant_data)
+        self.assertTrue(t.irrelevant_data)
+        self.assertEqual(prepare_image_set_evaluations(self.session, "b", []), [])
+        self.assertEqual(
+            prepare_image_set_evaluations(self.session, "b", ["missing"]), []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from utils.migrations import add_missing_columns, add_missing_indexes
+from utils.models import (
+    Base,
+    Conflict,
+    ConflictType,
+    Evaluation,
+    Image,
+    ImageSetEvaluation,
+)
+
+
+def query_plan(engine, stmt) -> str:
+    """Return SQLite's EXPLAIN QUERY PLAN output for a statement as one string."""
+    sql = str(
+        stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+class TestIndexUsage(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+
+    def assertUsesIndex(self, stmt, index_name):
+        plan = query_plan(self.engine, stmt)
+        self.assertIn(index_name, plan)
+
+    def test_evaluations_by_doctor(self):
+        stmt = (
+            select(Evaluation.image_set_id)
+            .where(Evaluation.doctor_id == "doctor")
+            .distinct()
+        )
+        self.assertUsesIndex(stmt, "ix_evaluations_doctor_set")
+
+    def test_evaluations_by_image_set(self):
+        stmt = select(Evaluation).where(Evaluation.image_set_id == "set")
+        self.assertUsesIndex(stmt, "ix_evaluations_set_image")
+
+    def test_image_set_evaluations_by_image_set(self):
+        stmt = select(ImageSetEvaluation).where(
+            ImageSetEvaluation.image_set_id == "set"
+        )
+        self.assertUsesIndex(stmt, "ix_image_set_evaluations_set")
+
+    def test_images_of_set_in_slice_order(self):
+        stmt = (
+            select(Image).where(Image.image_set_id == "set").order_by(Image.slice_index)
+        )
+        self.assertUsesIndex(stmt, "ix_images_set_slice")
+
+    def test_unresolved_conflicts(self):
+        stmt = select(Conflict.image_set_id).where(Conflict.resolved.is_(False))
+        self.assertUsesIndex(stmt, "ix_conflicts_resolved_set")
+
+    def test_set_level_conflicts(self):
+        stmt = select(Conflict).where(
+            Conflict.image_id.is_(None), Conflict.image_set_id.in_(["a", "b"])
+        )
+        self.assertUsesIndex(stmt, "uq_conflicts_set_image_type")
+
+
+class TestAddMissingIndexes(unittest.TestCase):
+    def test_adds_indexes_to_existing_database(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+            for conflict_id, image_id in enumerate(("'i'", "'i'", "NULL", "NULL")):
+                conn.execute(
+                    text(
+                        "INSERT INTO conflicts (conflict_id, image_set_id, image_id, "
+                        f"type, resolved) VALUES ({conflict_id}, 's', {image_id}, "
+                        "'Score', 0)"
+                    )
+                )
+
+        created = add_missing_indexes(engine)
+
+        expected = {ix.name for t in Base.metadata.sorted_tables for ix in t.indexes}
+        self.assertEqual(set(created), expected)
+        self.assertEqual(add_missing_indexes(engine), [])
+        with engine.connect() as conn:
+            count = conn.execute(text("SELECT COUNT(*) FROM conflicts")).scalar()
+        self.assertEqual(count, 2)
+
+    def test_adds_columns_to_existing_database(self):
+        engine = create_engine("sqlite://")
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "CREATE TABLE images (image_id VARCHAR, image_set_id VARCHAR, "
+                    "slice_index INTEGER, PRIMARY KEY (image_id, image_set_id))"
+                )
+            )
+            conn.execute(text("INSERT INTO images VALUES ('i', 's', 0)"))
+
+        self.assertEqual(add_missing_columns(engine), ["images.missing"])
+        self.assertEqual(add_missing_columns(engine), [])
+        with Session(engine) as session:
+            self.assertFalse(session.scalar(select(Image.missing)))
+
+    def test_set_level_conflicts_are_unique(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(Conflict(image_set_id="s", type=ConflictType.Quality))
+            session.commit()
+            session.add(Conflict(image_set_id="s", type=ConflictType.Quality))
+            with self.assertRaises(IntegrityError):
+                session.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
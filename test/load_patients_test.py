@@ -0,0 +1,200 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from utils.db import create_db_engine
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.load_patients import (
+    load_image_sets_from_csv,
+    load_images_from_filesystem,
+    load_patients,
+)
+from utils.models import (
+    Base,
+    Conflict,
+    ConflictType,
+    Doctor,
+    Evaluation,
+    Image,
+    ImageSet,
+    JobStatus,
+    Patient,
+    RefreshJob,
+    Region,
+)
+
+
+class TestIncrementalLoaders(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_db_engine(
+            f"sqlite:///{os.path.join(self.tmp.name, 'db.sqlite3')}"
+        )
+        Base.metadata.create_all(self.engine)
+        self.data = os.path.join(self.tmp.name, "data")
+        self.patients_csv = os.path.join(self.tmp.name, "patients.csv")
+        self.scans_csv = os.path.join(self.tmp.name, "scans.csv")
+        pd.DataFrame(
+            {"patient_id": ["p1", "p2"], "Category": ["A", "B"], "R1:ICH": [1, 0]}
+        ).to_csv(self.patients_csv, index=False)
+        pd.DataFrame(
+            {"scan_type": ["s1", "s2"], "patient_id": ["p1", "p2"], "num_images": 3}
+        ).to_csv(self.scans_csv, index=False)
+        for patient, scan in (("p1", "s1"), ("p2", "s2")):
+            folder = os.path.join(self.data, patient, scan)
+            os.makedirs(folder)
+            for j in range(3):
+                open(os.path.join(folder, f"{j:03d}.png"), "wb").close()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def load_all(self):
+        load_patients(self.engine, self.patients_csv)
+        load_image_sets_from_csv(self.scans_csv, self.data, self.engine)
+        load_images_from_filesystem(self.engine, workers=2)
+
+    def count(self, model):
+        with Session(self.engine) as session:
+            return session.scalar(select(func.count()).select_from(model))
+
+    def test_reload_is_idempotent(self):
+        self.load_all()
+        with Session(self.engine) as session:
+            session.get(ImageSet, "s1").conflicted = True
+            session.commit()
+
+        self.load_all()
+        self.assertEqual(self.count(ImageSet), 2)
+        self.assertEqual(self.count(Image), 6)
+        with Session(self.engine) as session:
+            self.assertTrue(session.get(ImageSet, "s1").conflicted)
+            self.assertEqual(
+                session.execute(
+                    select(Image.image_id, Image.slice_index)
+                    .where(Image.image_set_id == "s2")
+                    .order_by(Image.slice_index)
+                ).all(),
+                [("000.png", 0), ("001.png", 1), ("002.png", 2)],
+            )
+
+        # Updated metadata overwrites the existing rows
+        pd.DataFrame({"patient_id": ["p1"], "Category": ["C"], "R1:ICH": [0]}).to_csv(
+            self.patients_csv, index=False
+        )
+        load_patients(self.engine, self.patients_csv)
+        with Session(self.engine) as session:
+            patient = session.get(Patient, "p1")
+            self.assertEqual(patient.Category, "C")
+            self.assertFalse(getattr(patient, "R1:ICH"))
+        self.assertEqual(self.count(Patient), 2)
+
+    def test_load_into_keyless_patients_table(self):
+        engine = create_db_engine(
+            f"sqlite:///{os.path.join(self.tmp.name, 'legacy.sqlite3')}"
+        )
+        self.addCleanup(engine.dispose)
+        # As written by earlier versions of load_patients
+        pd.DataFrame(
+            {"patient_id": ["p1", "p3"], "Category": [0, 1], "R1:ICH": [True, None]}
+        ).to_sql("patients", con=engine, if_exists="replace", index=False)
+
+        load_patients(engine, self.patients_csv)
+        with Session(engine) as session:
+            self.assertEqual(
+                session.execute(
+                    select(Patient.patient_id, Patient.Category).order_by(
+                        Patient.patient_id
+                    )
+                ).all(),
+                [("p1", "A"), ("p2", "B"), ("p3", "1")],
+            )
+            self.assertFalse(getattr(session.get(Patient, "p2"), "R1:ICH"))
+
+    def annotate(self):
+        with Session(self.engine) as session:
+            session.add(Doctor(uuid="d", username="d", password_hash="x"))
+            session.commit()
+            bulk_upsert_image_evaluations(
+                session,
+                "d",
+                "s1",
+                [
+                    {"image_id": image_id, "region": Region.None_}
+                    for image_id in ("000.png", "001.png")
+                ],
+            )
+            session.add_all(
+                [
+                    Conflict(
+                        image_set_id="s1",
+                        image_id="001.png",
+                        type=ConflictType.Classification,
+                    ),
+                    Conflict(image_set_id="s1", type=ConflictType.Quality),
+                ]
+            )
+            session.commit()
+
+    def images(self, image_set_id):
+        with Session(self.engine) as session:
+            return session.execute(
+                select(Image.image_id, Image.missing)
+                .where(Image.image_set_id == image_set_id)
+                .order_by(Image.image_id)
+            ).all()
+
+    def test_rescan_flags_vanished_slices(self):
+        self.load_all()
+        self.annotate()
+        folder = os.path.join(self.data, "p1", "s1")
+
+        os.remove(os.path.join(folder, "001.png"))
+        load_images_from_filesystem(self.engine, workers=2)
+        self.assertEqual(
+            self.images("s1"),
+            [("000.png", False), ("001.png", True), ("002.png", False)],
+        )
+        self.assertEqual(self.count(Evaluation), 2)
+        self.assertEqual(self.count(Conflict), 2)
+        with Session(self.engine) as session:
+            self.assertEqual(session.get(ImageSet, "s1").num_images, 2)
+
+        # The file comes back
+        open(os.path.join(folder, "001.png"), "wb").close()
+        load_images_from_filesystem(self.engine, workers=2)
+        self.assertFalse(any(missing for _, missing in self.images("s1")))
+
+    def test_empty_listing_is_skipped(self):
+        self.load_all()
+        self.annotate()
+        for image_id in ("000.png", "001.png", "002.png"):
+            os.remove(os.path.join(self.data, "p1", "s1", image_id))
+        load_images_from_filesystem(self.engine, workers=2, prune=True)
+        self.assertFalse(any(missing for _, missing in self.images("s1")))
+        self.assertEqual(self.count(Evaluation), 2)
+
+    def test_prune_deletes_vanished_slices(self):
+        self.load_all()
+        self.annotate()
+        os.remove(os.path.join(self.data, "p1", "s1", "001.png"))
+        load_images_from_filesystem(self.engine, workers=2, prune=True)
+        with Session(self.engine) as session:
+            self.assertEqual(
+                [image_id for image_id, _ in self.images("s1")],
+                ["000.png", "002.png"],
+            )
+            self.assertEqual(
+                session.scalars(select(Evaluation.image_id)).all(), ["000.png"]
+            )
+            self.assertEqual(session.scalars(select(Conflict.image_id)).all(), [None])
+            self.assertEqual(
+                session.scalar(select(RefreshJob.status)), JobStatus.Pending
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
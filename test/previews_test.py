@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image as PILImage
+from utils.previews import get_preview
+
+
+class TestPreviews(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "slice.png")
+        rng = np.random.default_rng(0)
+        PILImage.fromarray(rng.integers(0, 256, (512, 512), dtype=np.uint8)).save(
+            self.source
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_small_sources_are_served_directly(self):
+        root = os.path.join(self.tmp.name, "previews")
+        self.assertEqual(get_preview(self.source, 600, root), self.source)
+        self.assertEqual(get_preview(self.source, 512, root), self.source)
+
+    def test_concurrent_builds_of_one_preview(self):
+        for attempt in range(10):
+            root = os.path.join(self.tmp.name, f"previews{attempt}")
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                paths = set(
+                    pool.map(lambda _: get_preview(self.source, 256, root), range(4))
+                )
+            self.assertEqual(len(paths), 1)
+            preview = paths.pop()
+            with PILImage.open(preview) as img:
+                self.assertEqual(img.size, (256, 256))
+            folder = os.path.dirname(preview)
+            self.assertEqual(os.listdir(folder), [os.path.basename(preview)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import time
+import unittest
+from unittest import mock
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from fixtures import seed_image_sets
+from utils.evaluation import bulk_upsert_image_evaluations
+from utils.models import Base, ImageSet, JobStatus, RefreshJob, Region
+from utils.refresh_jobs import (
+    JOB_MAX_ATTEMPTS,
+    JOB_STALE_SECONDS,
+    _finish_jobs,
+    claim_jobs,
+    enqueue_refresh,
+    get_job_status,
+    recover_interrupted_jobs,
+    run_pending_jobs,
+)
+
+
+class TestRefreshJobs(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = Session(engine)
+        seed_image_sets(self.session, ("s", "t"), doctors=("a", "b"))
+
+    def tearDown(self):
+        self.session.close()
+
+    def job(self, image_set_id):
+        return self.session.scalars(
+            select(RefreshJob).where(RefreshJob.image_set_id == image_set_id)
+        ).one()
+
+    def test_requests_coalesce(self):
+        self.assertEqual(enqueue_refresh(self.session, ["s", "t", "s"]), 2)
+        requested_at = self.job("s").requested_at
+        enqueue_refresh(self.session, ["s"])
+        job = self.job("s")
+        self.assertEqual(job.generation, 2)
+        self.assertEqual(job.requested_at, requested_at)
+
+        self.assertEqual(sorted(claim_jobs(self.session)), ["s", "t"])
+        self.assertEqual(claim_jobs(self.session), {})
+
+    def test_run_refreshes_conflicts(self):
+        for doctor, row in (
+            ("a", {"image_id": "0", "region": Region.None_}),
+            ("b", {"image_id": "0", "region": Region.CoronaRadiata, "corona_score": 0}),
+        ):
+            bulk_upsert_image_evaluations(self.session, doctor, "s", [row])
+        enqueue_refresh(self.session, ["s"])
+        self.assertEqual(run_pending_jobs(self.session), 1)
+        self.assertEqual(get_job_status(self.session), {"s": JobStatus.Done})
+        self.assertTrue(
+            self.session.scalar(
+                select(ImageSet.conflicted).where(ImageSet.image_set_id == "s")
+            )
+        )
+        self.assertEqual(run_pending_jobs(self.session), 0)
+
+    def test_request_while_running_runs_again(self):
+        enqueue_refresh(self.session, ["s"])
+        claimed = claim_jobs(self.session)
+        enqueue_refresh(self.session, ["s"])
+        _finish_jobs(self.session, claimed)
+        self.assertEqual(get_job_status(self.session, ["s"]), {"s": JobStatus.Pending})
+
+    def test_failed_jobs_retry_then_stop(self):
+        enqueue_refresh(self.session, ["s"])
+        for _ in range(JOB_MAX_ATTEMPTS):
+            self.assertEqual(get_job_status(self.session)["s"], JobStatus.Pending)
+            _finish_jobs(self.session, claim_jobs(self.session), error="boom")
+        job = self.job("s")
+        self.assertEqual(job.status, JobStatus.Failed)
+        self.assertEqual(job.error, "boom")
+
+    def test_failing_set_fails_alone(self):
+        def refresh_consensus(session, image_set_ids):
+            if "t" in image_set_ids:
+                raise RuntimeError("broken set")
+
+        enqueue_refresh(self.session, ["s", "t"])
+        with mock.patch("utils.refresh_jobs.refresh_consensus", refresh_consensus):
+            self.assertEqual(run_pending_jobs(self.session), 1)
+        status = get_job_status(self.session)
+        self.assertEqual(status["s"], JobStatus.Done)
+        self.assertEqual(status["t"], JobStatus.Pending)
+        self.assertEqual(self.job("t").error, "broken set")
+
+    def test_recover_only_stale_jobs(self):
+        enqueue_refresh(self.session, ["s", "t"])
+        claim_jobs(self.session)
+        self.job("s").started_at = time.time() - JOB_STALE_SECONDS - 1
+        self.session.commit()
+        self.assertEqual(recover_interrupted_jobs(self.session), 1)
+        self.assertEqual(
+            get_job_status(self.session),
+            {"s": JobStatus.Pending, "t": JobStatus.Running},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import pandas as pd
+from utils.slice_ranges import is_slice_selected, parse_slice_specs
+
+
+class TestSliceRanges(unittest.TestCase):
+    def setUp(self):
+        self.specs = pd.Series(
+            ["4-6", "1,2", None, "54-55, 3", "2-3,3-4", "x,7"],
+            index=["a", "b", "c", "d", "e", "f"],
+        )
+        self.selection = parse_slice_specs(self.specs)
+
+    def test_csr_layout(self):
+        self.assertEqual(self.selection.indices.dtype, np.int32)
+        np.testing.assert_array_equal(self.selection.offsets, [0, 3, 5, 5, 8, 11, 12])
+        np.testing.assert_array_equal(self.selection["a"], [3, 4, 5])
+        np.testing.assert_array_equal(self.selection["d"], [2, 53, 54])
+        # Overlapping ranges are merged, malformed items skipped
+        np.testing.assert_array_equal(self.selection["e"], [1, 2, 3])
+        np.testing.assert_array_equal(self.selection["f"], [6])
+        self.assertEqual(len(self.selection["c"]), 0)
+
+    def test_is_slice_selected(self):
+        self.assertTrue(is_slice_selected(self.selection, "a", 4))
+        self.assertFalse(is_slice_selected(self.selection, "a", 6))
+        self.assertFalse(is_slice_selected(self.selection, "c", 0))
+        self.assertFalse(is_slice_selected(self.selection, "missing", 3))
+        np.testing.assert_array_equal(
+            self.selection.is_slice_selected(["b", "b", "d", "d"], [0, 2, 53, -1]),
+            [True, False, True, False],
+        )
+        np.testing.assert_array_equal(
+            self.selection.is_slice_selected("d", np.arange(52, 56)),
+            [False, True, True, False],
+        )
+
+    def test_intervals(self):
+        intervals = self.selection.to_intervals()
+        self.assertEqual(
+            list(intervals.itertuples(index=False, name=None)),
+            [
+                ("a", 3, 5),
+                ("b", 0, 1),
+                ("d", 2, 2),
+                ("d", 53, 54),
+                ("e", 1, 3),
+                ("f", 6, 6),
+            ],
+        )
+
+    def test_zero_based(self):
+        selection = parse_slice_specs(pd.Series(["0-2"]), one_based=False)
+        np.testing.assert_array_equal(selection[0], [0, 1, 2])
+
+    def test_empty_selection(self):
+        selection = parse_slice_specs(pd.Series([None, None], index=["a", "b"]))
+        self.assertEqual(selection.counts().tolist(), [0, 0])
+        intervals = selection.to_intervals()
+        self.assertEqual(list(intervals.columns), ["label", "start", "stop"])
+        self.assertTrue(intervals.empty)
+        self.assertTrue(selection.to_frame().empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from PIL import Image as PILImage
+from utils.training_data import (
+    SliceBatchLoader,
+    apply_window,
+    read_slice,
+    resize_stack,
+)
+
+
+class TestTrainingData(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        rows = []
+        for i in range(10):
+            # Mixed slice shapes end up in the same batch
+            shape = (16, 16) if i % 3 else (20, 12)
+            image_id = f"{i:03d}.png"
+            PILImage.fromarray(rng.integers(0, 256, shape, dtype=np.uint8)).save(
+                os.path.join(self.tmp.name, image_id)
+            )
+            rows.append(
+                {
+                    "image_set_id": "set",
+                    "image_id": image_id,
+                    "folder_path": self.tmp.name,
+                    "region": i % 3,
+                    "score": float(i),
+                }
+            )
+        self.samples = pd.DataFrame(rows)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def loader(self, **kwargs):
+        return SliceBatchLoader(
+            self.samples,
+            batch_size=4,
+            size=(8, 8),
+            volume_root=os.path.join(self.tmp.name, "volumes"),
+            workers=2,
+            **kwargs,
+        )
+
+    def test_resize_stack(self):
+        gradient = np.tile(np.arange(4, dtype=np.float32), (1, 4, 1))
+        resized = resize_stack(gradient, (4, 8))
+        self.assertEqual(resized.shape, (1, 4, 8))
+        np.testing.assert_allclose(
+            resized[0, 0], [0, 0.25, 0.75, 1.25, 1.75, 2.25, 2.75, 3]
+        )
+        np.testing.assert_array_equal(resize_stack(gradient, (4, 4)), gradient)
+
+    def test_apply_window(self):
+        stack = np.array([-5.0, 10.0, 20.0, 40.0], dtype=np.float32)
+        np.testing.assert_allclose(apply_window(stack, (10, 30)), [0, 0, 0.5, 1])
+
+    def test_batches(self):
+        batches = list(self.loader(seed=1))
+        self.assertEqual(len(batches), 3)
+        slices, regions, scores = batches[0]
+        self.assertEqual(slices.shape, (4, 8, 8))
+        self.assertEqual(slices.dtype, np.float32)
+        self.assertTrue(0.0 <= slices.min() and slices.max() <= 1.0)
+        np.testing.assert_array_equal(regions, (scores % 3).astype(np.int64))
+        self.assertEqual(
+            sorted(np.concatenate([b[2] for b in batches])), list(range(10))
+        )
+
+    def test_seed_and_shards(self):
+        def scores(loader):
+            return np.concatenate([b[2] for b in loader])
+
+        np.testing.assert_array_equal(
+            scores(self.loader(seed=7)), scores(self.loader(seed=7))
+        )
+        epoch = self.loader(seed=7)
+        epoch.set_epoch(1)
+        self.assertFalse(np.array_equal(scores(epoch), scores(self.loader(seed=7))))
+
+        shards = [
+            scores(self.loader(seed=7, num_shards=3, shard_index=k)) for k in range(3)
+        ]
+        self.assertEqual(sorted(np.concatenate(shards)), list(range(10)))
+
+    def test_read_16_bit_slices(self):
+        pixels = np.array([[0, 1000], [40000, 65535]], dtype=np.uint16)
+        PILImage.fromarray(pixels).save(os.path.join(self.tmp.name, "16.png"))
+        # 32-bit integer images open in mode "I"
+        PILImage.fromarray(pixels.astype(np.int32)).save(
+            os.path.join(self.tmp.name, "32.tif")
+        )
+        for image_id in ("16.png", "32.tif"):
+            decoded = read_slice("none", image_id, self.tmp.name, self.tmp.name)
+            self.assertEqual(decoded.dtype, np.uint16)
+            np.testing.assert_array_equal(decoded, pixels)
+
+    def test_default_window_follows_dtype(self):
+        PILImage.fromarray(np.array([[0, 40000], [65535, 65535]], np.uint16)).save(
+            os.path.join(self.tmp.name, "16.png")
+        )
+        PILImage.fromarray(np.array([[0, 51], [255, 255]], np.uint8)).save(
+            os.path.join(self.tmp.name, "8.png")
+        )
+        samples = self.samples.iloc[:2].assign(image_id=["16.png", "8.png"])
+
+        def batch(**kwargs):
+            loader = SliceBatchLoader(
+                samples,
+                shuffle=False,
+                size=(2, 2),
+                volume_root=os.path.join(self.tmp.name, "volumes"),
+                **kwargs,
+            )
+            return next(iter(loader))[0]
+
+        # 16-bit slices span [0, 1] instead of saturating at 255
+        np.testing.assert_allclose(
+            batch(), [[[0, 40000 / 65535], [1, 1]], [[0, 0.2], [1, 1]]], rtol=1e-6
+        )
+        np.testing.assert_allclose(
+            batch(window=(0, 510)), [[[0, 1], [1, 1]], [[0, 0.1], [0.5, 0.5]]]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from utils.models import Base, Image, ImageSet, Patient
+from utils.volume_store import build_volume, open_volume
+
+
+class TestVolumeStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp.name, "set")
+        self.root = os.path.join(self.tmp.name, "volumes")
+        os.makedirs(self.folder)
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = Session(engine)
+        self.session.add(Patient(patient_id="p"))
+        self.session.add(
+            ImageSet(
+                image_set_id="s", patient_id="p", num_images=0, folder_path=self.folder
+            )
+        )
+        for j in range(3):
+            self.add_slice(j)
+
+    def tearDown(self):
+        self.session.close()
+        self.tmp.cleanup()
+
+    def add_slice(self, j):
+        image_id = f"{j:03d}.png"
+        PILImage.fromarray(np.full((4, 4), j * 10, dtype=np.uint8)).save(
+            os.path.join(self.folder, image_id)
+        )
+        self.session.add(Image(image_set_id="s", image_id=image_id, slice_index=j))
+        self.session.commit()
+
+    def arrays(self):
+        return sorted(name for name in os.listdir(self.root) if name.endswith(".npy"))
+
+    def test_rebuild_swaps_array_and_ids_together(self):
+        self.assertTrue(build_volume(self.session, "s", self.root))
+        self.assertFalse(build_volume(self.session, "s", self.root))
+        volume = open_volume("s", self.root)
+        self.assertEqual(int(volume.slice_by_id("002.png")[0, 0]), 20)
+        first_arrays = self.arrays()
+
+        self.add_slice(3)
+        self.assertTrue(build_volume(self.session, "s", self.root))
+        rebuilt = open_volume("s", self.root)
+        self.assertEqual(len(rebuilt), 4)
+        self.assertEqual(int(rebuilt.slice_by_id("003.png")[0, 0]), 30)
+        self.assertEqual(len(self.arrays()), 1)
+        self.assertNotEqual(self.arrays(), first_arrays)
+        # Views of the replaced array stay readable
+        self.assertEqual(int(volume.slice_by_id("002.png")[0, 0]), 20)
+
+    def test_mismatched_pair_is_rejected(self):
+        build_volume(self.session, "s", self.root)
+        index_path = os.path.join(self.root, "s.json")
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        index["image_ids"].append("003.png")
+        index["shape"][0] += 1
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        self.assertIsNone(open_volume("s", self.root))
+
+        # Indexes of the old layout, without an array name, count as not built
+        del index["array"]
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        self.assertIsNone(open_volume("s", self.root))
+        self.assertTrue(build_volume(self.session, "s", self.root))
+        self.assertEqual(len(open_volume("s", self.root)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,307 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from utils.config import BASEL_MAX, CORONA_MAX
+from utils.models import Evaluation, Region
+
+# Rated fields and their number of categories; a region code is its position
+# in Region, scores are their own code.
+FIELD_CATEGORIES = {
+    "region": len(Region),
+    "basal_score": BASEL_MAX + 1,
+    "corona_score": CORONA_MAX + 1,
+}
+REGION_CODES = {region: code for code, region in enumerate(Region)}
+MISSING = -1
+
+
+class RatingMatrix:
+    """
+    Dense doctor x image matrices of categorical codes, one per rated field.
+
+    Missing ratings are MISSING. Scores are only present on images where the
+    doctor chose the matching region, so score agreement is measured per
+    region on the images both doctors placed in it.
+    """
+
+    def __init__(
+        self, doctors: pd.Index, items: pd.MultiIndex, codes: Dict[str, np.ndarray]
+    ):
+        self.doctors = doctors
+        self.items = items
+        self.codes = codes
+
+    def one_hot(self, field: str) -> np.ndarray:
+        """Float doctor x image x category indicator array for a field."""
+        codes = self.codes[field]
+        categories = max(FIELD_CATEGORIES[field], int(codes.max(initial=-1)) + 1)
+        return (codes[..., None] == np.arange(categories)).astype(np.float64)
+
+    def item_groups(self, by: Optional[str]) -> Tuple[np.ndarray, pd.Index]:
+        """Group code of every image and the group labels (one group if None)."""
+        if by is None:
+            return np.zeros(len(self.items), dtype=np.int64), pd.Index(["all"])
+        return pd.factorize(self.items.get_level_values(by), sort=True)
+
+
+def load_rating_matrix(session, image_set_ids: Optional[List[str]] = None):
+    """
+    Read evaluations once and pivot them into a RatingMatrix.
+
+    Args:
+        session: SQLAlchemy session object.
+        image_set_ids: restrict to these image sets (all when None).
+    """
+    stmt = select(
+        Evaluation.doctor_id,
+        Evaluation.image_set_id,
+        Evaluation.image_id,
+        Evaluation.region,
+        Evaluation.basal_score,
+        Evaluation.corona_score,
+    )
+    if image_set_ids is not None:
+        stmt = stmt.where(Evaluation.image_set_id.in_(list(image_set_ids)))
+    df = pd.read_sql(stmt, session.connection())
+
+    doctor_codes, doctors = pd.factorize(df["doctor_id"], sort=True)
+    item_codes, items = pd.MultiIndex.from_frame(
+        df[["image_set_id", "image_id"]]
+    ).factorize(sort=True)
+    items = pd.MultiIndex.from_tuples(list(items), names=["image_set_id", "image_id"])
+
+    values = {
+        "region": df["region"].map(REGION_CODES).to_numpy(),
+        "basal_score": df["basal_score"].fillna(MISSING).to_numpy(),
+        "corona_score": df["corona_score"].fillna(MISSING).to_numpy(),
+    }
+    codes = {}
+    for field, field_values in values.items():
+        matrix = np.full((len(doctors), len(items)), MISSING, dtype=np.int16)
+        matrix[doctor_codes, item_codes] = field_values.astype(np.int16)
+        codes[field] = matrix
+    return RatingMatrix(pd.Index(doctors, name="doctor_id"), items, codes)
+
+
+def disagreement_weights(categories: int, weights: Optional[str] = None):
+    """
+    Category x category disagreement weights: None (nominal), "linear" or
+    "quadratic".
+    """
+    grid = np.arange(categories)
+    distance = np.abs(grid[:, None] - grid[None, :]).astype(np.float64)
+    if weights is None:
+        return (distance > 0).astype(np.float64)
+    scale = max(categories - 1, 1)
+    if weights == "linear":
+        return distance / scale
+    if weights == "quadratic":
+        return (distance / scale) ** 2
+    raise ValueError(f"Unknown weights: {weights}")
+
+
+def pairwise_cohen_kappa(
+    matrix: RatingMatrix, field: str = "region", weights: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Cohen's kappa for every doctor pair at once, over the images both rated.
+
+    Args:
+        matrix (RatingMatrix): ratings from load_rating_matrix.
+        field (str): "region", "basal_score" or "corona_score".
+        weights: None, "linear" or "quadratic" (weighted kappa for scores).
+
+    Returns:
+        DataFrame with columns doctor_a, doctor_b, n_items, agreement (share
+        of identical ratings) and kappa.
+    """
+    onehot = matrix.one_hot(field)
+    rated = onehot.sum(axis=2)
+    disagreement = disagreement_weights(onehot.shape[2], weights)
+    doctors, items, categories = onehot.shape
+
+    # Items rated by both doctors of each pair
+    shared = rated @ rated.T
+    flat = onehot.reshape(doctors, items * categories)
+    matches = flat @ flat.T
+    observed = (onehot @ disagreement).reshape(doctors, items * categories) @ flat.T
+    # marginals[a, b, k]: doctor a's count of category k on items b also rated
+    marginals = np.einsum("aik,bi->abk", onehot, rated)
+    expected = np.einsum("abk,kl,bal->ab", marginals, disagreement, marginals)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        agreement = matches / shared
+        kappa = 1.0 - (observed / shared) / (expected / shared**2)
+
+    first, second = np.triu_indices(doctors, k=1)
+    keep = shared[first, second] > 0
+    first, second = first[keep], second[keep]
+    return pd.DataFrame(
+        {
+            "doctor_a": matrix.doctors[first],
+            "doctor_b": matrix.doctors[second],
+            "n_items": shared[first, second].astype(np.int64),
+            "agreement": agreement[first, second],
+            "kappa": kappa[first, second],
+        }
+    )
+
+
+def _group_sum(groups: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """Sum the rows of a 2D array per group."""
+    return np.stack(
+        [
+            np.bincount(groups, weights=column, minlength=n_groups)
+            for column in values.T
+        ],
+        axis=1,
+    )
+
+
+def fleiss_kappa(
+    matrix: RatingMatrix, field: str = "region", by: Optional[str] = "image_set_id"
+) -> pd.DataFrame:
+    """
+    Fleiss' kappa per group of images, allowing a varying number of doctors per
+    image. Images rated by fewer than two doctors are ignored.
+
+    Args:
+        matrix (RatingMatrix): ratings from load_rating_matrix.
+        field (str): "region", "basal_score" or "corona_score".
+        by: item level to group by ("image_set_id"), or None for one value.
+
+    Returns:
+        DataFrame indexed by group with columns n_items, n_ratings and kappa.
+    """
+    counts = matrix.one_hot(field).sum(axis=0)
+    raters = counts.sum(axis=1)
+    pairable = raters >= 2
+    groups, labels = matrix.item_groups(by)
+    groups, counts, raters = groups[pairable], counts[pairable], raters[pairable]
+
+    per_item = ((counts**2).sum(axis=1) - raters) / (raters * (raters - 1))
+    n_items = np.bincount(groups, minlength=len(labels))
+    category_totals = _group_sum(groups, len(labels), counts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed = (
+            np.bincount(groups, weights=per_item, minlength=len(labels)) / n_items
+        )
+        shares = category_totals / category_totals.sum(axis=1, keepdims=True)
+        expected = (shares**2).sum(axis=1)
+        kappa = (observed - expected) / (1.0 - expected)
+
+    return pd.DataFrame(
+        {
+            "n_items": n_items,
+            "n_ratings": category_totals.sum(axis=1).astype(np.int64),
+            "kappa": kappa,
+        },
+        index=pd.Index(labels, name=by or "group"),
+    )
+
+
+def krippendorff_alpha(
+    matrix: RatingMatrix,
+    field: str = "region",
+    metric: str = "nominal",
+    by: Optional[str] = "image_set_id",
+) -> pd.DataFrame:
+    """
+    Krippendorff's alpha per group of images from coincidence matrices.
+
+    Args:
+        matrix (RatingMatrix): ratings from load_rating_matrix.
+        field (str): "region", "basal_score" or "corona_score".
+        metric (str): "nominal" or "interval" (squared score difference).
+        by: item level to group by ("image_set_id"), or None for one value.
+
+    Returns:
+        DataFrame indexed by group with columns n_items, n_pairable and alpha.
+    """
+    counts = matrix.one_hot(field).sum(axis=0)
+    raters = counts.sum(axis=1)
+    pairable = raters >= 2
+    groups, labels = matrix.item_groups(by)
+    groups, counts, raters = groups[pairable], counts[pairable], raters[pairable]
+    categories = counts.shape[1]
+    if metric == "nominal":
+        delta = disagreement_weights(categories)
+    elif metric == "interval":
+        delta = disagreement_weights(categories, "quadratic")
+    else:
+        raise ValueError(f"Unknown metric: {metric}")
+
+    # Per-image coincidences: (n n^T - diag(n)) / (m - 1), summed per group
+    coincidences = counts[:, :, None] * counts[:, None, :]
+    coincidences[:, np.arange(categories), np.arange(categories)] -= counts
+    coincidences /= (raters - 1)[:, None, None]
+    coincidences = _group_sum(
+        groups, len(labels), coincidences.reshape(len(counts), categories**2)
+    ).reshape(len(labels), categories, categories)
+
+    marginals = coincidences.sum(axis=2)
+    total = marginals.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed = (coincidences * delta).sum(axis=(1, 2)) / total
+        expected = np.einsum("gc,gk,ck->g", marginals, marginals, delta) / (
+            total * (total - 1)
+        )
+        alpha = 1.0 - observed / expected
+
+    return pd.DataFrame(
+        {
+            "n_items": np.bincount(groups, minlength=len(labels)),
+            "n_pairable": total.astype(np.int64),
+            "alpha": alpha,
+        },
+        index=pd.Index(labels, name=by or "group"),
+    )
+
+
+def compute_agreement_report(
+    session, image_set_ids: Optional[List[str]] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Pivot the evaluations once and compute every agreement statistic.
+
+    Returns:
+        dict with
+        - "pairs": pairwise Cohen's kappa per doctor pair, for region
+          (kappa_region) and quadratic-weighted scores (kappa_basal_score,
+          kappa_corona_score).
+        - "image_sets": Fleiss' kappa and nominal alpha for region, and
+          interval alpha for each score, per image set.
+        - "overall": the same per-set statistics over all images.
+    """
+    matrix = load_rating_matrix(session, image_set_ids)
+
+    pairs = None
+    for field in FIELD_CATEGORIES:
+        weights = None if field == "region" else "quadratic"
+        stats = pairwise_cohen_kappa(matrix, field, weights).set_index(
+            ["doctor_a", "doctor_b"]
+        )
+        stats = stats.rename(columns=lambda column: f"{column}_{field}")
+        pairs = stats if pairs is None else pairs.join(stats, how="outer")
+
+    def per_group(by):
+        region = fleiss_kappa(matrix, "region", by)
+        frame = pd.DataFrame(
+            {
+                "n_items": region["n_items"],
+                "fleiss_kappa_region": region["kappa"],
+                "alpha_region": krippendorff_alpha(matrix, "region", by=by)["alpha"],
+            }
+        )
+        for field in ("basal_score", "corona_score"):
+            frame[f"alpha_{field}"] = krippendorff_alpha(
+                matrix, field, "interval", by=by
+            )["alpha"]
+        return frame
+
+    return {
+        "pairs": pairs.reset_index(),
+        "image_sets": per_group("image_set_id"),
+        "overall": per_group(None),
+    }
@@ -0,0 +1,265 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.exc import SQLAlchemyError
+from utils.db import SessionLocal
+from utils.evaluation import bulk_upsert_image_evaluations
+
+AUTOSAVE_DELAY = 2.0  # seconds without edits before pending slices are written
+AUTOSAVE_MAX_DELAY = 10.0  # seconds an edit may wait while edits keep coming
+AUTOSAVE_MAX_EDITS = 25  # pending slices that trigger an immediate write
+
+
+class _PendingSet:
+    """Dirty slices and set-level flags of one doctor's image set."""
+
+    __slots__ = ("rows", "low_quality", "irrelevant")
+
+    def __init__(self):
+        self.rows: Dict[str, dict] = {}
+        self.low_quality = False
+        self.irrelevant = False
+
+
+class AutosaveStatus:
+    """Outcome of one doctor's autosaves, shown on the label page."""
+
+    __slots__ = ("last_flush", "last_error", "dropped")
+
+    def __init__(self):
+        self.last_flush: Optional[float] = None  # time.time() of the last write
+        self.last_error: Optional[str] = None  # database error, being retried
+        self.dropped: List[str] = []  # rejected edits not shown to the doctor yet
+
+
+class AutosaveQueue:
+    """
+    Process-wide write-behind queue for labeling edits.
+
+    The label page enqueues only the slices changed by an edit; later edits
+    of the same slice replace the queued row. A background thread writes
+    the pending slices with one bulk upsert per image set once no edit came
+    for `delay` seconds, at the latest `max_delay` seconds after the oldest
+    pending edit, or as soon as `max_edits` slices are pending. Writes that
+    fail on a database error stay queued and are retried on the next flush;
+    rows rejected as invalid are dropped one by one and reported in the
+    doctor's AutosaveStatus.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        delay: float = AUTOSAVE_DELAY,
+        max_delay: float = AUTOSAVE_MAX_DELAY,
+        max_edits: int = AUTOSAVE_MAX_EDITS,
+    ):
+        self.session_factory = session_factory
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_edits = max_edits
+        self._pending: Dict[Tuple[str, str], _PendingSet] = {}
+        self._num_rows = 0
+        self._first_edit: Optional[float] = None
+        self._last_edit: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # keeps flushes in edit order
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._status: Dict[str, AutosaveStatus] = defaultdict(AutosaveStatus)
+
+    def enqueue(
+        self,
+        doctor_id: str,
+        image_set_id: str,
+        rows: Iterable[dict] = (),
+        low_quality: bool = False,
+        irrelevant: bool = False,
+    ) -> None:
+        """
+        Queue changed slices of an image set, and its current set-level flags.
+
+        Args:
+            rows: evaluation rows as accepted by bulk_upsert_image_evaluations,
+                only for the slices that changed. May be empty to save only
+                the flags.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The autosave queue is closed.")
+            pending = self._pending.setdefault((doctor_id, image_set_id), _PendingSet())
+            for row in rows:
+                if row["image_id"] not in pending.rows:
+                    self._num_rows += 1
+                pending.rows[row["image_id"]] = row
+            pending.low_quality = low_quality
+            pending.irrelevant = irrelevant
+
+            now = time.monotonic()
+            if self._first_edit is None:
+                self._first_edit = now
+            self._last_edit = now
+            self._start()
+            self._cond.notify()
+
+    def pending_count(self, doctor_id: Optional[str] = None) -> int:
+        """Number of queued slices, of one doctor or of everyone."""
+        with self._cond:
+            return sum(
+                len(pending.rows)
+                for (doctor, _), pending in self._pending.items()
+                if doctor_id is None or doctor == doctor_id
+            )
+
+    def status(self, doctor_id: str) -> AutosaveStatus:
+        """Autosave outcome of one doctor."""
+        with self._cond:
+            return self._status[doctor_id]
+
+    def pop_dropped(self, doctor_id: str) -> List[str]:
+        """Return the doctor's rejected edits and forget them, once shown."""
+        with self._cond:
+            status = self._status[doctor_id]
+            dropped, status.dropped = status.dropped, []
+            return dropped
+
+    def _write_set(
+        self, session, doctor_id: str, image_set_id: str, pending: _PendingSet
+    ) -> int:
+        """
+        Upsert one pending set. If the batch is rejected as invalid, write
+        the rows one at a time so only the invalid ones are dropped.
+        """
+        flags = {"low_quality": pending.low_quality, "irrelevant": pending.irrelevant}
+        try:
+            return bulk_upsert_image_evaluations(
+                session, doctor_id, image_set_id, pending.rows.values(), **flags
+            )
+        except ValueError as e:
+            if not pending.rows:
+                self._drop(doctor_id, f"{image_set_id}: {e}")
+                return 0
+
+        written = 0
+        for image_id, row in pending.rows.items():
+            try:
+                written += bulk_upsert_image_evaluations(
+                    session, doctor_id, image_set_id, [row], **flags
+                )
+            except ValueError as e:
+                self._drop(doctor_id, f"{image_set_id}/{image_id}: {e}")
+        return written
+
+    def _drop(self, doctor_id: str, message: str) -> None:
+        print(f"⚠️ Autosave dropped an edit of {message}")
+        with self._cond:
+            self._status[doctor_id].dropped.append(message)
+
+    def flush(self) -> int:
+        """
+        Write everything queued now, in the calling thread.
+
+        Returns:
+            int: Number of slices written.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._num_rows = 0
+                self._first_edit = self._last_edit = None
+            if not batch:
+                return 0
+
+            written = 0
+            failed = {}
+            errors = {}
+            with self.session_factory() as session:
+                for (doctor_id, image_set_id), pending in batch.items():
+                    try:
+                        written += self._write_set(
+                            session, doctor_id, image_set_id, pending
+                        )
+                    except SQLAlchemyError as e:
+                        session.rollback()
+                        failed[(doctor_id, image_set_id)] = pending
+                        errors[doctor_id] = str(e)
+            if failed:
+                self._requeue(failed)
+                print(f"⚠️ Autosave of {len(failed)} image sets failed, retrying.")
+
+            now = time.time()
+            with self._cond:
+                for doctor_id in {doctor for doctor, _ in batch}:
+                    status = self._status[doctor_id]
+                    status.last_error = errors.get(doctor_id)
+                    if doctor_id not in errors:
+                        status.last_flush = now
+            return written
+
+    def _requeue(self, failed: Dict[Tuple[str, str], _PendingSet]) -> None:
+        """Put failed sets back, under any edits made during the flush."""
+        with self._cond:
+            for key, pending in failed.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    pending.rows.update(newer.rows)
+                    pending.low_quality = newer.low_quality
+                    pending.irrelevant = newer.irrelevant
+                self._pending[key] = pending
+            self._num_rows = sum(len(p.rows) for p in self._pending.values())
+            now = time.monotonic()
+            self._first_edit = self._first_edit or now
+            self._last_edit = now
+            self._cond.notify()
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the next flush, None if nothing is pending."""
+        if not self._pending:
+            return None
+        if self._num_rows >= self.max_edits:
+            return 0.0
+        now = time.monotonic()
+        return min(
+            self._last_edit + self.delay - now, self._first_edit + self.max_delay - now
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    due_in = self._due_in()
+                    if due_in is not None and due_in <= 0:
+                        break
+                    self._cond.wait(due_in)
+                if self._closed and not self._pending:
+                    return
+            try:
+                self.flush()
+            except Exception as e:  # pylint: disable=broad-except
+                # Keep the thread alive; the edits were lost with this batch
+                print(f"❌ Autosave failed: {e}")
+            if self._closed:
+                return
+
+    def _start(self) -> None:
+        """Start the writer thread on the first edit. Called with the lock held."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="autosave", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Write what is still queued and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self.flush()
+
+
+autosave_queue = AutosaveQueue()
+atexit.register(autosave_queue.close)
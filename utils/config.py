@@ -1,4 +1,35 @@
+import os
 import streamlit as st
 
 BASEL_MAX: int = st.secrets["criterion"]["BasalGanglia"]
 CORONA_MAX: int = st.secrets["criterion"]["CoronaRadiata"]
+
+# DATABASE_URL environment variable wins over secrets.toml
+DATABASE_URL: str = os.environ.get(
+    "DATABASE_URL",
+    st.secrets.get("database", {}).get("url", "sqlite:///medfabric.sqlite3"),
+)
+
+# bcrypt cost of new password hashes; existing hashes are rehashed on login.
+# Each step doubles the verification time (12 takes ~0.3 s per login).
+BCRYPT_ROUNDS: int = int(
+    os.environ.get("BCRYPT_ROUNDS", st.secrets.get("auth", {}).get("bcrypt_rounds", 12))
+)
+
+# Lifetime of the login session tokens that let a page reload skip the password;
+# each reload exchanges the token for a new one
+SESSION_TOKEN_TTL: int = int(
+    os.environ.get(
+        "SESSION_TOKEN_TTL",
+        st.secrets.get("auth", {}).get("session_ttl_seconds", 2 * 60 * 60),
+    )
+)
+
+# Width in pixels at which the labeling page shows a slice, about a third of a
+# 1280 px wide page; it picks the preview tier sent to the browser
+PREVIEW_DISPLAY_WIDTH: int = int(
+    os.environ.get(
+        "PREVIEW_DISPLAY_WIDTH",
+        st.secrets.get("labeling", {}).get("image_width", 384),
+    )
+)
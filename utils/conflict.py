@@ -1,12 +1,30 @@
 from collections import defaultdict
+from typing import Iterable, Optional
+from sqlalchemy import and_, case, distinct, exists, func, insert, or_, select
+from sqlalchemy import tuple_, update
 from utils.models import ImageSetEvaluation, Evaluation, Conflict, ConflictType, Region
 from utils.models import ImageSet
+from utils.revision import bump_revision
 
 
-def scan_and_update_image_conflicts(session):
+def scan_and_update_image_conflicts(
+    session, image_set_ids: Optional[Iterable[str]] = None
+):
+    """
+    Recompute image-level conflicts and sync them into the Conflict table.
+
+    Args:
+        session: SQLAlchemy DB session
+        image_set_ids: only rescan these image sets (e.g. the ones just saved).
+            All image sets are scanned when None.
+    """
+    image_set_ids = None if image_set_ids is None else set(image_set_ids)
 
-    # Step 1: Group all evaluations by image
-    evaluations = session.query(Evaluation).all()
+    # Step 1: Group evaluations by image
+    eval_query = session.query(Evaluation)
+    if image_set_ids is not None:
+        eval_query = eval_query.filter(Evaluation.image_set_id.in_(image_set_ids))
+    evaluations = eval_query.all()
     grouped = defaultdict(list)
     for e in evaluations:
         grouped[(e.image_set_id, e.image_id)].append(e)
@@ -31,8 +49,11 @@ def scan_and_update_image_conflicts(session):
                 if len(scores) > 1:
                     current_conflicts.add((iset_id, img_id, ConflictType.Score))
 
-    # Step 3: Get all existing conflicts
-    existing = session.query(Conflict).all()
+    # Step 3: Get existing image-level conflicts in scope
+    conflict_query = session.query(Conflict).filter(Conflict.image_id.isnot(None))
+    if image_set_ids is not None:
+        conflict_query = conflict_query.filter(Conflict.image_set_id.in_(image_set_ids))
+    existing = conflict_query.all()
     existing_map = {(c.image_set_id, c.image_id, c.type): c for c in existing}
 
     # Step 4: Mark resolved or re-activated
@@ -63,22 +84,125 @@ def scan_and_update_image_conflicts(session):
     print(f"✅ Scan complete: {len(new_conflicts)} new, {len(existing)} reviewed.")
 
 
-def scan_and_update_image_set_conflicts(session):
+def _image_conflict_candidates(image_set_ids: Optional[set] = None):
+    """
+    SELECT of (image_set_id, image_id, type) for every image whose evaluations
+    currently disagree, computed with GROUP BY ... HAVING.
+    """
+    num_regions = func.count(distinct(Evaluation.region))
+    stmt = (
+        select(
+            Evaluation.image_set_id,
+            Evaluation.image_id,
+            case(
+                (num_regions > 1, ConflictType.Classification.name),
+                else_=ConflictType.Score.name,
+            ).label("type"),
+        )
+        .group_by(Evaluation.image_set_id, Evaluation.image_id)
+        .having(func.count() > 1)
+        .having(
+            or_(
+                num_regions > 1,
+                func.count(distinct(Evaluation.basal_score)) > 1,
+                func.count(distinct(Evaluation.corona_score)) > 1,
+            )
+        )
+    )
+    if image_set_ids is not None:
+        stmt = stmt.where(Evaluation.image_set_id.in_(image_set_ids))
+    return stmt
+
+
+def scan_and_update_image_conflicts_sql(
+    session, image_set_ids: Optional[Iterable[str]] = None
+):
+    """
+    Same result as scan_and_update_image_conflicts, but the grouping and the
+    reconciliation of the Conflict table run as set-based SQL statements, so
+    no evaluation or conflict rows are loaded into Python.
+
+    Args:
+        session: SQLAlchemy DB session
+        image_set_ids: only rescan these image sets. All image sets are
+            scanned when None.
+
+    Returns:
+        Tuple (new, reopened, resolved) with the number of affected conflicts.
+    """
+    image_set_ids = None if image_set_ids is None else set(image_set_ids)
+    candidates = _image_conflict_candidates(image_set_ids)
+    conflict_key = tuple_(Conflict.image_set_id, Conflict.image_id, Conflict.type)
+
+    in_scope = Conflict.image_id.isnot(None)
+    if image_set_ids is not None:
+        in_scope = and_(in_scope, Conflict.image_set_id.in_(image_set_ids))
+
+    # Step 1: Re-open resolved conflicts that are back
+    reopened = session.execute(
+        update(Conflict)
+        .where(in_scope, Conflict.resolved.is_(True), conflict_key.in_(candidates))
+        .values(resolved=False)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Step 2: Resolve open conflicts that no longer exist
+    resolved = session.execute(
+        update(Conflict)
+        .where(in_scope, Conflict.resolved.isnot(True), conflict_key.not_in(candidates))
+        .values(resolved=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Step 3: Insert conflicts that are not recorded yet
+    found = candidates.subquery()
+    already_recorded = exists().where(
+        Conflict.image_set_id == found.c.image_set_id,
+        Conflict.image_id == found.c.image_id,
+        Conflict.type == found.c.type,
+    )
+    new = session.execute(
+        insert(Conflict).from_select(
+            ["image_set_id", "image_id", "type", "resolved"],
+            select(found.c.image_set_id, found.c.image_id, found.c.type, False).where(
+                ~already_recorded
+            ),
+        )
+    ).rowcount
+
+    session.commit()
+    print(f"✅ SQL scan complete: {new} new, {reopened} reopened, {resolved} resolved.")
+    return new, reopened, resolved
+
+
+def scan_and_update_image_set_conflicts(
+    session, image_set_ids: Optional[Iterable[str]] = None
+):
+    """
+    Recompute image set-level conflicts and sync them into the Conflict table.
+
+    Args:
+        session: SQLAlchemy DB session
+        image_set_ids: only rescan these image sets (e.g. the ones just saved).
+            All image sets are scanned when None.
+    """
+    image_set_ids = None if image_set_ids is None else set(image_set_ids)
 
     # Step 1: Group evaluations per image set
     image_set_evals = defaultdict(list)
 
     # We assume low_quality and irrelevant_data will move to a new table (ImageSetEvaluation)
-    image_set_level_evals = (
-        session.query(
-            ImageSetEvaluation.image_set_id,
-            ImageSetEvaluation.doctor_id,
-            ImageSetEvaluation.is_low_quality,
-            ImageSetEvaluation.is_irrelevant,
-        )
-        .distinct()
-        .all()
+    set_eval_query = session.query(
+        ImageSetEvaluation.image_set_id,
+        ImageSetEvaluation.doctor_id,
+        ImageSetEvaluation.is_low_quality,
+        ImageSetEvaluation.is_irrelevant,
     )
+    if image_set_ids is not None:
+        set_eval_query = set_eval_query.filter(
+            ImageSetEvaluation.image_set_id.in_(image_set_ids)
+        )
+    image_set_level_evals = set_eval_query.distinct().all()
 
     for iset_id, doctor_id, low_q, irrel in image_set_level_evals:
         image_set_evals[iset_id].append((low_q, irrel))
@@ -100,7 +224,10 @@ def scan_and_update_image_set_conflicts(session):
             current_conflicts.add((iset_id, None, ConflictType.Classification))
 
     # Step 3: Update conflict table (reuse logic pattern from image-level scan)
-    existing = session.query(Conflict).filter(Conflict.image_id.is_(None)).all()
+    conflict_query = session.query(Conflict).filter(Conflict.image_id.is_(None))
+    if image_set_ids is not None:
+        conflict_query = conflict_query.filter(Conflict.image_set_id.in_(image_set_ids))
+    existing = conflict_query.all()
     existing_map = {(c.image_set_id, c.image_id, c.type): c for c in existing}
     seen = set()
 
@@ -129,24 +256,46 @@ def scan_and_update_image_set_conflicts(session):
         f"✅ Global scan complete: {len(new_conflicts)} new, {len(existing)} reviewed."
     )
 
-def flag_conflicted_image_sets(session):
+
+def flag_conflicted_image_sets(
+    session, image_set_ids: Optional[Iterable[str]] = None
+) -> int:
     """
     Set the 'conflicted' flag on ImageSet table for any set that has unresolved conflicts.
-    """
 
-    # Get set of image_set_ids that are involved in unresolved conflicts
-    active_conflict_set_ids = (
-        session.query(Conflict.image_set_id).filter_by(resolved=False).distinct().all()
-    )
-    active_set_ids = {sid for (sid,) in active_conflict_set_ids}
+    Uses two set-based UPDATE statements that only touch rows whose flag
+    actually changes.
 
-    # Get all image_set_ids to update
-    all_set_ids = session.query(ImageSet.image_set_id).all()
+    Args:
+        session: SQLAlchemy DB session
+        image_set_ids: only refresh the flag of these image sets. All image
+            sets are refreshed when None.
 
-    for (set_id,) in all_set_ids:
-        session.query(ImageSet).filter_by(image_set_id=set_id).update(
-            {"conflicted": set_id in active_set_ids}
-        )
+    Returns:
+        int: Number of image sets whose flag changed.
+    """
+    active_set_ids = select(Conflict.image_set_id).where(Conflict.resolved.is_(False))
+
+    flagged = ImageSet.image_set_id.in_(active_set_ids)
+    scope = []
+    if image_set_ids is not None:
+        scope.append(ImageSet.image_set_id.in_(set(image_set_ids)))
+
+    raised = session.execute(
+        update(ImageSet)
+        .where(*scope, flagged, ImageSet.conflicted.is_(False))
+        .values(conflicted=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    cleared = session.execute(
+        update(ImageSet)
+        .where(*scope, ~flagged, ImageSet.conflicted.is_(True))
+        .values(conflicted=False)
+        .execution_options(synchronize_session=False)
+    ).rowcount
 
     session.commit()
-    print(f"🚩 Updated conflict flags for {len(all_set_ids)} image sets.")
+    if raised or cleared:
+        bump_revision()
+    print(f"🚩 Updated conflict flags: {raised} raised, {cleared} cleared.")
+    return raised + cleared
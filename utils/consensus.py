@@ -0,0 +1,221 @@
+from typing import Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, select, union, update
+from utils.models import (
+    Consensus,
+    Evaluation,
+    ImageSetConsensus,
+    ImageSetEvaluation,
+    Region,
+)
+
+CONSENSUS_KEYS = ["image_set_id", "image_id"]
+REGIONS = list(Region)  # majority ties go to the earliest region
+REFRESH_BATCH_SIZE = 500  # image sets rebuilt per transaction
+
+
+def mark_consensus_stale(session, image_set_ids: Iterable[str]) -> None:
+    """
+    Flag the consensus of image sets for rebuilding. Called by the evaluation
+    write functions inside their transaction; image sets without a consensus
+    yet are picked up by stale_consensus_image_sets anyway.
+    """
+    session.execute(
+        update(ImageSetConsensus)
+        .where(ImageSetConsensus.image_set_id.in_(set(image_set_ids)))
+        .values(stale=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def stale_consensus_image_sets(session) -> List[str]:
+    """
+    Return the image sets whose consensus is missing or out of date: sets
+    flagged stale, and evaluated sets without a consensus row.
+    """
+    evaluated = union(
+        select(Evaluation.image_set_id), select(ImageSetEvaluation.image_set_id)
+    ).subquery()
+    missing = select(evaluated.c.image_set_id).where(
+        evaluated.c.image_set_id.not_in(select(ImageSetConsensus.image_set_id))
+    )
+    flagged = select(ImageSetConsensus.image_set_id).where(
+        ImageSetConsensus.stale.is_(True)
+    )
+    return sorted(session.scalars(union(missing, flagged)))
+
+
+def compute_image_consensus(evaluations: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-image consensus from evaluation rows in one grouped pass.
+
+    Args:
+        evaluations: columns image_set_id, image_id, region (Region),
+            basal_score and corona_score.
+
+    Returns:
+        DataFrame with one row per image and the Consensus columns.
+    """
+    # All-null score columns load as object; keep the aggregations in Cython
+    evaluations = evaluations.astype(
+        {"basal_score": "float64", "corona_score": "float64"}
+    )
+    grouped = evaluations.groupby(CONSENSUS_KEYS, sort=False)
+    votes = (
+        evaluations.groupby(CONSENSUS_KEYS + ["region"], sort=False, observed=True)
+        .size()
+        .unstack("region", fill_value=0)
+        .reindex(columns=REGIONS, fill_value=0)
+    )
+    scores = grouped[["basal_score", "corona_score"]].agg(["median", "mean"])
+    scores.columns = [f"{score}_{stat}" for score, stat in scores.columns]
+
+    counts = votes.to_numpy()
+    consensus = scores.reindex(votes.index)
+    consensus["num_raters"] = counts.sum(axis=1)
+    consensus["region"] = np.array(REGIONS, dtype=object)[counts.argmax(axis=1)]
+    consensus["region_votes"] = counts.max(axis=1)
+    return consensus.reset_index()
+
+
+def compute_image_set_consensus(set_evaluations: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-image set majority of the low quality and irrelevant flags.
+
+    Args:
+        set_evaluations: columns image_set_id, is_low_quality, is_irrelevant.
+    """
+    consensus = set_evaluations.groupby("image_set_id").agg(
+        num_raters=("is_low_quality", "size"),
+        low_quality_votes=("is_low_quality", "sum"),
+        irrelevant_votes=("is_irrelevant", "sum"),
+    )
+    consensus["is_low_quality"] = consensus["low_quality_votes"] * 2 > (
+        consensus["num_raters"]
+    )
+    consensus["is_irrelevant"] = consensus["irrelevant_votes"] * 2 > (
+        consensus["num_raters"]
+    )
+    return consensus.reset_index()
+
+
+def _to_records(df: pd.DataFrame) -> List[dict]:
+    """DataFrame rows as dicts of Python values, NaN as None."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _refresh_batch(session, image_set_ids: List[str]) -> int:
+    """Rebuild the consensus of one batch of image sets and commit."""
+    conn = session.connection()
+    evaluations = pd.read_sql(
+        select(
+            Evaluation.image_set_id,
+            Evaluation.image_id,
+            Evaluation.region,
+            Evaluation.basal_score,
+            Evaluation.corona_score,
+        ).where(Evaluation.image_set_id.in_(image_set_ids)),
+        conn,
+    )
+    set_evaluations = pd.read_sql(
+        select(
+            ImageSetEvaluation.image_set_id,
+            ImageSetEvaluation.is_low_quality,
+            ImageSetEvaluation.is_irrelevant,
+        ).where(ImageSetEvaluation.image_set_id.in_(image_set_ids)),
+        conn,
+    )
+    image_rows = compute_image_consensus(evaluations)
+    set_rows = compute_image_set_consensus(set_evaluations)
+
+    # Image sets with evaluations but no set-level flags yet
+    unflagged = sorted(set(image_rows["image_set_id"]) - set(set_rows["image_set_id"]))
+    if unflagged:
+        raters = image_rows.groupby("image_set_id")["num_raters"].max()
+        set_rows = pd.concat(
+            [
+                set_rows,
+                pd.DataFrame(
+                    {
+                        "image_set_id": unflagged,
+                        "num_raters": raters[unflagged].to_numpy(),
+                        "low_quality_votes": 0,
+                        "irrelevant_votes": 0,
+                        "is_low_quality": False,
+                        "is_irrelevant": False,
+                    }
+                ),
+            ],
+            ignore_index=True,
+        )
+
+    session.execute(delete(Consensus).where(Consensus.image_set_id.in_(image_set_ids)))
+    session.execute(
+        delete(ImageSetConsensus).where(
+            ImageSetConsensus.image_set_id.in_(image_set_ids)
+        )
+    )
+    if len(image_rows):
+        session.execute(insert(Consensus), _to_records(image_rows))
+    if len(set_rows):
+        session.execute(insert(ImageSetConsensus), _to_records(set_rows))
+    session.commit()
+    return len(image_rows)
+
+
+def refresh_consensus(session, image_set_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Rebuild the Consensus and ImageSetConsensus rows of image sets.
+
+    The evaluations of each batch of REFRESH_BATCH_SIZE image sets are read
+    with one query per table, aggregated in a single grouped pass in pandas,
+    and the old rows replaced in one transaction.
+
+    Args:
+        session: SQLAlchemy DB session
+        image_set_ids: image sets to rebuild. Only stale ones (see
+            stale_consensus_image_sets) when None.
+
+    Returns:
+        int: Number of image sets refreshed.
+    """
+    if image_set_ids is None:
+        image_set_ids = stale_consensus_image_sets(session)
+    image_set_ids = sorted(set(image_set_ids))
+    if not image_set_ids:
+        print("🤝 Consensus is up to date.")
+        return 0
+
+    num_images = 0
+    for start in range(0, len(image_set_ids), REFRESH_BATCH_SIZE):
+        num_images += _refresh_batch(
+            session, image_set_ids[start : start + REFRESH_BATCH_SIZE]
+        )
+
+    print(
+        f"🤝 Refreshed consensus of {len(image_set_ids)} image sets "
+        f"({num_images} images)."
+    )
+    return len(image_set_ids)
+
+
+def load_consensus(session, image_set_ids: Optional[Iterable[str]] = None):
+    """
+    Read the per-image consensus joined with its image set flags.
+
+    Returns:
+        DataFrame with the Consensus columns plus is_low_quality and
+        is_irrelevant.
+    """
+    stmt = select(
+        Consensus.__table__,
+        ImageSetConsensus.is_low_quality,
+        ImageSetConsensus.is_irrelevant,
+    ).outerjoin(
+        ImageSetConsensus,
+        ImageSetConsensus.image_set_id == Consensus.image_set_id,
+    )
+    if image_set_ids is not None:
+        stmt = stmt.where(Consensus.image_set_id.in_(list(image_set_ids)))
+    return pd.read_sql(stmt, session.connection())
@@ -1,16 +1,31 @@
-from typing import Optional
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 import uuid
 from passlib.context import CryptContext
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
 
-from utils.models import Doctor  # assuming your model is named models.py
+from utils.config import BCRYPT_ROUNDS, SESSION_TOKEN_TTL
+from utils.models import Doctor, SessionToken  # assuming your model is named models.py
 
-# Set up password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Set up password hashing; hashes of another cost are flagged for rehashing
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt runs without the GIL; bound the concurrent verifications to the CPUs
+# so a burst of logins shares the cores instead of thrashing them
+HASH_WORKERS = os.cpu_count() or 4
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return _hash_pool.submit(pwd_context.hash, password).result()
 
 
 def register_doctor(session, username: str, password: str, **kwargs):
@@ -58,28 +73,149 @@ def check_doctor_already_exists(session, username: str) -> bool:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _hash_pool.submit(
+        pwd_context.verify, plain_password, hashed_password
+    ).result()
 
 
-def login_doctor(session, username: str, password: str):
+def login_doctor(session, username: str, password: str) -> Optional[str]:
     """
     Login a doctor by username and password.
 
+    The uuid and hash are read with a single query and the password is
+    verified on the hashing pool. A hash made with another cost than
+    BCRYPT_ROUNDS is replaced by a fresh one.
+
     Returns:
-        Doctor object on success, None on failure.
+        UUID of the doctor on success, None on failure.
     """
-    doctor = session.query(Doctor).filter_by(username=username).first()
-    if not doctor:
+    row = session.execute(
+        select(Doctor.uuid, Doctor.password_hash).where(Doctor.username == username)
+    ).first()
+    if row is None:
         print("❌ Username not found.")
         return None
 
-    if verify_password(password, doctor.password_hash):
-        print(f"✅ Login successful for {username}")
-        return doctor
-    else:
+    doctor_uuid, password_hash = row
+    valid, new_hash = _hash_pool.submit(
+        pwd_context.verify_and_update, password, password_hash
+    ).result()
+    if not valid:
         print("❌ Invalid password.")
         return None
 
+    if new_hash is not None:
+        session.execute(
+            update(Doctor)
+            .where(Doctor.uuid == doctor_uuid)
+            .values(password_hash=new_hash)
+        )
+        # Same password: keep the doctor's other sessions logged in
+        session.execute(
+            update(SessionToken)
+            .where(
+                SessionToken.doctor_id == doctor_uuid,
+                SessionToken.password_fingerprint == _sha256(password_hash),
+            )
+            .values(password_fingerprint=_sha256(new_hash))
+        )
+        session.commit()
+        print(f"🔑 Rehashed password of {username} with {BCRYPT_ROUNDS} rounds")
+    print(f"✅ Login successful for {username}")
+    return doctor_uuid
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def issue_session_token(session, doctor_uuid: str, ttl: int = SESSION_TOKEN_TTL) -> str:
+    """
+    Create a random token standing for a login of doctor_uuid for ttl
+    seconds, so a page reload restores the login without the password.
+
+    Only the token's hash is stored, with a fingerprint of the doctor's
+    password hash: the token stops working when it is revoked, expires,
+    the password changes or the doctor is deleted.
+    """
+    password_hash = session.scalar(
+        select(Doctor.password_hash).where(Doctor.uuid == doctor_uuid)
+    )
+    if password_hash is None:
+        raise ValueError(f"Doctor ID '{doctor_uuid}' does not exist.")
+
+    now = time.time()
+    token = secrets.token_urlsafe(32)
+    session.execute(delete(SessionToken).where(SessionToken.expires_at < now))
+    session.add(
+        SessionToken(
+            token_hash=_sha256(token),
+            doctor_id=doctor_uuid,
+            password_fingerprint=_sha256(password_hash),
+            expires_at=now + ttl,
+        )
+    )
+    session.commit()
+    return token
+
+
+def verify_session_token(session, token: str) -> Optional[str]:
+    """
+    Check a token from issue_session_token.
+
+    Returns:
+        The doctor UUID if the token is known, unexpired and issued for the
+        doctor's current password, None otherwise.
+    """
+    row = session.execute(
+        select(
+            SessionToken.doctor_id,
+            SessionToken.password_fingerprint,
+            SessionToken.expires_at,
+            Doctor.password_hash,
+        )
+        .join(Doctor, Doctor.uuid == SessionToken.doctor_id)
+        .where(SessionToken.token_hash == _sha256(token))
+    ).first()
+    if row is None:
+        return None
+    doctor_uuid, fingerprint, expires_at, password_hash = row
+    if expires_at < time.time():
+        return None
+    # Bytes, since compare_digest rejects non-ASCII str
+    if not hmac.compare_digest(fingerprint.encode(), _sha256(password_hash).encode()):
+        return None
+    return doctor_uuid
+
+
+def rotate_session_token(session, token: str) -> Optional[Tuple[str, str]]:
+    """
+    Exchange a valid token for a new one, so a token is used only once to
+    restore a login.
+
+    Returns:
+        Tuple (doctor UUID, new token), or None if the token is not valid.
+    """
+    doctor_uuid = verify_session_token(session, token)
+    if doctor_uuid is None:
+        return None
+    revoke_session_token(session, token)
+    return doctor_uuid, issue_session_token(session, doctor_uuid)
+
+
+def revoke_session_token(session, token: str) -> bool:
+    """
+    Log a session token out.
+
+    Returns:
+        True if the token existed.
+    """
+    deleted = session.execute(
+        delete(SessionToken).where(SessionToken.token_hash == _sha256(token))
+    ).rowcount
+    session.commit()
+    return bool(deleted)
+
 
 def get_uuid_from_username(session, username: str) -> Optional[str]:
     doctor = session.query(Doctor).filter_by(username=username).first()
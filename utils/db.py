@@ -1,14 +1,62 @@
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
+from utils.config import DATABASE_URL
 
+# Applied to every new SQLite connection. WAL lets readers proceed while a
+# radiologist is saving, and NORMAL sync is durable in WAL mode.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # ms to wait on a locked database
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "cache_size": -64 * 1024,  # negative means KiB
+    "temp_store": "MEMORY",
+}
 
-DATABASE_URL = "sqlite:///medfabric.sqlite3"
 
-engine = create_engine(DATABASE_URL)
+def create_db_engine(url: str = DATABASE_URL, **kwargs):
+    """
+    Create a SQLAlchemy engine, applying SQLITE_PRAGMAS on SQLite connections.
+
+    Args:
+        url (str): database URL, defaults to the configured DATABASE_URL.
+        **kwargs: forwarded to sqlalchemy.create_engine.
+    """
+    engine_ = create_engine(url, **kwargs)
+
+    if engine_.dialect.name == "sqlite":
+
+        @event.listens_for(engine_, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            cursor.close()
+
+    return engine_
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(bind=engine)
 
 
+def dialect_insert(session):
+    """
+    Return the dialect-specific insert() construct that supports ON CONFLICT.
+
+    Args:
+        session: SQLAlchemy session or connection bound to a SQLite or
+            PostgreSQL engine.
+    """
+    bind = session.get_bind() if hasattr(session, "get_bind") else session
+    if bind.dialect.name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
+
 @contextmanager
 def get_session():
     session = SessionLocal()
@@ -1,7 +1,39 @@
+from typing import Iterable
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from utils.models import Evaluation, Doctor, Region, ImageSetEvaluation
 from utils.config import BASEL_MAX, CORONA_MAX
+from utils.consensus import mark_consensus_stale
+from utils.db import dialect_insert
+from utils.revision import bump_revision
+
+
+def validate_region_scores(
+    region: Region, basal_score: int | None, corona_score: int | None
+) -> None:
+    """
+    Check that the scores are consistent with the region.
+
+    Raises:
+        ValueError: if the region is missing or a score is out of range or set
+            for the wrong region.
+    """
+    if region is None:
+        raise ValueError("Region must not be None.")
+
+    if region == Region.BasalGanglia:
+        if basal_score is None or not (0 <= basal_score <= BASEL_MAX):
+            raise ValueError(f"BasalGanglia score must be between 0 and {BASEL_MAX}.")
+        if corona_score is not None:
+            raise ValueError("Corona score must be null for BasalGanglia.")
+    elif region == Region.CoronaRadiata:
+        if corona_score is None or not (0 <= corona_score <= CORONA_MAX):
+            raise ValueError(f"CoronaRadiata score must be between 0 and {CORONA_MAX}.")
+        if basal_score is not None:
+            raise ValueError("Basal score must be null for CoronaRadiata.")
+    elif region == Region.None_:
+        if basal_score is not None or corona_score is not None:
+            raise ValueError("Scores must be null when region is None.")
 
 
 def add_or_update_image_evaluation(
@@ -24,22 +56,7 @@ def add_or_update_image_evaluation(
         raise ValueError(f"Doctor ID '{doctor_id}' does not exist.")
 
     # Validation
-    if region is None:
-        raise ValueError("Region must not be None.")
-
-    if region == Region.BasalGanglia:
-        if basal_score is None or not (0 <= basal_score <= BASEL_MAX):
-            raise ValueError(f"BasalGanglia score must be between 0 and {BASEL_MAX}.")
-        if corona_score is not None:
-            raise ValueError("Corona score must be null for BasalGanglia.")
-    elif region == Region.CoronaRadiata:
-        if corona_score is None or not (0 <= corona_score <= CORONA_MAX):
-            raise ValueError(f"CoronaRadiata score must be between 0 and {CORONA_MAX}.")
-        if basal_score is not None:
-            raise ValueError("Basal score must be null for CoronaRadiata.")
-    elif region == Region.None_:
-        if basal_score is not None or corona_score is not None:
-            raise ValueError("Scores must be null when region is None.")
+    validate_region_scores(region, basal_score, corona_score)
 
     # Check if evaluation already exists
     evaluation = (
@@ -70,13 +87,106 @@ def add_or_update_image_evaluation(
         print("✅ Evaluation created.")
 
     try:
+        mark_consensus_stale(session, [image_set_id])
         session.commit()
+        bump_revision(doctor_id)
         return evaluation
     except IntegrityError as e:
         session.rollback()
         raise ValueError(f"❌ Failed to write evaluation: {e}") from e
 
 
+def bulk_upsert_image_evaluations(
+    session: Session,
+    doctor_id: str,
+    image_set_id: str,
+    rows: Iterable[dict],
+    low_quality: bool = False,
+    irrelevant: bool = False,
+) -> int:
+    """
+    Add or update all of a doctor's evaluations for one image set in a single
+    transaction.
+
+    The doctor is checked once, every row is validated up front, and the
+    evaluations plus the set-level ImageSetEvaluation are written with
+    INSERT ... ON CONFLICT DO UPDATE before a single commit.
+
+    Args:
+        session: SQLAlchemy DB session
+        doctor_id (str): UUID of the doctor
+        image_set_id (str): ID of the image set
+        rows: dicts with keys image_id, region and optionally basal_score,
+            corona_score and notes
+        low_quality (bool): set-level low quality flag
+        irrelevant (bool): set-level irrelevant data flag
+
+    Returns:
+        int: Number of image evaluations written.
+    """
+    if session.query(Doctor.uuid).filter_by(uuid=doctor_id).first() is None:
+        raise ValueError(f"Doctor ID '{doctor_id}' does not exist.")
+
+    values = []
+    for row in rows:
+        region = row["region"]
+        basal_score = row.get("basal_score")
+        corona_score = row.get("corona_score")
+        validate_region_scores(region, basal_score, corona_score)
+        values.append(
+            {
+                "doctor_id": doctor_id,
+                "image_set_id": image_set_id,
+                "image_id": row["image_id"],
+                "region": region,
+                "basal_score": basal_score,
+                "corona_score": corona_score,
+                "notes": row.get("notes") or "",
+            }
+        )
+
+    insert = dialect_insert(session)
+
+    set_stmt = insert(ImageSetEvaluation).values(
+        doctor_id=doctor_id,
+        image_set_id=image_set_id,
+        is_low_quality=low_quality,
+        is_irrelevant=irrelevant,
+    )
+    set_stmt = set_stmt.on_conflict_do_update(
+        index_elements=["doctor_id", "image_set_id"],
+        set_={
+            "is_low_quality": set_stmt.excluded.is_low_quality,
+            "is_irrelevant": set_stmt.excluded.is_irrelevant,
+        },
+    )
+
+    eval_stmt = insert(Evaluation)
+    eval_stmt = eval_stmt.on_conflict_do_update(
+        index_elements=["doctor_id", "image_set_id", "image_id"],
+        set_={
+            "region": eval_stmt.excluded.region,
+            "basal_score": eval_stmt.excluded.basal_score,
+            "corona_score": eval_stmt.excluded.corona_score,
+            "notes": eval_stmt.excluded.notes,
+        },
+    )
+
+    try:
+        session.execute(set_stmt)
+        if values:
+            session.execute(eval_stmt, values)
+        mark_consensus_stale(session, [image_set_id])
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        raise ValueError(f"❌ Failed to write evaluations: {e}") from e
+    bump_revision(doctor_id)
+
+    print(f"💾 Saved {len(values)} evaluations for {image_set_id}")
+    return len(values)
+
+
 def delete_image_evaluation(
     session: Session, doctor_id: str, image_id: str, image_set_id: str
 ) -> bool:
@@ -94,7 +204,9 @@ def delete_image_evaluation(
 
     if evaluation:
         session.delete(evaluation)
+        mark_consensus_stale(session, [image_set_id])
         session.commit()
+        bump_revision(doctor_id)
         print("🗑️ Evaluation deleted.")
         return True
     else:
@@ -130,7 +242,9 @@ def add_or_update_set_evaluation(
         session.add(evaluation)
         print(f"🆕 Added evaluation for {image_set_id}")
 
+    mark_consensus_stale(session, [image_set_id])
     session.commit()
+    bump_revision(doctor_id)
 
 
 def delete_evaluations_for_image_set(session: Session, image_set_id: str) -> int:
@@ -150,7 +264,9 @@ def delete_evaluations_for_image_set(session: Session, image_set_id: str) -> int
         session.query(ImageSetEvaluation).filter_by(image_set_id=image_set_id).delete()
     )
 
+    mark_consensus_stale(session, [image_set_id])
     session.commit()
+    bump_revision()
     total_deleted = deleted_image_evals + deleted_set_evals
     print(
         f"🗑️ Deleted {deleted_image_evals} image evaluations and {deleted_set_evals} set evaluations for '{image_set_id}'"
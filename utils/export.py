@@ -0,0 +1,247 @@
+import os
+import shutil
+from typing import List, Optional
+import pandas as pd
+from sqlalchemy import and_, select
+from utils.db import engine
+from utils.models import Evaluation, Image, ImageSetEvaluation, Region
+from utils.slice_ranges import parse_slice_specs
+
+# Long format: one row per (image set, doctor, slice) evaluation
+LONG_COLUMNS = [
+    "image_set_id",
+    "doctor_id",
+    "role",
+    "image_id",
+    "slice_index",
+    "region",
+    "basal_score",
+    "corona_score",
+    "is_low_quality",
+    "is_irrelevant",
+]
+LONG_DTYPES = {
+    "image_set_id": "string",
+    "doctor_id": "string",
+    "role": "string",
+    "image_id": "string",
+    "slice_index": "Int32",
+    "region": "string",
+    "basal_score": "Int16",
+    "corona_score": "Int16",
+    "is_low_quality": "boolean",
+    "is_irrelevant": "boolean",
+}
+FORMAT_EXTENSIONS = {"parquet": "parquet", "ipc": "arrow"}
+
+# Legacy wide columns look like "<field>_<rater uuid>_<labeler|verifier>"
+LEGACY_COLUMN_REGEX = (
+    r"^(?P<field>.+)_(?P<doctor_id>[a-zA-Z0-9-]+)_(?P<role>labeler|verifier)$"
+)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.dataset  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as exc:
+        raise ImportError(
+            "Evaluation export needs pyarrow: pip install pyarrow"
+        ) from exc
+    return pyarrow
+
+
+def _prepare_output_dir(output_dir: str, overwrite: bool) -> None:
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        if not overwrite:
+            raise FileExistsError(f"{output_dir} is not empty; pass overwrite=True.")
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+
+def _write_chunk(df: pd.DataFrame, output_dir: str, fmt: str, part: int) -> None:
+    pa = _require_pyarrow()
+    table = pa.Table.from_pandas(
+        df[LONG_COLUMNS].astype(LONG_DTYPES), preserve_index=False
+    )
+    pa.dataset.write_dataset(
+        table,
+        output_dir,
+        format=fmt,
+        partitioning=pa.dataset.partitioning(
+            pa.schema([("image_set_id", pa.string())]), flavor="hive"
+        ),
+        basename_template=f"part-{part}-{{i}}.{FORMAT_EXTENSIONS[fmt]}",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def export_evaluations(
+    output_dir: str,
+    fmt: str = "parquet",
+    engine_=engine,
+    chunksize: int = 100_000,
+    overwrite: bool = False,
+) -> int:
+    """
+    Stream every Evaluation (with its ImageSetEvaluation flags) into a long,
+    typed dataset partitioned by image set.
+
+    Args:
+        output_dir (str): dataset folder.
+        fmt (str): "parquet" or "ipc" (Arrow IPC / Feather v2).
+        engine_: SQLAlchemy engine object.
+        chunksize (int): rows fetched and written per chunk.
+        overwrite (bool): replace a non-empty output_dir.
+
+    Returns:
+        int: Number of rows written.
+    """
+    _require_pyarrow()
+    _prepare_output_dir(output_dir, overwrite)
+
+    stmt = (
+        select(
+            Evaluation.image_set_id,
+            Evaluation.doctor_id,
+            Evaluation.image_id,
+            Image.slice_index,
+            Evaluation.region,
+            Evaluation.basal_score,
+            Evaluation.corona_score,
+            ImageSetEvaluation.is_low_quality,
+            ImageSetEvaluation.is_irrelevant,
+        )
+        .join(
+            Image,
+            and_(
+                Image.image_set_id == Evaluation.image_set_id,
+                Image.image_id == Evaluation.image_id,
+            ),
+        )
+        .outerjoin(
+            ImageSetEvaluation,
+            and_(
+                ImageSetEvaluation.image_set_id == Evaluation.image_set_id,
+                ImageSetEvaluation.doctor_id == Evaluation.doctor_id,
+            ),
+        )
+        .order_by(Evaluation.image_set_id)
+    )
+    region_names = {region: region.value for region in Region}
+
+    written = 0
+    with engine_.connect().execution_options(stream_results=True) as conn:
+        for part, chunk in enumerate(pd.read_sql(stmt, conn, chunksize=chunksize)):
+            chunk["region"] = chunk["region"].map(region_names)
+            chunk["role"] = "labeler"
+            _write_chunk(chunk, output_dir, fmt, part)
+            written += len(chunk)
+
+    print(f"📤 Exported {written} evaluations to {output_dir}")
+    return written
+
+
+def legacy_scan_metadata_to_long(csv_path: str) -> pd.DataFrame:
+    """
+    Convert a legacy wide scan_metadata.csv into the long evaluation format.
+
+    Each "<field>_<uuid>_<role>" column group becomes one rater row; the
+    basel_image / corona_image slice specs are expanded to one row per
+    selected slice, carrying that rater's set-level scores and flags. Raters
+    with flags but no selected slices keep a single row with no slice.
+    """
+    # Read as text so single-slice specs like "3" are not parsed as floats
+    wide = pd.read_csv(csv_path, dtype=str)
+    wide = wide.rename(columns={"scan_type": "image_set_id"})
+
+    rater_columns = wide.columns[wide.columns.str.match(LEGACY_COLUMN_REGEX)]
+    long = wide.melt(
+        id_vars=["image_set_id"],
+        value_vars=list(rater_columns),
+        var_name="column",
+    ).dropna(subset=["value"])
+    long = long.join(long["column"].str.extract(LEGACY_COLUMN_REGEX)).drop(
+        columns="column"
+    )
+    raters = long.pivot_table(
+        index=["image_set_id", "doctor_id", "role"],
+        columns="field",
+        values="value",
+        aggfunc="first",
+    ).reset_index()
+    raters.columns.name = None
+    for field in ("basel_image", "corona_image", "basel_score", "corona_score"):
+        if field not in raters:
+            raters[field] = pd.NA
+    for field in ("irrelevance", "disquality"):
+        if field not in raters:
+            raters[field] = False
+
+    raters["is_irrelevant"] = raters["irrelevance"].astype(str).str.lower() == "true"
+    raters["is_low_quality"] = raters["disquality"].astype(str).str.lower() == "true"
+    raters["basal_score"] = pd.to_numeric(raters["basel_score"], errors="coerce")
+    raters["corona_score"] = pd.to_numeric(raters["corona_score"], errors="coerce")
+
+    frames = []
+    for spec_column, region, score_column in (
+        ("basel_image", Region.BasalGanglia, "basal_score"),
+        ("corona_image", Region.CoronaRadiata, "corona_score"),
+    ):
+        slices = parse_slice_specs(raters[spec_column]).to_frame()
+        frame = raters.loc[slices["label"]].reset_index(drop=True)
+        frame["slice_index"] = slices["slice_index"].to_numpy()
+        frame["region"] = region.value
+        other = "corona_score" if score_column == "basal_score" else "basal_score"
+        frame[other] = pd.NA
+        frames.append(frame)
+
+    # Keep raters without any selected slice for their set-level flags
+    no_slices = raters[raters["basel_image"].isna() & raters["corona_image"].isna()]
+    no_slices = no_slices.assign(
+        slice_index=pd.NA,
+        region=Region.None_.value,
+        basal_score=pd.NA,
+        corona_score=pd.NA,
+    )
+    frames.append(no_slices)
+
+    result = pd.concat(frames, ignore_index=True)
+    result["image_id"] = pd.NA
+    return result[LONG_COLUMNS].astype(LONG_DTYPES)
+
+
+def convert_legacy_scan_metadata(
+    csv_path: str, output_dir: str, fmt: str = "parquet", overwrite: bool = False
+) -> int:
+    """
+    Convert a legacy wide scan_metadata.csv into a long dataset on disk,
+    partitioned by image set like export_evaluations.
+
+    Returns:
+        int: Number of rows written.
+    """
+    _require_pyarrow()
+    _prepare_output_dir(output_dir, overwrite)
+    long = legacy_scan_metadata_to_long(csv_path)
+    _write_chunk(long, output_dir, fmt, 0)
+    print(f"📤 Converted {len(long)} legacy ratings to {output_dir}")
+    return len(long)
+
+
+def read_evaluations(
+    dataset_dir: str,
+    columns: Optional[List[str]] = None,
+    image_set_ids: Optional[List[str]] = None,
+    fmt: str = "parquet",
+) -> pd.DataFrame:
+    """
+    Read a long evaluation dataset, loading only the requested columns and
+    image set partitions.
+    """
+    pa = _require_pyarrow()
+    dataset = pa.dataset.dataset(dataset_dir, format=fmt, partitioning="hive")
+    filter_ = None
+    if image_set_ids is not None:
+        filter_ = pa.dataset.field("image_set_id").isin(list(image_set_ids))
+    return dataset.to_table(columns=columns, filter=filter_).to_pandas()
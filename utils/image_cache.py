@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+from PIL import Image as PILImage
+
+SLICE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+PREFETCH_RADIUS = 5
+PREFETCH_WORKERS = 4
+
+
+def _decoded_size(img: PILImage.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+class SliceCache:
+    """
+    Process-wide, byte-bounded LRU cache of decoded slice images.
+
+    Entries are keyed by (path, mtime) so a slice rewritten on disk is decoded
+    again. Neighbouring slices can be decoded ahead of time on a thread pool.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = SLICE_CACHE_MAX_BYTES,
+        workers: int = PREFETCH_WORKERS,
+    ):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="slice-prefetch"
+        )
+
+    def _lookup(self, key) -> Optional[PILImage.Image]:
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+            return img
+
+    def _store(self, key, img: PILImage.Image) -> None:
+        size = _decoded_size(img)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = img
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _decoded_size(evicted)
+
+    def get(self, path: str) -> PILImage.Image:
+        """
+        Return the decoded image at path, reading it from disk on a miss.
+        """
+        key = (path, os.stat(path).st_mtime_ns)
+        img = self._lookup(key)
+        if img is None:
+            with PILImage.open(path) as src:
+                src.load()
+                img = src.copy()
+            self._store(key, img)
+        return img
+
+    def _prefetch_one(self, path: str, load: Callable[[str], object]) -> None:
+        try:
+            load(path)
+        except OSError:
+            pass  # missing or unreadable slices surface when actually shown
+        finally:
+            with self._lock:
+                self._in_flight.discard((path, load))
+
+    def prefetch(
+        self, paths: Iterable[str], load: Optional[Callable[[str], object]] = None
+    ) -> None:
+        """
+        Load the given slices in the background: decode them into this cache
+        or, with `load`, prepare whatever that callable reads (e.g. previews).
+        """
+        load = load or self.get
+        for path in paths:
+            if not path:
+                continue
+            with self._lock:
+                if (path, load) in self._in_flight:
+                    continue
+                self._in_flight.add((path, load))
+            self._executor.submit(self._prefetch_one, path, load)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+slice_cache = SliceCache()
+
+
+def prefetch_neighbours(
+    set_session,
+    radius: int = PREFETCH_RADIUS,
+    load: Optional[Callable[[str], object]] = None,
+) -> None:
+    """
+    Prefetch the `radius` slices after and before the current one of an
+    ImageSetEvaluationSession, nearest first, wrapping like the navigation.
+    `load` is passed to SliceCache.prefetch.
+    """
+    num_images = len(set_session.images)
+    if num_images == 0:
+        return
+    current = set_session.current_index
+    offsets = []
+    for step in range(1, min(radius, num_images // 2) + 1):
+        offsets.extend((step, -step))
+    slice_cache.prefetch(
+        (
+            set_session.images[(current + offset) % num_images].image_path
+            for offset in offsets
+        ),
+        load,
+    )
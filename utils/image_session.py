@@ -1,7 +1,10 @@
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Iterator, Optional, List
+import numpy as np
 import streamlit as st
 import pandas as pd
+from sqlalchemy import and_
 from utils.models import (
     ImageSetEvaluation,
     Patient,
@@ -21,6 +24,124 @@ class ImageEvaluationSession:
     slice_index: int = 0
 
 
+# Region names used by the labeling page, indexed by the stored region code
+REGION_NAMES = (None, Region.BasalGanglia.value, Region.CoronaRadiata.value)
+_REGION_CODES = {name: code for code, name in enumerate(REGION_NAMES)}
+_REGION_CODES[Region.None_.value] = 0
+NO_SCORE = -1
+
+
+class SliceAnnotations:
+    """
+    Compact per-set annotations: one NumPy array per field instead of one
+    Python object per slice. Indexing returns a SliceView with the same
+    attributes as ImageEvaluationSession, whose writes go to the arrays.
+    """
+
+    __slots__ = ("folder_path", "image_ids", "slice_indices", "regions", "scores")
+
+    def __init__(
+        self,
+        folder_path: Optional[str],
+        image_ids: List[str],
+        slice_indices: List[int],
+        regions: List[Optional[str]],
+        scores: List[Optional[int]],
+    ):
+        self.folder_path = folder_path
+        self.image_ids = np.array(image_ids, dtype=str)
+        self.slice_indices = np.array(slice_indices, dtype=np.int32)
+        self.regions = np.array([_REGION_CODES[r] for r in regions], dtype=np.int8)
+        self.scores = np.array(
+            [NO_SCORE if s is None else s for s in scores], dtype=np.int16
+        )
+
+    def __len__(self) -> int:
+        return len(self.image_ids)
+
+    def __getitem__(self, index: int) -> "SliceView":
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return SliceView(self, index % len(self))
+
+    def __iter__(self) -> Iterator["SliceView"]:
+        return (SliceView(self, i) for i in range(len(self)))
+
+    def image_path(self, index: int) -> Optional[str]:
+        if not self.folder_path:
+            return None
+        return f"{self.folder_path}/{self.image_ids[index]}"
+
+    @property
+    def image_paths(self) -> List[Optional[str]]:
+        return [self.image_path(i) for i in range(len(self))]
+
+    def has_scored(self, region: str) -> bool:
+        """True if any slice has this region and a score."""
+        return bool(
+            np.any((self.regions == _REGION_CODES[region]) & (self.scores != NO_SCORE))
+        )
+
+    def evaluation_rows(self, indices: Optional[List[int]] = None) -> Iterator[dict]:
+        """
+        Rows for utils.evaluation.bulk_upsert_image_evaluations, of every slice
+        or only of the slices at `indices`.
+        """
+        regions = (Region.None_, Region.BasalGanglia, Region.CoronaRadiata)
+        selected = slice(None) if indices is None else np.asarray(indices, dtype=int)
+        for image_id, code, score in zip(
+            self.image_ids[selected].tolist(),
+            self.regions[selected].tolist(),
+            self.scores[selected].tolist(),
+        ):
+            score = None if score == NO_SCORE else score
+            yield {
+                "image_id": image_id,
+                "region": regions[code],
+                "basal_score": score if code == 1 else None,
+                "corona_score": score if code == 2 else None,
+            }
+
+
+class SliceView:
+    """One slice of a SliceAnnotations, exposing ImageEvaluationSession fields."""
+
+    __slots__ = ("_annotations", "_index")
+
+    def __init__(self, annotations: SliceAnnotations, index: int):
+        self._annotations = annotations
+        self._index = index
+
+    @property
+    def image_id(self) -> str:
+        return str(self._annotations.image_ids[self._index])
+
+    @property
+    def image_path(self) -> Optional[str]:
+        return self._annotations.image_path(self._index)
+
+    @property
+    def slice_index(self) -> int:
+        return int(self._annotations.slice_indices[self._index])
+
+    @property
+    def region(self) -> Optional[str]:
+        return REGION_NAMES[self._annotations.regions[self._index]]
+
+    @region.setter
+    def region(self, value: Optional[str]) -> None:
+        self._annotations.regions[self._index] = _REGION_CODES[value]
+
+    @property
+    def score(self) -> Optional[int]:
+        score = int(self._annotations.scores[self._index])
+        return None if score == NO_SCORE else score
+
+    @score.setter
+    def score(self, value: Optional[int]) -> None:
+        self._annotations.scores[self._index] = NO_SCORE if value is None else value
+
+
 @dataclass
 class ImageSetEvaluationSession:
     image_set_id: str
@@ -30,7 +151,7 @@ class ImageSetEvaluationSession:
     low_quality: bool
     irrelevant_data: bool
     conflicted: bool
-    images: List[ImageEvaluationSession]
+    images: SliceAnnotations
     current_index: int = 0
     patient_diagnosis: pd.DataFrame = None
 
@@ -72,14 +193,9 @@ def prepare_image_evaluation(
     parent_path = kwargs.get("parent_path")
     image_path = f"{parent_path}/{image.image_id}" if parent_path else None
 
-    if evaluation.region == Region.None_:
-        score = None
-    elif evaluation.region == Region.BasalGanglia:
-        score = evaluation.basal_score
-    elif evaluation.region == Region.CoronaRadiata:
-        score = evaluation.corona_score
-    else:
-        score = None
+    score = _score_from_region(
+        evaluation.region, evaluation.basal_score, evaluation.corona_score
+    )
     return ImageEvaluationSession(
         image_id=image.image_id,
         slice_index=image.slice_index,
@@ -89,73 +205,117 @@ def prepare_image_evaluation(
     )
 
 
-def prepare_image_set_evaluation(
-    session, doctor_id: str, image_set_id: str
-) -> Optional[ImageSetEvaluationSession]:
-    img_set = session.query(ImageSet).filter_by(image_set_id=image_set_id).first()
-    if not img_set:
-        return None
-    folder_path = img_set.folder_path
-    patient_id = img_set.patient_id
-    conflicted = img_set.conflicted
-    num_images = img_set.num_images
+def _score_from_region(region, basal_score, corona_score) -> Optional[int]:
+    if region == Region.BasalGanglia:
+        return basal_score
+    if region == Region.CoronaRadiata:
+        return corona_score
+    return None
 
-    patient_diagnosis = patient_diagnosis_to_df(
-        session.query(Patient).filter_by(patient_id=patient_id).first()
-    )
-    # Step 2: Get image set evaluation
-    set_eval = (
-        session.query(ImageSetEvaluation)
-        .filter_by(doctor_id=doctor_id, image_set_id=image_set_id)
-        .first()
-    )
 
-    irrelevant = set_eval.is_irrelevant if set_eval else False
-    low_quality = set_eval.is_low_quality if set_eval else False
+def prepare_image_set_evaluations(
+    session, doctor_id: str, image_set_ids: List[str]
+) -> List[ImageSetEvaluationSession]:
+    """
+    Load the evaluation sessions of several image sets for one doctor.
 
-    # Step 3: Get all images for this image set
-    images = session.query(Image).filter_by(image_set_id=image_set_id).all()
+    Issues a constant number of queries regardless of how many sets or slices
+    are requested: one for the image sets (joined to their patient and this
+    doctor's set-level evaluation) and one for every image left-joined to this
+    doctor's evaluations, ordered by slice index.
 
-    # Step 4: Construct image-level evaluations
-    image_evaluations = []
+    Args:
+        session: SQLAlchemy session object.
+        doctor_id: UUID of the doctor.
+        image_set_ids: IDs of the image sets to load.
 
-    for image in images:
-        eval_session = prepare_image_evaluation(
-            session,
-            doctor_id,
-            image_set_id,
-            image.image_id,
-            parent_path=img_set.folder_path,
+    Returns:
+        List of ImageSetEvaluationSession, in the order of image_set_ids.
+        Unknown image set IDs are skipped.
+    """
+    if not image_set_ids:
+        return []
+
+    # Step 1: Image sets with patient and this doctor's set-level evaluation
+    set_rows = (
+        session.query(ImageSet, Patient, ImageSetEvaluation)
+        .outerjoin(Patient, Patient.patient_id == ImageSet.patient_id)
+        .outerjoin(
+            ImageSetEvaluation,
+            and_(
+                ImageSetEvaluation.image_set_id == ImageSet.image_set_id,
+                ImageSetEvaluation.doctor_id == doctor_id,
+            ),
         )
-        if eval_session:
-            image_evaluations.append(eval_session)
-        else:
-            # If no evaluation exists, create a default one
-            image_evaluations.append(
-                ImageEvaluationSession(
-                    image_id=image.image_id,
-                    slice_index=image.slice_index,  # Default value, adjust as needed
-                    image_path=(
-                        img_set.folder_path + "/" + image.image_id
-                        if img_set.folder_path
-                        else None
-                    ),
-                    region=None,  # Default region
-                    score=None,  # Default score
-                )
-            )
-    # Step 6: Return full evaluation object
-    return ImageSetEvaluationSession(
-        image_set_id=image_set_id,
-        patient_id=patient_id,
-        num_images=num_images,
-        conflicted=conflicted,
-        irrelevant_data=irrelevant,
-        low_quality=low_quality,
-        images=image_evaluations,
-        patient_diagnosis=patient_diagnosis,
-        folder_path=folder_path,
+        .filter(ImageSet.image_set_id.in_(image_set_ids))
+        .all()
     )
+    if not set_rows:
+        return []
+
+    # Step 2: Images of these sets whose file exists, left-joined to this
+    # doctor's evaluations
+    image_rows = (
+        session.query(
+            Image.image_set_id,
+            Image.image_id,
+            Image.slice_index,
+            Evaluation.region,
+            Evaluation.basal_score,
+            Evaluation.corona_score,
+        )
+        .outerjoin(
+            Evaluation,
+            and_(
+                Evaluation.image_set_id == Image.image_set_id,
+                Evaluation.image_id == Image.image_id,
+                Evaluation.doctor_id == doctor_id,
+            ),
+        )
+        .filter(Image.image_set_id.in_(image_set_ids), Image.missing.is_(False))
+        .order_by(Image.image_set_id, Image.slice_index)
+        .all()
+    )
+
+    # Step 3: Collect image-level columns per set in one pass
+    columns_by_set = defaultdict(lambda: ([], [], [], []))
+    for iset_id, image_id, slice_index, region, basal, corona in image_rows:
+        image_ids, slice_indices, regions, scores = columns_by_set[iset_id]
+        image_ids.append(image_id)
+        slice_indices.append(slice_index)
+        regions.append(region.value if region not in (None, Region.None_) else None)
+        scores.append(_score_from_region(region, basal, corona))
+
+    # Step 4: Assemble set-level sessions in the requested order
+    sessions_by_id = {}
+    for img_set, patient, set_eval in set_rows:
+        sessions_by_id[img_set.image_set_id] = ImageSetEvaluationSession(
+            image_set_id=img_set.image_set_id,
+            patient_id=img_set.patient_id,
+            num_images=img_set.num_images,
+            conflicted=img_set.conflicted,
+            irrelevant_data=set_eval.is_irrelevant if set_eval else False,
+            low_quality=set_eval.is_low_quality if set_eval else False,
+            images=SliceAnnotations(
+                img_set.folder_path, *columns_by_set[img_set.image_set_id]
+            ),
+            patient_diagnosis=patient_diagnosis_to_df(patient),
+            folder_path=img_set.folder_path,
+        )
+    return [sessions_by_id[i] for i in image_set_ids if i in sessions_by_id]
+
+
+def prepare_image_set_evaluation(
+    session, doctor_id: str, image_set_id: str
+) -> Optional[ImageSetEvaluationSession]:
+    """
+    Load the evaluation session of a single image set for one doctor.
+
+    Returns:
+        ImageSetEvaluationSession or None if the image set does not exist.
+    """
+    sessions = prepare_image_set_evaluations(session, doctor_id, [image_set_id])
+    return sessions[0] if sessions else None
 
 
 def patient_diagnosis_to_df(patient_obj) -> pd.DataFrame:
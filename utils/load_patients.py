@@ -1,82 +1,307 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+from sqlalchemy import Boolean, delete, select, update
 from sqlalchemy.orm import Session
-from utils.db import engine
-from utils.models import ImageSet, Image
+from utils.db import dialect_insert, engine
+from utils.migrations import rebuild_keyless_patients
+from utils.models import (
+    Conflict,
+    Consensus,
+    Evaluation,
+    ImageSet,
+    Image,
+    ImageFolderScan,
+    Patient,
+)
+from utils.refresh_jobs import enqueue_refresh
 
+SCAN_WORKERS = 16
+MAX_BIND_PARAMS = 900  # per INSERT, keeps below SQLite's variable limit
+PROGRESS_EVERY = 50
 
-def load_patients(engine_=engine):
-    # Load your CSV
-    df = pd.read_csv("metadata/patient_metadata.csv")
 
-    # Convert Yes/No, 0/1, TRUE/FALSE → Boolean
-    df.replace(
-        {"Yes": True, "No": False, "TRUE": True, "FALSE": False, 1: True, 0: False},
-        inplace=True,
+def _chunked_upsert(session, model, rows, index_elements, update_columns) -> None:
+    """
+    INSERT ... ON CONFLICT DO UPDATE rows in multi-row chunks.
+
+    Args:
+        session: SQLAlchemy DB session or connection
+        model: ORM class of the target table.
+        rows (list[dict]): rows to write, all with the same keys.
+        index_elements (list[str]): conflict target (primary key columns).
+        update_columns (list[str]): columns overwritten on conflict.
+    """
+    if not rows:
+        return
+    insert = dialect_insert(session)
+    chunk_size = max(1, MAX_BIND_PARAMS // len(rows[0]))
+    for start in range(0, len(rows), chunk_size):
+        stmt = insert(model).values(rows[start : start + chunk_size])
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={col: stmt.excluded[col] for col in update_columns},
+            )
+        )
+
+
+def _upsert_patients(table, conn, keys, data_iter) -> None:
+    """pandas to_sql method: multi-row INSERT ... ON CONFLICT DO UPDATE."""
+    del table  # write through the ORM table, not pandas' inferred one
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    _chunked_upsert(
+        conn,
+        Patient,
+        rows,
+        ["patient_id"],
+        [key for key in keys if key != "patient_id"],
+    )
+
+
+def load_patients(
+    engine_=engine, csv_path: str = "metadata/patient_metadata.csv"
+) -> None:
+    """
+    Load patient metadata from a CSV file into the patients table.
+
+    The ORM-defined table is kept (it is created if missing, and rebuilt if
+    an older load left it without a primary key), existing patients are
+    updated and new ones appended, so image_sets foreign keys stay valid
+    when a new cohort is loaded.
+
+    Args:
+        engine_: SQLAlchemy engine object.
+        csv_path (str): Path to the patient metadata CSV.
+    """
+    df = pd.read_csv(csv_path, dtype={"patient_id": "string", "Category": "string"})
+
+    # Convert Yes/No, 0/1, TRUE/FALSE → nullable Boolean
+    rater_columns = [col for col in df.columns if col[:3] in ("R1:", "R2:", "R3:")]
+    df[rater_columns] = (
+        df[rater_columns]
+        .replace({"Yes": True, "No": False, "TRUE": True, "FALSE": False})
+        .astype("boolean")
     )
 
-    # Save to DB using pandas
-    df.to_sql("patients", con=engine_, if_exists="replace", index=False)
+    Patient.__table__.create(engine_, checkfirst=True)
+    rebuild_keyless_patients(engine_)
+    df.to_sql(
+        "patients",
+        con=engine_,
+        if_exists="append",
+        index=False,
+        chunksize=max(1, MAX_BIND_PARAMS // len(df.columns)),
+        method=_upsert_patients,
+        dtype={col: Boolean() for col in rater_columns},
+    )
+    print(f"✅ Loaded {len(df)} patients into database.")
 
 
 def load_image_sets_from_csv(csv_path: str, data_path: str, engine_=engine) -> None:
     """
     Load image sets from a CSV file and insert them into the database.
 
+    Re-runnable: existing image sets are updated in place (their conflicted
+    flag is kept), new ones are inserted, in chunked bulk upserts.
+
     Args:
         csv_path (str): Path to the CSV file.
         data_path (str): Base folder path for images.
         engine_: SQLAlchemy engine object.
     """
-    df = pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, usecols=["scan_type", "patient_id", "num_images"])
 
     # Generate folder paths and add conflicted column
-    df["folder_path"] = df.apply(
-        lambda row: f"{data_path.rstrip('/')}/{row['patient_id']}/{row['scan_type']}",
-        axis=1,
+    df["folder_path"] = (
+        data_path.rstrip("/")
+        + "/"
+        + df["patient_id"].astype(str)
+        + "/"
+        + df["scan_type"].astype(str)
     )
-    df["conflicted"] = False  # default value
+    df["conflicted"] = False  # default value, only used for new rows
+    df = df.rename(columns={"scan_type": "image_set_id"})
 
     with Session(engine_) as session:
-        for _, row in df.iterrows():
-            image_set = ImageSet(
-                image_set_id=row["scan_type"],
-                patient_id=row["patient_id"],
-                num_images=row["num_images"],
-                folder_path=row["folder_path"],
-                conflicted=row["conflicted"],
-            )
-            session.add(image_set)
+        _chunked_upsert(
+            session,
+            ImageSet,
+            df.to_dict("records"),
+            ["image_set_id"],
+            ["patient_id", "num_images", "folder_path"],
+        )
         session.commit()
-    print("✅ Loaded image sets into database.")
+    print(f"✅ Loaded {len(df)} image sets into database.")
+
+
+def _scan_folder(folder: str):
+    """Return (folder mtime_ns, sorted PNG file names), or None if missing."""
+    if not os.path.isdir(folder):
+        return None
+    mtime_ns = os.stat(folder).st_mtime_ns
+    with os.scandir(folder) as entries:
+        png_files = sorted(
+            entry.name
+            for entry in entries
+            if entry.name.lower().endswith(".png") and entry.is_file()
+        )
+    return mtime_ns, png_files
 
 
-def load_images_from_filesystem(engine_=engine) -> None:
+def _write_image_set_images(
+    session, image_set_id: str, png_files, prune: bool = False
+) -> int:
+    """
+    Upsert the slices of an image set and update its num_images. Slices whose
+    file is no longer listed are flagged missing (a file that comes back
+    clears the flag), keeping their evaluations.
+
+    With prune, missing slices are deleted instead, with the evaluations,
+    conflicts and consensus rows that reference them (SQLite does not enforce
+    the foreign keys). Every deletion is logged. Nothing is committed.
+
+    Returns:
+        int: Number of evaluations deleted, always 0 without prune.
+    """
+    rows = [
+        {
+            "image_id": filename,
+            "image_set_id": image_set_id,
+            "slice_index": index,
+            "missing": False,
+        }
+        for index, filename in enumerate(png_files)
+    ]
+    _chunked_upsert(
+        session, Image, rows, ["image_id", "image_set_id"], ["slice_index", "missing"]
+    )
+    session.execute(
+        update(ImageSet)
+        .where(ImageSet.image_set_id == image_set_id)
+        .values(num_images=len(png_files))
+    )
+    missing = session.scalars(
+        select(Image.image_id).where(
+            Image.image_set_id == image_set_id, Image.image_id.not_in(png_files)
+        )
+    ).all()
+    if not missing:
+        return 0
+    if not prune:
+        session.execute(
+            update(Image)
+            .where(Image.image_set_id == image_set_id, Image.image_id.in_(missing))
+            .values(missing=True)
+        )
+        print(f"⚠️ {len(missing)} slices of {image_set_id} not found, flagged missing.")
+        return 0
+
+    def of_missing(model):
+        return delete(model).where(
+            model.image_set_id == image_set_id, model.image_id.in_(missing)
+        )
+
+    conflicts = session.execute(of_missing(Conflict)).rowcount
+    session.execute(of_missing(Consensus))
+    evaluations = session.execute(of_missing(Evaluation)).rowcount
+    session.execute(of_missing(Image))
+    print(
+        f"🗑️ Pruned {len(missing)} missing slices of {image_set_id} with "
+        f"{evaluations} evaluations and {conflicts} conflicts: {', '.join(missing)}"
+    )
+    return evaluations
+
+
+def _record_folder_scan(session, image_set_id: str, mtime_ns: int, count: int):
+    _chunked_upsert(
+        session,
+        ImageFolderScan,
+        [
+            {
+                "image_set_id": image_set_id,
+                "folder_mtime_ns": mtime_ns,
+                "file_count": count,
+            }
+        ],
+        ["image_set_id"],
+        ["folder_mtime_ns", "file_count"],
+    )
+
+
+def load_images_from_filesystem(
+    engine_=engine,
+    workers: int = SCAN_WORKERS,
+    force: bool = False,
+    prune: bool = False,
+) -> None:
     """
     Scan folders based on image_sets table and populate the images table.
+
+    Folders are listed concurrently with os.scandir; results are written with
+    chunked bulk upserts as they arrive. Sets whose folder mtime and PNG count
+    match the last scan (ImageFolderScan) are skipped, so re-runs are cheap.
+    Folders that list no PNG file are skipped, in case a mount is briefly
+    unavailable. Slices whose file disappeared are flagged missing and keep
+    their evaluations unless prune is set.
+
+    Args:
+        engine_: SQLAlchemy engine object.
+        workers (int): number of folder-scanning threads.
+        force (bool): rewrite every set even if its folder is unchanged.
+        prune (bool): delete missing slices and their evaluations, conflicts
+            and consensus, then queue a refresh of the sets affected.
     """
     with Session(engine_) as session:
-        image_sets = session.query(ImageSet).all()
-
-        for image_set in image_sets:
-            folder = image_set.folder_path
-            if not os.path.isdir(folder):
-                print(f"⚠️ Skipping missing folder: {folder}")
-                continue
+        folders = dict(session.query(ImageSet.image_set_id, ImageSet.folder_path))
+        last_scans = {
+            scan.image_set_id: (scan.folder_mtime_ns, scan.file_count)
+            for scan in session.query(ImageFolderScan)
+        }
 
-            # Get sorted PNG files
-            png_files = sorted(
-                [f for f in os.listdir(folder) if f.lower().endswith(".png")]
-            )
+        total = len(folders)
+        done = skipped = loaded_images = 0
+        stale_sets = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_scan_folder, folder): iset_id
+                for iset_id, folder in folders.items()
+            }
+            for future in as_completed(futures):
+                iset_id = futures[future]
+                done += 1
+                result = future.result()
+                if result is None:
+                    print(f"⚠️ Skipping missing folder: {folders[iset_id]}")
+                    skipped += 1
+                else:
+                    mtime_ns, png_files = result
+                    scan = (mtime_ns, len(png_files))
+                    if not png_files:
+                        print(
+                            f"⚠️ Skipping folder without PNG files: {folders[iset_id]}"
+                        )
+                        skipped += 1
+                    elif not force and last_scans.get(iset_id) == scan:
+                        skipped += 1
+                    else:
+                        if _write_image_set_images(session, iset_id, png_files, prune):
+                            stale_sets.append(iset_id)
+                        _record_folder_scan(session, iset_id, mtime_ns, len(png_files))
+                        session.commit()
+                        loaded_images += len(png_files)
 
-            for index, filename in enumerate(png_files):
-                img = Image(
-                    image_id=filename,
-                    image_set_id=image_set.image_set_id,
-                    slice_index=index,
-                )
-                session.add(img)
+                if done % PROGRESS_EVERY == 0 or done == total:
+                    print(
+                        f"📂 {done}/{total} folders scanned, {skipped} skipped, "
+                        f"{loaded_images} images loaded"
+                    )
 
-        session.commit()
+        if stale_sets:
+            enqueue_refresh(session, stale_sets)
+            print(
+                f"🔄 Pruned evaluations in {len(stale_sets)} image sets, "
+                "refresh queued."
+            )
 
     print("✅ Loaded images into database.")
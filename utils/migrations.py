@@ -0,0 +1,109 @@
+from sqlalchemy import MetaData, Table, inspect, insert, select, text
+from sqlalchemy.schema import CreateColumn
+from utils.db import engine
+from utils.models import Base, Patient
+
+
+def add_missing_columns(engine_=engine) -> list[str]:
+    """
+    Add the columns declared on the models that an existing table lacks.
+
+    Base.metadata.create_all() does not alter tables that already exist. New
+    columns must be nullable or have a server default for this to work.
+
+    Returns:
+        list[str]: Names of the columns that were added, as table.column.
+    """
+    added = []
+
+    with engine_.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+                added.append(f"{table.name}.{column.name}")
+
+    print(f"🧱 Added {len(added)} missing columns.")
+    return added
+
+
+def add_missing_indexes(engine_=engine) -> list[str]:
+    """
+    Create the indexes declared on the models that an existing database lacks.
+
+    Base.metadata.create_all() does not add indexes to tables that already
+    exist, so databases created before an index was declared need this.
+    Duplicate conflicts, image-level or set-level, are removed (keeping the
+    oldest row) before a unique conflict index is created.
+
+    Returns:
+        list[str]: Names of the indexes that were created.
+    """
+    created = []
+
+    with engine_.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                if table.name == "conflicts" and index.unique:
+                    # GROUP BY puts NULL image_ids together, so this also
+                    # dedups set-level conflicts
+                    conn.execute(
+                        text(
+                            "DELETE FROM conflicts WHERE conflict_id NOT IN ("
+                            "SELECT MIN(conflict_id) FROM conflicts "
+                            "GROUP BY image_set_id, image_id, type)"
+                        )
+                    )
+                index.create(conn)
+                created.append(index.name)
+
+    print(f"🧱 Created {len(created)} missing indexes.")
+    return created
+
+
+def rebuild_keyless_patients(engine_=engine) -> bool:
+    """
+    Rebuild a patients table that has no primary key into the ORM schema.
+
+    Databases set up before patients were upserted got their table from
+    pandas to_sql(if_exists="replace"), without a key, and INSERT ... ON
+    CONFLICT (patient_id) fails on it. Rows are copied over; a patient_id
+    listed twice keeps its last row.
+
+    Returns:
+        bool: True if the table was rebuilt.
+    """
+    with engine_.begin() as conn:
+        inspector = inspect(conn)
+        if "patients" not in inspector.get_table_names():
+            return False
+        if inspector.get_pk_constraint("patients")["constrained_columns"]:
+            return False
+
+        legacy = Table("patients", MetaData(), autoload_with=conn)
+        columns = [c.name for c in Patient.__table__.columns if c.name in legacy.c]
+        rows = {}
+        for row in conn.execute(select(legacy)).mappings():
+            if row["patient_id"] is not None:
+                rows[row["patient_id"]] = {c: row[c] for c in columns}
+        legacy.drop(conn)
+        Patient.__table__.create(conn)
+        if rows:
+            conn.execute(insert(Patient.__table__), list(rows.values()))
+
+    print(f"🧱 Rebuilt the patients table with a primary key ({len(rows)} patients).")
+    return True
@@ -7,7 +7,10 @@ from sqlalchemy import (
     Integer,
     ForeignKey,
     Enum,
+    Float,
     ForeignKeyConstraint,
+    Index,
+    false,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import validates
@@ -74,6 +77,25 @@ class Image(Base):
         String, ForeignKey("image_sets.image_set_id"), primary_key=True
     )
     slice_index = Column(Integer, nullable=False)
+    # File not found by the last folder scan; kept with its evaluations
+    missing = Column(Boolean, default=False, server_default=false(), nullable=False)
+
+    # Slices of a set are always loaded in slice order
+    __table_args__ = (Index("ix_images_set_slice", "image_set_id", "slice_index"),)
+
+
+class ImageFolderScan(Base):
+    """
+    Last filesystem scan of an image set folder, used to skip unchanged folders.
+    """
+
+    __tablename__ = "image_folder_scans"
+
+    image_set_id = Column(
+        String, ForeignKey("image_sets.image_set_id"), primary_key=True
+    )
+    folder_mtime_ns = Column(Integer, nullable=False)
+    file_count = Column(Integer, nullable=False)
 
 
 class Doctor(Base):
@@ -118,6 +140,10 @@ class Evaluation(Base):
         ForeignKeyConstraint(
             ["image_set_id", "image_id"], ["images.image_set_id", "images.image_id"]
         ),
+        # Dashboard progress: evaluated sets of one doctor
+        Index("ix_evaluations_doctor_set", "doctor_id", "image_set_id"),
+        # Per-set deletes, conflict scans and consensus (grouped by image)
+        Index("ix_evaluations_set_image", "image_set_id", "image_id"),
     )
 
     @validates("basal_score", "corona_score", "region")
@@ -181,6 +207,26 @@ class Conflict(Base):
             use_alter=True,
             name="fk_image_conflict",
         ),
+        # One row per conflict; also serves per-set lookups and image_id IS NULL
+        Index(
+            "uq_conflicts_set_image_type",
+            "image_set_id",
+            "image_id",
+            "type",
+            unique=True,
+        ),
+        # Unique indexes treat NULLs as distinct, so set-level conflicts
+        # (image_id IS NULL) need their own
+        Index(
+            "uq_conflicts_set_type_set_level",
+            "image_set_id",
+            "type",
+            unique=True,
+            sqlite_where=image_id.is_(None),
+            postgresql_where=image_id.is_(None),
+        ),
+        # Unresolved conflicts per set (flag_conflicted_image_sets)
+        Index("ix_conflicts_resolved_set", "resolved", "image_set_id"),
     )
 
 
@@ -198,3 +244,100 @@ class ImageSetEvaluation(Base):
 
     is_low_quality = Column(Boolean, default=False, nullable=False)
     is_irrelevant = Column(Boolean, default=False, nullable=False)
+
+    __table_args__ = (Index("ix_image_set_evaluations_set", "image_set_id"),)
+
+
+class Consensus(Base):
+    """
+    Consensus of all doctors' evaluations of a single image (see
+    utils.consensus). Scores are aggregated over the doctors who chose the
+    matching region.
+    """
+
+    __tablename__ = "consensus"
+
+    image_set_id = Column(String, primary_key=True)
+    image_id = Column(String, primary_key=True)
+
+    num_raters = Column(Integer, nullable=False)
+    region = Column(Enum(Region), nullable=False)  # majority vote
+    region_votes = Column(Integer, nullable=False)
+    basal_score_median = Column(Float, nullable=True)
+    basal_score_mean = Column(Float, nullable=True)
+    corona_score_median = Column(Float, nullable=True)
+    corona_score_mean = Column(Float, nullable=True)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["image_set_id", "image_id"], ["images.image_set_id", "images.image_id"]
+        ),
+    )
+
+
+class ImageSetConsensus(Base):
+    """
+    Consensus of the doctors' image set-level flags, and whether the image
+    set's consensus needs to be rebuilt.
+    """
+
+    __tablename__ = "image_set_consensus"
+
+    image_set_id = Column(
+        String, ForeignKey("image_sets.image_set_id"), primary_key=True
+    )
+
+    num_raters = Column(Integer, nullable=False)
+    is_low_quality = Column(Boolean, nullable=False)  # strict majority
+    low_quality_votes = Column(Integer, nullable=False)
+    is_irrelevant = Column(Boolean, nullable=False)
+    irrelevant_votes = Column(Integer, nullable=False)
+    # Set when the image set's evaluations change after the last refresh
+    stale = Column(Boolean, default=False, nullable=False)
+
+
+class JobStatus(enum.Enum):
+    Pending = "Pending"
+    Running = "Running"
+    Done = "Done"
+    Failed = "Failed"
+
+
+class RefreshJob(Base):
+    """
+    Queued refresh of an image set's conflicts and consensus (see
+    utils.refresh_jobs). One row per image set, so repeated requests for a set
+    coalesce into a single pending job.
+    """
+
+    __tablename__ = "refresh_jobs"
+
+    image_set_id = Column(
+        String, ForeignKey("image_sets.image_set_id"), primary_key=True
+    )
+
+    status = Column(Enum(JobStatus), nullable=False)
+    # Incremented on every request; a run only completes the generation it took
+    generation = Column(Integer, default=1, nullable=False)
+    requested_at = Column(Float, nullable=False)  # Unix time
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+
+    __table_args__ = (Index("ix_refresh_jobs_status", "status", "requested_at"),)
+
+
+class SessionToken(Base):
+    """
+    Login restorable from the URL after a page reload (see
+    utils.credentials.issue_session_token). Deleting the row logs it out.
+    """
+
+    __tablename__ = "session_tokens"
+
+    token_hash = Column(String, primary_key=True)  # SHA-256 of the token
+    doctor_id = Column(String, ForeignKey("doctors.uuid"), nullable=False)
+    # SHA-256 of the password hash at login; a password change voids the token
+    password_fingerprint = Column(String, nullable=False)
+    expires_at = Column(Float, nullable=False)  # Unix time
@@ -0,0 +1,153 @@
+import hashlib
+import math
+import os
+import tempfile
+from functools import lru_cache, partial
+from typing import Callable, List, Optional, Tuple
+from PIL import Image as PILImage
+
+PREVIEW_ROOT = "previews"
+# Longest side of each preview tier in pixels; larger requests get the source
+PREVIEW_TIERS = (256, 384, 512)
+THUMBNAIL_SIZE = 64
+FILMSTRIP_COLUMNS = 20
+
+
+@lru_cache(maxsize=65536)
+def _content_checksum(path: str, _mtime_ns: int, _size: int) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_checksum(path: str) -> str:
+    """
+    Checksum of a source image's content, memoized per (path, mtime, size).
+    """
+    stat = os.stat(path)
+    return _content_checksum(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _cache_path(checksum: str, suffix: str, preview_root: str) -> str:
+    return os.path.join(preview_root, checksum[:2], f"{checksum}_{suffix}.png")
+
+
+def _save_atomic(img: PILImage.Image, path: str) -> None:
+    """
+    Write img to path through a temp file of its own, so threads and processes
+    building the same preview never share one. A file another writer finished
+    first is kept as is.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, format="PNG", optimize=True)
+        if not os.path.exists(path):
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def preview_tier(display_width: int) -> Optional[int]:
+    """
+    Smallest preview tier covering a display width, or None if the source
+    itself is needed.
+    """
+    return next((t for t in PREVIEW_TIERS if t >= display_width), None)
+
+
+def get_preview(path: str, max_side: int, preview_root: str = PREVIEW_ROOT) -> str:
+    """
+    Return the path of the smallest preview tier that covers max_side pixels.
+
+    Tiers are generated on first use and cached on disk keyed by the source
+    checksum. The source path itself is returned when no tier is smaller than
+    the source or large enough for the request (e.g. when zoomed in).
+
+    Args:
+        path (str): source slice image.
+        max_side (int): display size, in pixels, of the longest side.
+        preview_root (str): folder for cached previews.
+    """
+    tier = preview_tier(max_side)
+    if tier is None:
+        return path
+
+    preview = _cache_path(source_checksum(path), str(tier), preview_root)
+    if os.path.exists(preview):
+        return preview
+
+    # Read directly: previews are mostly built ahead of display, by prefetch
+    # or build_previews, and should not fill the decoded-slice cache
+    with PILImage.open(path) as img:
+        if max(img.size) <= tier:
+            return path
+        scaled = img.copy()
+    scaled.thumbnail((tier, tier), PILImage.Resampling.LANCZOS)
+    _save_atomic(scaled, preview)
+    return preview
+
+
+@lru_cache(maxsize=None)
+def preview_loader(
+    max_side: int, preview_root: str = PREVIEW_ROOT
+) -> Callable[[str], str]:
+    """
+    get_preview for a fixed size, as one stable callable per size so that
+    SliceCache.prefetch can tell requests already in flight.
+    """
+    return partial(get_preview, max_side=max_side, preview_root=preview_root)
+
+
+def build_previews(paths: List[str], preview_root: str = PREVIEW_ROOT) -> int:
+    """
+    Generate every preview tier for the given slices ahead of time.
+
+    Returns:
+        int: Number of slices processed.
+    """
+    for path in paths:
+        for tier in PREVIEW_TIERS:
+            get_preview(path, tier, preview_root)
+    return len(paths)
+
+
+def get_filmstrip(
+    paths: List[str],
+    thumbnail_size: int = THUMBNAIL_SIZE,
+    columns: int = FILMSTRIP_COLUMNS,
+    preview_root: str = PREVIEW_ROOT,
+) -> Tuple[str, int]:
+    """
+    Return a sprite of thumbnails of all slices of a series, in order.
+
+    Thumbnails are laid out left to right, top to bottom, `columns` per row.
+    The sprite is cached on disk keyed by the checksums of all sources.
+
+    Returns:
+        Tuple (sprite path, number of columns).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        digest.update(source_checksum(path).encode())
+    sprite_path = _cache_path(
+        digest.hexdigest(), f"strip{thumbnail_size}x{columns}", preview_root
+    )
+    if os.path.exists(sprite_path):
+        return sprite_path, columns
+
+    rows = max(1, math.ceil(len(paths) / columns))
+    sprite = PILImage.new("L", (columns * thumbnail_size, rows * thumbnail_size))
+    for i, path in enumerate(paths):
+        with PILImage.open(path) as src:
+            src.draft("L", (thumbnail_size, thumbnail_size))
+            thumb = src.convert("L")
+        thumb.thumbnail((thumbnail_size, thumbnail_size), PILImage.Resampling.BILINEAR)
+        row, col = divmod(i, columns)
+        sprite.paste(thumb, (col * thumbnail_size, row * thumbnail_size))
+    _save_atomic(sprite, sprite_path)
+    return sprite_path, columns
@@ -0,0 +1,318 @@
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from sqlalchemy import case, func, literal, select, update
+from utils.conflict import (
+    flag_conflicted_image_sets,
+    scan_and_update_image_conflicts_sql,
+    scan_and_update_image_set_conflicts,
+)
+from utils.consensus import refresh_consensus
+from utils.db import SessionLocal, dialect_insert
+from utils.models import JobStatus, RefreshJob
+
+JOB_BATCH_SIZE = 100  # image sets refreshed together per run
+JOB_POLL_INTERVAL = 2.0  # seconds an idle worker waits before checking the queue
+JOB_MAX_ATTEMPTS = 3  # runs of a failing job before it is left Failed
+# Running jobs not finished after this many seconds are presumed abandoned by a
+# stopped worker; keep it well above the duration of a batch
+JOB_STALE_SECONDS = 30 * 60
+
+
+def enqueue_refresh(session, image_set_ids: Iterable[str]) -> int:
+    """
+    Queue a conflict and consensus refresh of image sets and commit.
+
+    A set that already has a pending job keeps it (and its place in the
+    queue); a set whose job is running gets a new generation, so it is
+    refreshed again once the current run ends.
+
+    Returns:
+        int: Number of image sets queued.
+    """
+    image_set_ids = sorted(set(image_set_ids))
+    if not image_set_ids:
+        return 0
+
+    now = time.time()
+    insert = dialect_insert(session)
+    stmt = insert(RefreshJob).values(
+        [
+            {
+                "image_set_id": image_set_id,
+                "status": JobStatus.Pending,
+                "generation": 1,
+                "requested_at": now,
+                "attempts": 0,
+            }
+            for image_set_id in image_set_ids
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["image_set_id"],
+        set_={
+            "status": JobStatus.Pending,
+            "generation": RefreshJob.generation + 1,
+            "requested_at": case(
+                (RefreshJob.status == JobStatus.Pending, RefreshJob.requested_at),
+                else_=stmt.excluded.requested_at,
+            ),
+            "attempts": 0,
+            "error": None,
+        },
+    )
+    session.execute(stmt)
+    session.commit()
+    refresh_worker.wake()
+    return len(image_set_ids)
+
+
+def claim_jobs(session, limit: int = JOB_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Mark up to `limit` of the oldest pending jobs as running and commit.
+
+    Returns:
+        dict mapping each claimed image set ID to the generation taken.
+    """
+    pending = session.execute(
+        select(RefreshJob.image_set_id, RefreshJob.generation)
+        .where(RefreshJob.status == JobStatus.Pending)
+        .order_by(RefreshJob.requested_at)
+        .limit(limit)
+    ).all()
+
+    claimed = {}
+    now = time.time()
+    for image_set_id, generation in pending:
+        # Another worker may have taken the job since the SELECT
+        taken = session.execute(
+            update(RefreshJob)
+            .where(
+                RefreshJob.image_set_id == image_set_id,
+                RefreshJob.generation == generation,
+                RefreshJob.status == JobStatus.Pending,
+            )
+            .values(
+                status=JobStatus.Running,
+                started_at=now,
+                attempts=RefreshJob.attempts + 1,
+            )
+        ).rowcount
+        if taken:
+            claimed[image_set_id] = generation
+    session.commit()
+    return claimed
+
+
+def _finish_jobs(session, claimed: Dict[str, int], error: Optional[str] = None):
+    """
+    Close claimed jobs as Done, or on error as Pending for a retry (Failed
+    after JOB_MAX_ATTEMPTS). Jobs requested again while running are left
+    Pending.
+    """
+    if error is None:
+        status = JobStatus.Done
+    else:
+        status_type = RefreshJob.status.type
+        status = case(
+            (
+                RefreshJob.attempts >= JOB_MAX_ATTEMPTS,
+                literal(JobStatus.Failed, status_type),
+            ),
+            else_=literal(JobStatus.Pending, status_type),
+        )
+    now = time.time()
+    for image_set_id, generation in claimed.items():
+        session.execute(
+            update(RefreshJob)
+            .where(
+                RefreshJob.image_set_id == image_set_id,
+                RefreshJob.generation == generation,
+                RefreshJob.status == JobStatus.Running,
+            )
+            .values(status=status, finished_at=now, error=error)
+        )
+    session.commit()
+
+
+def _refresh(session, image_set_ids) -> None:
+    scan_and_update_image_conflicts_sql(session, image_set_ids)
+    scan_and_update_image_set_conflicts(session, image_set_ids)
+    flag_conflicted_image_sets(session, image_set_ids)
+    refresh_consensus(session, image_set_ids)
+
+
+def _run_jobs_one_by_one(session, claimed: Dict[str, int]) -> int:
+    """Refresh claimed image sets separately, so one failing set fails alone."""
+    refreshed = 0
+    for image_set_id, generation in sorted(claimed.items()):
+        job = {image_set_id: generation}
+        try:
+            _refresh(session, [image_set_id])
+        except Exception as e:  # pylint: disable=broad-except
+            session.rollback()
+            _finish_jobs(session, job, error=str(e))
+            print(f"❌ Refresh of {image_set_id} failed: {e}")
+            continue
+        _finish_jobs(session, job)
+        refreshed += 1
+    return refreshed
+
+
+def run_pending_jobs(session, limit: int = JOB_BATCH_SIZE) -> int:
+    """
+    Claim a batch of pending jobs and refresh their image sets: image and
+    image set conflicts, conflicted flags, then consensus. If the batch
+    fails, its image sets are retried one by one and only the failing ones
+    are closed with an error.
+
+    Returns:
+        int: Number of image sets refreshed (0 when the queue was empty).
+    """
+    claimed = claim_jobs(session, limit)
+    if not claimed:
+        return 0
+
+    image_set_ids = sorted(claimed)
+    try:
+        _refresh(session, image_set_ids)
+    except Exception as e:  # pylint: disable=broad-except
+        session.rollback()
+        print(
+            f"⚠️ Refresh of {len(image_set_ids)} image sets failed ({e}), "
+            "retrying them one by one."
+        )
+        return _run_jobs_one_by_one(session, claimed)
+
+    _finish_jobs(session, claimed)
+    print(f"🔄 Refreshed conflicts and consensus of {len(image_set_ids)} image sets.")
+    return len(image_set_ids)
+
+
+def recover_interrupted_jobs(session, stale_after: float = JOB_STALE_SECONDS) -> int:
+    """
+    Put jobs left Running by a stopped worker back in the queue: those
+    started more than stale_after seconds ago. Jobs of live workers, in this
+    or another process, finish well within that time.
+
+    Returns:
+        int: Number of jobs re-queued.
+    """
+    recovered = session.execute(
+        update(RefreshJob)
+        .where(
+            RefreshJob.status == JobStatus.Running,
+            RefreshJob.started_at < time.time() - stale_after,
+        )
+        .values(status=JobStatus.Pending)
+    ).rowcount
+    session.commit()
+    return recovered
+
+
+def get_job_status(
+    session, image_set_ids: Optional[Iterable[str]] = None
+) -> Dict[str, JobStatus]:
+    """Status of the refresh job of each image set that has one."""
+    stmt = select(RefreshJob.image_set_id, RefreshJob.status)
+    if image_set_ids is not None:
+        stmt = stmt.where(RefreshJob.image_set_id.in_(set(image_set_ids)))
+    return dict(session.execute(stmt).all())
+
+
+def get_job_counts(session) -> Dict[JobStatus, int]:
+    """Number of refresh jobs per status."""
+    counts = dict(
+        session.execute(
+            select(RefreshJob.status, func.count()).group_by(RefreshJob.status)
+        ).all()
+    )
+    return {status: counts.get(status, 0) for status in JobStatus}
+
+
+class RefreshWorker:
+    """
+    Runs queued refresh jobs on a daemon thread, so saving annotations does
+    not wait for conflict scans and consensus rebuilds. enqueue_refresh wakes
+    the worker of its own process; otherwise the queue is polled every
+    poll_interval seconds, which also picks up jobs queued by other processes.
+
+    Revisions (utils.revision) are per process: caches of a web process keep
+    their TTL when the jobs run in a separate worker process.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        batch_size: int = JOB_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def run_once(self) -> int:
+        """Run one batch of pending jobs in the calling thread."""
+        with self.session_factory() as session:
+            return run_pending_jobs(session, self.batch_size)
+
+    def recover(self) -> None:
+        with self.session_factory() as session:
+            recovered = recover_interrupted_jobs(session)
+        if recovered:
+            print(f"🔄 Re-queued {recovered} interrupted refresh jobs.")
+
+    def run_forever(self) -> None:
+        last_recovery = None
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                # Periodically, since another process's worker may have stopped
+                if (
+                    last_recovery is None
+                    or time.monotonic() - last_recovery > JOB_STALE_SECONDS / 2
+                ):
+                    self.recover()
+                    last_recovery = time.monotonic()
+                refreshed = self.run_once()
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"❌ Refresh worker error: {e}")
+                refreshed = 0
+            if not refreshed:
+                self._wakeup.wait(self.poll_interval)
+
+    def start(self) -> None:
+        """Start the worker thread unless it is already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self.run_forever, name="refresh-worker", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the worker thread after its current batch."""
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+
+refresh_worker = RefreshWorker()
+
+
+if __name__ == "__main__":
+    # Standalone worker process: python -m utils.refresh_jobs
+    print("🔄 Refresh worker started.")
+    refresh_worker.run_forever()
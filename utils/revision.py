@@ -0,0 +1,45 @@
+import threading
+from collections import defaultdict
+from typing import Optional, Tuple
+
+# Process-wide data revisions used as part of Streamlit cache keys. A doctor's
+# revision is bumped when that doctor's evaluations change; the global one when
+# data visible to every doctor changes (e.g. conflict flags).
+_lock = threading.Lock()
+_global_revision = 0
+_doctor_revisions = defaultdict(int)
+_data_revision = 0  # bumped on any change, for data shared across doctors
+
+
+def bump_revision(doctor_id: Optional[str] = None) -> None:
+    """
+    Mark cached data as stale.
+
+    Args:
+        doctor_id: bump only this doctor's revision. The global revision is
+            bumped when None, invalidating every doctor's cached data.
+    """
+    global _global_revision, _data_revision  # pylint: disable=global-statement
+    with _lock:
+        _data_revision += 1
+        if doctor_id is None:
+            _global_revision += 1
+        else:
+            _doctor_revisions[doctor_id] += 1
+
+
+def get_revision(doctor_id: str) -> Tuple[int, int]:
+    """
+    Return the (global, doctor) revision pair to include in a cache key.
+    """
+    with _lock:
+        return _global_revision, _doctor_revisions.get(doctor_id, 0)
+
+
+def get_data_revision() -> int:
+    """
+    Return a revision that changes whenever any doctor's data changes, for
+    caches built from every doctor's evaluations (e.g. agreement statistics).
+    """
+    with _lock:
+        return _data_revision
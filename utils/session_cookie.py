@@ -0,0 +1,28 @@
+import json
+from typing import Optional
+import streamlit as st
+from utils.config import SESSION_TOKEN_TTL
+
+SESSION_COOKIE = "medfabric_session"
+
+
+def read_session_cookie() -> Optional[str]:
+    """Session token the browser sent when this Streamlit session started."""
+    return st.context.cookies.get(SESSION_COOKIE)
+
+
+def write_session_cookie(token: Optional[str], max_age: int = SESSION_TOKEN_TTL):
+    """
+    Store a session token in the browser, or delete it when token is None.
+
+    Streamlit cannot set response headers, so the cookie is written by a
+    script on the page and cannot be HttpOnly. It is SameSite=Strict, Secure
+    over HTTPS, and stays out of URLs, browser history and proxy logs.
+    """
+    value, max_age = (token, max_age) if token else ("", 0)
+    cookie = f"{SESSION_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Strict"
+    st.html(
+        f"<script>document.cookie = {json.dumps(cookie)}"
+        " + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
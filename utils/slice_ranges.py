@@ -0,0 +1,155 @@
+from typing import Hashable
+import numpy as np
+import pandas as pd
+
+# One "4-20" or "7" item of a comma separated slice spec
+RANGE_REGEX = r"^\s*(?P<start>\d+)\s*(?:-\s*(?P<stop>\d+))?\s*$"
+
+
+class SliceSelection:
+    """
+    Compact CSR representation of a column of slice specs such as "4-20",
+    "1,2" or "54-62".
+
+    Row i selects indices[offsets[i]:offsets[i + 1]], which are 0-based,
+    sorted and unique int32 slice indices. Rows are addressed by the labels
+    of the Series they were parsed from (e.g. image set ids), which must be
+    unique for label lookups.
+    """
+
+    def __init__(self, labels: pd.Index, offsets: np.ndarray, indices: np.ndarray):
+        self.labels = labels
+        self.offsets = offsets
+        self.indices = indices
+        self._lengths = np.diff(offsets)
+        # Sortable (row, slice) keys for vectorized membership queries
+        self._keys = (
+            np.repeat(np.arange(len(labels), dtype=np.int64), self._lengths) << 32
+        ) | indices.astype(np.int64)
+
+    @classmethod
+    def from_specs(cls, specs: pd.Series, one_based: bool = True) -> "SliceSelection":
+        """
+        Parse a whole column of slice specs without per-cell Python loops.
+
+        Args:
+            specs (pd.Series): slice spec strings; missing values select
+                nothing. Malformed items are ignored.
+            one_based (bool): specs count slices from 1, as in the legacy
+                scan_metadata.csv.
+        """
+        positional = specs.reset_index(drop=True)
+        items = positional.dropna().astype(str).str.split(",").explode()
+        bounds = items.str.extract(RANGE_REGEX).dropna(subset=["start"])
+        start = bounds["start"].astype(np.int64).to_numpy()
+        stop = bounds["stop"].fillna(bounds["start"]).astype(np.int64).to_numpy()
+        start, stop = np.minimum(start, stop), np.maximum(start, stop)
+        lengths = stop - start + 1
+
+        # Concatenate the ranges start..stop: position within each run + start
+        steps = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        slices = np.repeat(start, lengths) + steps - int(one_based)
+        rows = np.repeat(bounds.index.to_numpy(dtype=np.int64), lengths)
+        rows, slices = rows[slices >= 0], slices[slices >= 0]
+
+        # Sort by (row, slice) and drop duplicates from overlapping ranges
+        keys = np.unique((rows << 32) | slices)
+        rows, indices = keys >> 32, (keys & 0xFFFFFFFF).astype(np.int32)
+        offsets = np.zeros(len(specs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(specs)), out=offsets[1:])
+        return cls(specs.index, offsets, indices)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __getitem__(self, label: Hashable) -> np.ndarray:
+        """Selected slice indices for one row label."""
+        position = self.labels.get_loc(label)
+        return self.indices[self.offsets[position] : self.offsets[position + 1]]
+
+    def counts(self) -> pd.Series:
+        """Number of selected slices per row."""
+        return pd.Series(self._lengths, index=self.labels)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per selected slice with columns "label" and "slice_index"."""
+        return pd.DataFrame(
+            {
+                "label": np.repeat(self.labels.to_numpy(), self._lengths),
+                "slice_index": self.indices,
+            }
+        )
+
+    def to_intervals(self) -> pd.DataFrame:
+        """
+        Collapse each row back into contiguous runs.
+
+        Returns:
+            DataFrame with columns "label", "start" and "stop" (inclusive,
+            0-based).
+        """
+        if len(self.indices) == 0:
+            return pd.DataFrame(
+                {
+                    "label": self.labels[:0].to_numpy(),
+                    "start": self.indices[:0],
+                    "stop": self.indices[:0],
+                }
+            )
+        rows = np.repeat(np.arange(len(self.labels)), self._lengths)
+        breaks = np.ones(len(self.indices), dtype=bool)
+        breaks[1:] = (np.diff(self.indices) != 1) | (np.diff(rows) != 0)
+        starts = np.flatnonzero(breaks)
+        stops = np.append(starts[1:], len(self.indices)) - 1
+        return pd.DataFrame(
+            {
+                "label": self.labels.to_numpy()[rows[starts]],
+                "start": self.indices[starts],
+                "stop": self.indices[stops],
+            }
+        )
+
+    def is_slice_selected(self, labels, slice_indices):
+        """
+        Check whether slices are selected, vectorized over both arguments.
+
+        Args:
+            labels: row label or array of labels. Unknown labels select nothing.
+            slice_indices: 0-based slice index or array of indices, broadcast
+                against labels.
+
+        Returns:
+            bool for scalar arguments, otherwise a boolean ndarray.
+        """
+        scalar = np.ndim(labels) == 0 and np.ndim(slice_indices) == 0
+        labels_, slices = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(labels, dtype=object)),
+            np.atleast_1d(np.asarray(slice_indices, dtype=np.int64)),
+        )
+        rows = self.labels.get_indexer(labels_.ravel())
+        slices = slices.ravel()
+        valid = (rows >= 0) & (slices >= 0) & (slices <= 0xFFFFFFFF)
+
+        keys = (rows.astype(np.int64) << 32) | np.where(valid, slices, 0)
+        found = np.searchsorted(self._keys, keys)
+        hit = np.zeros(len(keys), dtype=bool)
+        in_bounds = valid & (found < len(self._keys))
+        hit[in_bounds] = self._keys[found[in_bounds]] == keys[in_bounds]
+
+        if scalar:
+            return bool(hit[0])
+        return hit.reshape(labels_.shape)
+
+
+def parse_slice_specs(specs: pd.Series, one_based: bool = True) -> SliceSelection:
+    """Parse a column of slice specs, see SliceSelection.from_specs."""
+    return SliceSelection.from_specs(specs, one_based=one_based)
+
+
+def is_slice_selected(
+    selection: SliceSelection, labels, slice_indices
+) -> "bool | np.ndarray":
+    """Check whether slices are selected, see SliceSelection.is_slice_selected."""
+    return selection.is_slice_selected(labels, slice_indices)
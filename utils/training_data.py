@@ -0,0 +1,286 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, select
+from utils.agreement import REGION_CODES
+from utils.models import (
+    Consensus,
+    Evaluation,
+    Image,
+    ImageSet,
+    ImageSetConsensus,
+    ImageSetEvaluation,
+    Region,
+)
+from utils.volume_store import VOLUME_ROOT, decode_slice, open_volume
+
+DATA_WORKERS = os.cpu_count() or 4
+PREFETCH_BATCHES = 2  # batches decoded ahead of the one being consumed
+OUTPUT_SIZE = (256, 256)  # (height, width) of the yielded slices
+# (low, high) pixel values mapped to [0, 1]; None for the full range of each
+# slice's dtype (see dtype_window), so 8- and 16-bit slices both span [0, 1]
+PIXEL_WINDOW = None
+
+
+def load_samples(
+    session, source: str = "consensus", include_flagged: bool = False
+) -> pd.DataFrame:
+    """
+    List the labeled slices to train on, one row per sample.
+
+    Args:
+        session: SQLAlchemy DB session
+        source (str): "consensus" for one sample per image from the consensus
+            table (see utils.consensus), or "evaluations" for one sample per
+            doctor evaluation.
+        include_flagged (bool): keep image sets flagged low quality or
+            irrelevant (by consensus, or by the evaluating doctor).
+
+    Returns:
+        DataFrame with columns image_set_id, image_id, slice_index,
+        folder_path, region (code, see utils.agreement.REGION_CODES) and
+        score (score of the chosen region, NaN for Region.None_).
+    """
+    if source == "consensus":
+        labels, flags = Consensus, ImageSetConsensus
+        columns = [
+            labels.region,
+            labels.basal_score_median.label("basal_score"),
+            labels.corona_score_median.label("corona_score"),
+        ]
+        flags_join = flags.image_set_id == labels.image_set_id
+    elif source == "evaluations":
+        labels, flags = Evaluation, ImageSetEvaluation
+        columns = [labels.region, labels.basal_score, labels.corona_score]
+        flags_join = and_(
+            flags.image_set_id == labels.image_set_id,
+            flags.doctor_id == labels.doctor_id,
+        )
+    else:
+        raise ValueError(f"Unknown sample source: {source}")
+
+    stmt = (
+        select(
+            labels.image_set_id,
+            labels.image_id,
+            Image.slice_index,
+            ImageSet.folder_path,
+            *columns,
+        )
+        .join(
+            Image,
+            and_(
+                Image.image_set_id == labels.image_set_id,
+                Image.image_id == labels.image_id,
+                Image.missing.is_(False),
+            ),
+        )
+        .join(ImageSet, ImageSet.image_set_id == labels.image_set_id)
+        .outerjoin(flags, flags_join)
+        .order_by(labels.image_set_id, Image.slice_index)
+    )
+    if not include_flagged:
+        stmt = stmt.where(
+            flags.is_low_quality.isnot(True), flags.is_irrelevant.isnot(True)
+        )
+    df = pd.read_sql(stmt, session.connection())
+
+    region = df["region"]
+    df["score"] = np.where(
+        region == Region.BasalGanglia,
+        df["basal_score"],
+        np.where(region == Region.CoronaRadiata, df["corona_score"], np.nan),
+    ).astype(np.float32)
+    df["region"] = region.map(REGION_CODES).astype(np.int64)
+    return df.drop(columns=["basal_score", "corona_score"])
+
+
+def read_slice(
+    image_set_id: str, image_id: str, folder_path: str, volume_root: str = VOLUME_ROOT
+) -> np.ndarray:
+    """
+    Decode one slice, from its packed volume (see utils.volume_store) when it
+    has been built, otherwise from the PNG.
+    """
+    volume = open_volume(image_set_id, volume_root)
+    if volume is not None:
+        try:
+            return np.asarray(volume.slice_by_id(image_id))
+        except KeyError:
+            pass  # volume built before this slice was added
+    return decode_slice(os.path.join(folder_path, image_id))
+
+
+def resize_stack(stack: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Bilinear resize of a (N, H, W) stack to (N, height, width) as float32,
+    with the same pixel-center alignment for every slice.
+    """
+    height, width = size
+    in_height, in_width = stack.shape[1:]
+    if (in_height, in_width) == (height, width):
+        return stack.astype(np.float32)
+
+    def grid(out_len, in_len):
+        coords = (np.arange(out_len) + 0.5) * (in_len / out_len) - 0.5
+        coords = np.clip(coords, 0, in_len - 1)
+        low = np.floor(coords).astype(np.intp)
+        high = np.minimum(low + 1, in_len - 1)
+        return low, high, (coords - low).astype(np.float32)
+
+    y0, y1, wy = grid(height, in_height)
+    x0, x1, wx = grid(width, in_width)
+    stack = stack.astype(np.float32)
+    top = stack[:, y0][:, :, x0] * (1 - wx) + stack[:, y0][:, :, x1] * wx
+    bottom = stack[:, y1][:, :, x0] * (1 - wx) + stack[:, y1][:, :, x1] * wx
+    return top * (1 - wy)[:, None] + bottom * wy[:, None]
+
+
+def dtype_window(dtype: np.dtype) -> Tuple[float, float]:
+    """Window of an integer dtype's full range, or (0, 1) for floats."""
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return float(info.min), float(info.max)
+    return 0.0, 1.0
+
+
+def apply_window(stack: np.ndarray, window: Tuple[float, float]) -> np.ndarray:
+    """Map pixel values in [low, high] to [0, 1], clipping outside, in place."""
+    low, high = window
+    stack -= low
+    stack *= 1.0 / (high - low)
+    return np.clip(stack, 0.0, 1.0, out=stack)
+
+
+class SliceBatchLoader:
+    """
+    Iterate over samples from load_samples in model-ready batches of
+    (slices, regions, scores):
+
+    - slices: float32 (N, height, width), windowed to [0, 1] (by default
+      over the full range of each slice's dtype, see dtype_window)
+    - regions: int64 (N,) region codes
+    - scores: float32 (N,), NaN where the region has no score
+
+    Slices are decoded on a thread pool, PREFETCH_BATCHES batches ahead, so
+    only a few batches are in memory at once. The order is a permutation
+    drawn from seed + epoch; each shard takes every num_shards-th sample of
+    it, so shards of the same epoch never overlap.
+    """
+
+    def __init__(
+        self,
+        samples: pd.DataFrame,
+        batch_size: int = 32,
+        shuffle: bool = True,
+        seed: int = 0,
+        num_shards: int = 1,
+        shard_index: int = 0,
+        size: Tuple[int, int] = OUTPUT_SIZE,
+        window: Optional[Tuple[float, float]] = PIXEL_WINDOW,
+        drop_last: bool = False,
+        workers: int = DATA_WORKERS,
+        prefetch_batches: int = PREFETCH_BATCHES,
+        volume_root: str = VOLUME_ROOT,
+    ):
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"shard_index must be in [0, {num_shards}).")
+        self.samples = samples.reset_index(drop=True)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        self.size = size
+        self.window = window
+        self.drop_last = drop_last
+        self.workers = workers
+        self.prefetch_batches = prefetch_batches
+        self.volume_root = volume_root
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        """Select the shuffle order of an epoch (seed + epoch)."""
+        self.epoch = epoch
+
+    def _indices(self) -> np.ndarray:
+        order = np.arange(len(self.samples))
+        if self.shuffle:
+            order = np.random.default_rng(self.seed + self.epoch).permutation(order)
+        return order[self.shard_index :: self.num_shards]
+
+    def __len__(self) -> int:
+        count = len(self._indices())
+        if self.drop_last:
+            return count // self.batch_size
+        return -(-count // self.batch_size)
+
+    def _load_batch(self, pool: ThreadPoolExecutor, indices: np.ndarray):
+        rows = self.samples.iloc[indices]
+        pixels = list(
+            pool.map(
+                lambda row: read_slice(*row, volume_root=self.volume_root),
+                rows[["image_set_id", "image_id", "folder_path"]].itertuples(
+                    index=False, name=None
+                ),
+            )
+        )
+
+        slices = np.empty((len(pixels),) + tuple(self.size), dtype=np.float32)
+        # Resize and window slices of the same shape and dtype together
+        groups = {}
+        for position, array in enumerate(pixels):
+            groups.setdefault((array.shape, array.dtype), []).append(position)
+        for (_, dtype), positions in groups.items():
+            slices[positions] = apply_window(
+                resize_stack(np.stack([pixels[i] for i in positions]), self.size),
+                self.window or dtype_window(dtype),
+            )
+        return (
+            slices,
+            rows["region"].to_numpy(dtype=np.int64),
+            rows["score"].to_numpy(dtype=np.float32),
+        )
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        indices = self._indices()
+        stop = len(self) * self.batch_size
+        batches = (
+            indices[start : start + self.batch_size]
+            for start in range(0, min(stop, len(indices)), self.batch_size)
+        )
+
+        # Batch decoding runs on its own thread; slices within a batch on the pool
+        with (
+            ThreadPoolExecutor(max_workers=self.workers) as pool,
+            ThreadPoolExecutor(max_workers=1) as loader,
+        ):
+            pending = deque()
+            for batch in batches:
+                pending.append(loader.submit(self._load_batch, pool, batch))
+                if len(pending) > self.prefetch_batches:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def make_training_loader(
+    session,
+    source: str = "consensus",
+    include_flagged: bool = False,
+    **loader_kwargs,
+) -> SliceBatchLoader:
+    """
+    Build a SliceBatchLoader over load_samples(session, source, ...).
+
+    Args:
+        session: SQLAlchemy DB session, only used to list the samples.
+        **loader_kwargs: forwarded to SliceBatchLoader (batch_size, seed,
+            num_shards, shard_index, ...).
+    """
+    samples = load_samples(session, source, include_flagged)
+    print(f"🧠 {len(samples)} training samples from {source}.")
+    return SliceBatchLoader(samples, **loader_kwargs)
@@ -0,0 +1,230 @@
+import json
+import os
+import uuid
+from functools import lru_cache
+from typing import Iterable, Optional
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy.orm import Session
+from utils.db import engine
+from utils.models import Image, ImageSet
+
+VOLUME_ROOT = "volumes"
+
+
+def _volume_paths(image_set_id: str, volume_root: str = VOLUME_ROOT):
+    """Base path of the arrays of an image set and path of its index."""
+    # image_set_id contains spaces and brackets; keep it readable but path-safe
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in image_set_id)
+    base = os.path.join(volume_root, safe)
+    return base, f"{base}.json"
+
+
+def _read_index(index_path: str) -> Optional[dict]:
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _array_path(index_path: str, index: dict) -> Optional[str]:
+    """Array an index belongs to; None for indexes of the old layout."""
+    array = index.get("array")
+    return os.path.join(os.path.dirname(index_path), array) if array else None
+
+
+def _folder_signature(folder: str, num_slices: int) -> dict:
+    return {"folder_mtime_ns": os.stat(folder).st_mtime_ns, "num_slices": num_slices}
+
+
+def decode_slice(path: str) -> np.ndarray:
+    """
+    Decode a slice image as uint8, or as uint16 for 16-bit images, which
+    Pillow opens in mode "I;16" or "I" depending on the file and version.
+
+    Raises:
+        ValueError: if an integer image has values outside the uint16 range.
+    """
+    with PILImage.open(path) as img:
+        if img.mode not in ("I", "I;16", "I;16B", "I;16L"):
+            return np.asarray(img if img.mode == "L" else img.convert("L"))
+        pixels = np.asarray(img)
+    if pixels.dtype.itemsize > 2 and (pixels.min() < 0 or pixels.max() > 0xFFFF):
+        raise ValueError(f"{path} has values outside the 16-bit range.")
+    return pixels.astype(np.uint16, copy=False)
+
+
+def build_volume(
+    session, image_set_id: str, volume_root: str = VOLUME_ROOT, force: bool = False
+) -> bool:
+    """
+    Pack the slices of one image set into a contiguous .npy volume.
+
+    Slices are stacked in Image.slice_index order as uint8 (or uint16 for
+    16-bit PNGs). A JSON sidecar records the image ids, shape, dtype and the
+    folder signature used to skip sets that have not changed.
+
+    Each build writes a new array file, named by the sidecar, then replaces
+    the sidecar atomically: readers see the old pair or the new one, never
+    new pixels with old image ids. The previous array is removed after.
+
+    Args:
+        session: SQLAlchemy DB session
+        image_set_id (str): ID of the image set.
+        volume_root (str): output folder for volumes.
+        force (bool): rebuild even if the sidecar is up to date.
+
+    Returns:
+        bool: True if the volume was (re)built, False if skipped.
+    """
+    img_set = session.query(ImageSet).filter_by(image_set_id=image_set_id).first()
+    if img_set is None:
+        raise ValueError(f"Image set {image_set_id} not found.")
+    folder = img_set.folder_path
+    if not os.path.isdir(folder):
+        print(f"⚠️ Skipping missing folder: {folder}")
+        return False
+
+    image_ids = [
+        image_id
+        for (image_id,) in session.query(Image.image_id)
+        .filter_by(image_set_id=image_set_id, missing=False)
+        .order_by(Image.slice_index)
+    ]
+    if not image_ids:
+        return False
+
+    base, index_path = _volume_paths(image_set_id, volume_root)
+    signature = _folder_signature(folder, len(image_ids))
+    previous = _read_index(index_path) or {}
+    previous_array = _array_path(index_path, previous)
+    if (
+        not force
+        and previous.get("signature") == signature
+        and previous_array is not None
+        and os.path.exists(previous_array)
+    ):
+        return False
+
+    first = decode_slice(os.path.join(folder, image_ids[0]))
+    dtype = np.uint16 if first.dtype.itemsize > 1 else np.uint8
+    shape = (len(image_ids),) + first.shape
+
+    os.makedirs(volume_root, exist_ok=True)
+    npy_path = f"{base}.{uuid.uuid4().hex}.npy"
+    tmp_path = npy_path + ".tmp"
+    volume = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    for position, image_id in enumerate(image_ids):
+        pixels = (
+            first if position == 0 else decode_slice(os.path.join(folder, image_id))
+        )
+        if pixels.shape != first.shape:
+            del volume
+            os.remove(tmp_path)
+            raise ValueError(
+                f"Slice {image_id} of {image_set_id} has shape {pixels.shape}, "
+                f"expected {first.shape}."
+            )
+        volume[position] = pixels
+    volume.flush()
+    del volume
+    os.replace(tmp_path, npy_path)
+
+    tmp_index_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_index_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "image_set_id": image_set_id,
+                "array": os.path.basename(npy_path),
+                "dtype": np.dtype(dtype).name,
+                "shape": list(shape),
+                "image_ids": image_ids,
+                "signature": signature,
+            },
+            f,
+        )
+    os.replace(tmp_index_path, index_path)
+
+    # Readers that already mapped the old array keep their view
+    for stale in (previous_array, f"{base}.npy"):
+        if stale is not None and stale != npy_path and os.path.exists(stale):
+            os.remove(stale)
+    return True
+
+
+def build_volumes(
+    image_set_ids: Optional[Iterable[str]] = None,
+    volume_root: str = VOLUME_ROOT,
+    engine_=engine,
+) -> int:
+    """
+    Build volumes for the given image sets, or for every image set.
+
+    Returns:
+        int: Number of volumes (re)built.
+    """
+    with Session(engine_) as session:
+        if image_set_ids is None:
+            image_set_ids = [
+                iset_id for (iset_id,) in session.query(ImageSet.image_set_id)
+            ]
+        built = sum(
+            build_volume(session, iset_id, volume_root) for iset_id in image_set_ids
+        )
+    print(f"📦 Built {built} volumes into {volume_root}/")
+    return built
+
+
+class Volume:
+    """
+    Read-only, memory-mapped view of a packed image set.
+    """
+
+    def __init__(self, npy_path: str, index: dict):
+        self.array = np.load(npy_path, mmap_mode="r")
+        self.image_ids = index["image_ids"]
+        if self.array.shape != tuple(index["shape"]) or len(self.array) != len(
+            self.image_ids
+        ):
+            raise ValueError(f"{npy_path} does not match its index.")
+        self._positions = {image_id: i for i, image_id in enumerate(self.image_ids)}
+
+    def __len__(self) -> int:
+        return len(self.image_ids)
+
+    def slice(self, position: int) -> np.ndarray:
+        """Slice at a position in slice_index order (zero-copy view)."""
+        return self.array[position]
+
+    def slice_by_id(self, image_id: str) -> np.ndarray:
+        """Slice by image id (file name), zero-copy view."""
+        return self.array[self._positions[image_id]]
+
+
+@lru_cache(maxsize=64)
+def _load_volume(index_path: str, _mtime_ns: int) -> Optional[Volume]:
+    index = _read_index(index_path)
+    npy_path = None if index is None else _array_path(index_path, index)
+    if npy_path is None:
+        return None
+    try:
+        return Volume(npy_path, index)
+    except (FileNotFoundError, ValueError):
+        # Replaced by a concurrent build, or not the array of this index
+        return None
+
+
+def open_volume(image_set_id: str, volume_root: str = VOLUME_ROOT) -> Optional[Volume]:
+    """
+    Open the packed volume of an image set, or None if it has not been built
+    (or is being replaced).
+
+    Opened volumes are cached until the sidecar index is rewritten.
+    """
+    _, index_path = _volume_paths(image_set_id, volume_root)
+    try:
+        mtime_ns = os.stat(index_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_volume(index_path, mtime_ns)